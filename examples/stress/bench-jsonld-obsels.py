@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark the JSON-LD serialization of an obsel collection.
+
+The streaming serializer (``iter_trace_obsels_json``) is compared to
+dumping at once the result of ``trace_obsels_to_json``.
+For each of them, the time to the first chunk containing obsels
+(the header of the streaming serializer does not count),
+the total time and the peak memory allocated during serialization
+are reported.
+"""
+from argparse import ArgumentParser
+from json import dumps
+from timeit import default_timer
+import tracemalloc
+
+from rdflib import BNode, Graph, Literal, RDF
+
+from ktbs.engine.service import make_ktbs
+from ktbs.namespace import KTBS
+from ktbs.serpar.jsonld_serializers import iter_trace_obsels_json, \
+    trace_obsels_to_json
+
+
+ARGS = None
+
+def parse_args():
+    global ARGS
+    parser = ArgumentParser("kTBS JSON-LD obsels serializer benchmark")
+    parser.add_argument("-n", "--nb-obsels", type=int, default=10000,
+                        help="the number of obsels in the trace")
+    ARGS = parser.parse_args()
+
+def make_trace(base, model, obsel_type, attribute_type):
+    trace = base.create_stored_trace("t/", model, "2012-09-06T00:00:00Z")
+    g = Graph()
+    for i in range(ARGS.nb_obsels):
+        obs = BNode()
+        g.add((obs, KTBS.hasTrace, trace.uri))
+        g.add((obs, RDF.type, obsel_type.uri))
+        g.add((obs, KTBS.hasBegin, Literal(i)))
+        g.add((obs, KTBS.hasEnd, Literal(i)))
+        g.add((obs, KTBS.hasSubject, Literal("Alice")))
+        g.add((obs, attribute_type.uri, Literal("value %s" % i)))
+    trace.post_graph(g)
+    return trace
+
+def serialize_at_once(graph, obsels):
+    yield dumps(trace_obsels_to_json(graph, obsels),
+                ensure_ascii=False, indent=4)
+
+def bench(name, serializer, graph, obsels):
+    # timing and memory are measured separately,
+    # as tracemalloc slows down the serialization significantly
+    start = default_timer()
+    first = None
+    size = 0
+    for chunk in serializer(graph, obsels):
+        if first is None and '"begin"' in chunk:
+            first = default_timer() - start
+        size += len(chunk)
+    duration = default_timer() - start
+
+    tracemalloc.start()
+    for chunk in serializer(graph, obsels):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-10s %8d obs  first obsel %8.3fs  total %8.3fs  peak %8.1fMB"
+          "  (%d chars)" % (name, ARGS.nb_obsels, first, duration,
+                            peak / 1e6, size))
+
+def main():
+    parse_args()
+    my_ktbs = make_ktbs()
+    base = my_ktbs.create_base("bench/")
+    model = base.create_model("m")
+    obsel_type = model.create_obsel_type("#obsel")
+    attribute_type = model.create_attribute_type("#attr", [obsel_type])
+    trace = make_trace(base, model, obsel_type, attribute_type)
+    obsels = trace.obsel_collection
+    graph = obsels.get_state()
+    bench("at once", serialize_at_once, graph, obsels)
+    bench("streaming", iter_trace_obsels_json, graph, obsels)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark the computation of a ktbs:parallel trace.
+
+For each number of workers (see option ``workers`` of section ``[parallel]``),
+two fresh parallel traces combining several filter methods are computed
+over the same stored trace.
+The computation time is reported for both of them,
+as the first one includes the start of the worker processes.
+
+Worker processes open the repository of the kTBS, so this benchmark
+requires a persistent repository, which must not exist beforehand, e.g.::
+
+  bench-parallel.py -r /tmp/bench-parallel-repo -w 1 4
+"""
+from argparse import ArgumentParser
+from timeit import default_timer
+
+from rdflib import BNode, Graph, Literal, RDF
+
+from ktbs.engine.service import make_ktbs
+from ktbs.namespace import KTBS
+
+
+ARGS = None
+DEFAULT_WORKERS = [1, 2, 4, 8]
+
+def parse_args():
+    global ARGS
+    parser = ArgumentParser("kTBS parallel method benchmark")
+    parser.add_argument("-r", "--repository", required=True,
+                        help="the path of a new persistent repository")
+    parser.add_argument("-w", "--workers", type=int, nargs="+",
+                        default=DEFAULT_WORKERS,
+                        help="the numbers of workers to benchmark")
+    parser.add_argument("-m", "--methods", type=int, default=8,
+                        help="the number of methods combined in parallel")
+    parser.add_argument("-n", "--nb-obsels", type=int, default=10000,
+                        help="the number of obsels in the source trace")
+    ARGS = parser.parse_args()
+
+def make_source(base, model, obsel_type):
+    trace = base.create_stored_trace("src/", model, "2012-09-06T00:00:00Z")
+    g = Graph()
+    for i in range(ARGS.nb_obsels):
+        obs = BNode()
+        g.add((obs, KTBS.hasTrace, trace.uri))
+        g.add((obs, RDF.type, obsel_type.uri))
+        g.add((obs, KTBS.hasBegin, Literal(i)))
+        g.add((obs, KTBS.hasEnd, Literal(i)))
+        g.add((obs, KTBS.hasSubject, Literal("Alice")))
+    trace.post_graph(g)
+    return trace
+
+def bench(service, base, source, methods, workers):
+    service.config.set('parallel', 'workers', str(workers))
+    durations = []
+    for _ in range(2):
+        ctr = base.create_computed_trace(None, KTBS.parallel, {
+            "methods": " ".join(method.uri for method in methods),
+        }, [source])
+        start = default_timer()
+        ctr.obsel_collection.force_state_refresh()
+        durations.append(default_timer() - start)
+    print("%4d workers  %4d methods  %8d obs  %8.3fs  %8.3fs" % (
+        workers, len(methods), ARGS.nb_obsels, durations[0], durations[1]))
+
+def main():
+    parse_args()
+    my_ktbs = make_ktbs(repository=ARGS.repository)
+    service = my_ktbs.service
+    if not service.config.has_section('parallel'):
+        service.config.add_section('parallel')
+    base = my_ktbs.create_base("bench/")
+    model = base.create_model("m")
+    obsel_type = model.create_obsel_type("#obsel")
+    source = make_source(base, model, obsel_type)
+    methods = [
+        base.create_method("m%s" % i, KTBS.filter,
+                           {"after": str(i), "before": str(ARGS.nb_obsels)})
+        for i in range(ARGS.methods)
+    ]
+    for workers in ARGS.workers:
+        bench(service, base, source, methods, workers)
+
+if __name__ == "__main__":
+    main()
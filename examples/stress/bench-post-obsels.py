@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark the ingestion of obsels posted in batches to a stored trace.
+
+For each batch size, a fresh trace is created, and batches are posted to it
+until at least the given number of obsels have been posted.
+The ingestion rate (in obsels per second) is reported for each batch size.
+"""
+from argparse import ArgumentParser
+from timeit import default_timer
+
+from rdflib import BNode, Graph, Literal, RDF
+
+from ktbs.engine.service import make_ktbs
+from ktbs.namespace import KTBS
+
+
+ARGS = None
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+def parse_args():
+    global ARGS
+    parser = ArgumentParser("kTBS batch post benchmark")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+",
+                        default=DEFAULT_SIZES,
+                        help="the batch sizes to benchmark")
+    parser.add_argument("-m", "--min-obsels", type=int, default=1000,
+                        help="the minimum number of obsels to post "
+                             "for each batch size")
+    ARGS = parser.parse_args()
+
+def make_batch(trace, obsel_type, start, size):
+    g = Graph()
+    for i in range(start, start+size):
+        obs = BNode()
+        g.add((obs, KTBS.hasTrace, trace.uri))
+        g.add((obs, RDF.type, obsel_type.uri))
+        g.add((obs, KTBS.hasBegin, Literal(i)))
+        g.add((obs, KTBS.hasEnd, Literal(i)))
+        g.add((obs, KTBS.hasSubject, Literal("Alice")))
+    return g
+
+def bench(base, model, obsel_type, size):
+    trace = base.create_stored_trace(None, model, "2012-09-06T00:00:00Z")
+    nbbatch = max(1, -(-ARGS.min_obsels // size))
+    # batches are built beforehand, to only measure ingestion
+    batches = [ make_batch(trace, obsel_type, i*size, size)
+                for i in range(nbbatch) ]
+    start = default_timer()
+    for batch in batches:
+        trace.post_graph(batch)
+    duration = default_timer() - start
+    nbobs = nbbatch * size
+    assert len(trace.obsel_collection.get_temporal_index()) == nbobs
+    print("%8d obs/batch  %8d obs  %8.3fs  %10.2f obs/s" % (
+        size, nbobs, duration, nbobs/duration))
+    trace.delete()
+
+def main():
+    parse_args()
+    my_ktbs = make_ktbs()
+    base = my_ktbs.create_base("bench/")
+    model = base.create_model("m")
+    obsel_type = model.create_obsel_type("#obsel")
+    for size in ARGS.sizes:
+        bench(base, model, obsel_type, size)
+
+if __name__ == "__main__":
+    main()
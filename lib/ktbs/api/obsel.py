@@ -307,3 +307,52 @@ class ObselProxy(ObselMixin, ICore):
             raise ValueError("Could not get proper obsel %s" % self)
         assert isinstance(proper, ObselMixin)  and  proper.uri == self.uri
         return proper.delete(parameters, _trust)
+
+
+class ObselRecord(object):
+    """I provide a compact, read-only description of an obsel.
+
+    Contrarily to `ObselProxy`:class:, all my attributes are computed
+    beforehand, so accessing them does not require any lookup in the store.
+
+    * uri: the URI of the obsel
+    * type: the URI of the obsel type
+    * begin: the begin timestamp (int)
+    * end: the end timestamp (int)
+    * subject: the subject (a Node, or None)
+
+    See `.trace.AbstractTraceMixin.iter_obsel_records`:meth:.
+    """
+    __slots__ = ("uri", "type", "begin", "end", "subject")
+
+    def __init__(self, uri, type, begin, end, subject):
+        # type is the name of the attribute #pylint: disable=W0622
+        self.uri = uri
+        self.type = type
+        self.begin = begin
+        self.end = end
+        self.subject = subject
+
+    def __repr__(self):
+        return "ObselRecord(%r, %r, %r, %r, %r)" % (
+            self.uri, self.type, self.begin, self.end, self.subject)
+
+    def __eq__(self, other):
+        return isinstance(other, ObselRecord) and \
+            all( getattr(self, i) == getattr(other, i) for i in self.__slots__ )
+
+    def __hash__(self):
+        return hash(ObselRecord) ^ hash(self.uri)
+
+
+def _get_record_type(graph, uri):
+    """Return the obsel type of obsel `uri` in `graph`, for `ObselRecord`.
+
+    If the obsel has several types, ktbs:Obsel is ignored.
+    """
+    ret = None
+    for typ in graph.objects(uri, RDF.type):
+        ret = typ
+        if typ != KTBS.Obsel:
+            break
+    return ret
@@ -38,7 +38,7 @@ from rdfrest.util.iso8601 import parse_date, ParseError, UTC
 from rdfrest.util import cache_result, coerce_to_node, coerce_to_uri
 from .base import InBaseMixin
 from .method import WithParametersMixin
-from .obsel import ObselMixin, ObselProxy
+from .obsel import ObselMixin, ObselProxy, ObselRecord, _get_record_type
 from rdfrest.wrappers import get_wrapped, register_wrapper
 from .trace_obsels import AbstractTraceObselsMixin
 from ..namespace import KTBS
@@ -54,6 +54,9 @@ class AbstractTraceMixin(InBaseMixin):
     I provide the pythonic interface common to all kTBS traces.
     """
 
+    OBSELS_CHUNK_SIZE = 1000
+    """Maximum number of obsels retrieved at once by `iter_obsels`:meth:."""
+
     ######## Abstract kTBS API ########
 
     def get_obsel(self, id):
@@ -144,38 +147,92 @@ class AbstractTraceMixin(InBaseMixin):
 
         collection = self.obsel_collection
         collection.force_state_refresh(parameters or None)
-        if isinstance(self, ILocalCore):
-            # we have direct access to the raw resource instead,
-            # so we directly query the graph
-            # (pylint does not know that, hence the directive below)
-            obsels_graph = collection.state #pylint: disable=E1101
-            select = collection.build_select(begin, end, after, before, reverse, bgp,
-                                             limit, offset,
-                                             "DISTINCT ?obs" if bgp else "?obs")
-        else:
-            # we are remote,
-            # so we push as much as possible of the parameters to the server
-            if begin is not None:
-                parameters["minb"] = begin
-            if end is not None:
-                parameters["maxe"] = end
-            if after is not None:
-                parameters["after"] = str(coerce_to_uri(after))
-            if before is not None:
-                parameters["before"] = str(coerce_to_uri(before))
+        parameters = parameters or None
+        local = isinstance(self, ILocalCore)
+        chunk_size = self.OBSELS_CHUNK_SIZE
+        # obsels are retrieved by chunks,
+        # each chunk starting after the last obsel of the previous one
+        while limit is None or limit > 0:
+            size = chunk_size if limit is None else min(limit, chunk_size)
+            if local:
+                # we have direct access to the raw resource instead,
+                # so we directly query the graph
+                # (pylint does not know that, hence the directive below)
+                obsels_graph = collection.state #pylint: disable=E1101
+                select = collection.build_select(
+                    begin, end, after, before, reverse, bgp, size, offset,
+                    "DISTINCT ?obs" if bgp else "?obs")
+            else:
+                # we are remote,
+                # so we push as much as possible of the parameters to the server
+                chunk_parameters = dict(parameters or {}, limit=size)
+                if begin is not None:
+                    chunk_parameters["minb"] = begin
+                if end is not None:
+                    chunk_parameters["maxe"] = end
+                if after is not None:
+                    chunk_parameters["after"] = str(coerce_to_uri(after))
+                if before is not None:
+                    chunk_parameters["before"] = str(coerce_to_uri(before))
+                if reverse:
+                    chunk_parameters["reverse"] = "yes"
+                if offset is not None:
+                    chunk_parameters['offset'] = offset
+                obsels_graph = collection.get_state(chunk_parameters)
+                select = collection.build_select(reverse=reverse)
+            query_str = "PREFIX ktbs: <%s#> %s" % (KTBS_NS_URI, select)
+            tuples = list(obsels_graph.query(query_str,
+                                             initNs={"m": self.model_prefix}))
+            if bgp is not None and not local:
+                # the server can not evaluate bgp,
+                # so we filter the obsels of the chunk
+                query_str = "PREFIX ktbs: <%s#> %s" % (
+                    KTBS_NS_URI,
+                    collection.build_select(bgp=bgp, selected="DISTINCT ?obs"))
+                matching = set( row[0] for row in obsels_graph.query(
+                    query_str, initNs={"m": self.model_prefix}) )
+            else:
+                matching = None
+            for obs_uri, in tuples:
+                if matching is not None and obs_uri not in matching:
+                    continue
+                types = obsels_graph.objects(obs_uri, RDF.type)
+                cls = get_wrapped(ObselProxy, types)
+                yield cls(obs_uri, collection, obsels_graph, parameters)
+            if len(tuples) < size:
+                return
             if limit is not None:
-                parameters['limit'] = limit
-            if offset is not None:
-                parameters['offset'] = offset
-            obsels_graph = collection.get_state(parameters)
-            select = collection.build_select(
-                bgp=bgp, selected="DISTINCT ?obs" if bgp else "?obs")
-        query_str = "PREFIX ktbs: <%s#> %s" % (KTBS_NS_URI, select)
-        tuples = list(obsels_graph.query(query_str, initNs={"m": self.model_prefix}))
-        for obs_uri, in tuples:
-            types = obsels_graph.objects(obs_uri, RDF.type)
-            cls = get_wrapped(ObselProxy, types)
-            yield cls(obs_uri, collection, obsels_graph, parameters or None)
+                limit -= size
+            offset = None
+            last = tuples[-1][0]
+            if reverse:
+                before = last
+            else:
+                after = last
+
+    def iter_obsel_records(self, begin=None, end=None, after=None, before=None, reverse=False, bgp=None, limit=None, offset=None, refresh=None):
+        """
+        Iter over the obsels of this trace, as compact records.
+
+        :rtype: an iterable of `~.obsel.ObselRecord`:class:
+
+        The parameters have the same meaning as for `iter_obsels`:meth:.
+        The uri, type, timestamps and subject of each obsel are fetched
+        while iterating, so that accessing them costs no lookup in the store.
+        This is the preferred way to iterate over many obsels when no other
+        information is required.
+        """
+        for obs in self.iter_obsels(begin, end, after, before, reverse, bgp,
+                                    limit, offset, refresh):
+            graph = obs.host_graph
+            uri = obs.uri
+            yield ObselRecord(
+                uri,
+                _get_record_type(graph, uri),
+                int(graph.value(uri, KTBS.hasBegin)),
+                int(graph.value(uri, KTBS.hasEnd)),
+                graph.value(uri, KTBS.hasSubject),
+            )
 
     def iter_source_traces(self):
         """
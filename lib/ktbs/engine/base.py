@@ -18,9 +18,11 @@
 """
 I provide the implementation of ktbs:Base .
 """
-from rdflib import ConjunctiveGraph, Graph, RDF, RDFS
+from rdflib import Graph, Literal, RDF, RDFS
 from contextlib import contextmanager
+from weakref import WeakKeyDictionary
 from posix_ipc import SEMAPHORE_VALUE_SUPPORTED
+from rdfrest.cores.local import NS as RDFREST
 from rdfrest.exceptions import InvalidParametersError
 
 from .resource import KtbsPostableMixin, KtbsResource
@@ -48,93 +50,39 @@ class Base(WithLockMixin, BaseMixin, KtbsPostableMixin, KtbsResource):
 
         enriched_state = Graph()
         enriched_state += state
-        whole = ConjunctiveGraph(self.service.store)
-        initNs = { '': KTBS, 'rdfs': RDFS, 'skos': SKOS }
-        initBindings = { 'base': self.uri }
-        for prop in parameters['prop']:
-            if prop == 'comment':
+        props = parameters['prop']
+        predicates = [ pred for prop in props
+                            for pred in _SUMMARY_PREDICATES.get(prop, ()) ]
+        if predicates:
+            summary = self._get_children_summary()
+            for pred in predicates:
                 enriched_state.addN(
-                    (s, RDFS.comment, o, enriched_state)
-                    for s, o, _ in whole.query('''
-                        SELECT ?s ?o
-                          $base # selected solely to please Virtuoso
-                        {
-                            GRAPH $base { $base :contains ?s }
-                            GRAPH ?s    { ?s rdfs:comment ?o }
-                        }
-                    ''', initNs=initNs, initBindings=initBindings)
+                    (s, pred, o, enriched_state)
+                    for s, o in summary.subject_objects(pred)
                 )
-            elif prop == 'hasMethod':
-                enriched_state.addN(
-                    (s, KTBS.hasMethod, o, enriched_state)
-                    for s, o, _ in whole.query('''
-                        SELECT ?t ?m
-                            $base # selected solely to please Virtuoso
-                        {
-                            GRAPH $base { $base :contains ?t }
-                            GRAPH ?t    { ?t :hasMethod ?m }
-                        }
-                    ''', initNs=initNs, initBindings=initBindings)
-                )
-            elif prop == 'hasModel':
-                enriched_state.addN(
-                    (s, KTBS.hasModel, o, enriched_state)
-                    for s, o, _ in whole.query('''
-                        SELECT ?t ?m
-                          $base # selected solely to please Virtuoso
-                        {
-                            GRAPH $base { $base :contains ?t }
-                            GRAPH ?t    { ?t :hasModel ?m }
-                        }
-                    ''', initNs=initNs, initBindings=initBindings)
-                )
-            elif prop == 'hasSource':
-                enriched_state.addN(
-                    (s, KTBS.hasSource, o, enriched_state)
-                    for s, o, _ in whole.query('''
-                        SELECT ?t1 ?t2
-                          $base # selected solely to please Virtuoso
-                        {
-                            GRAPH $base { $base :contains ?t1 }
-                            GRAPH ?t1   { ?t1 :hasSource ?t2 }
-                        }
-                    ''', initNs=initNs, initBindings=initBindings)
-                )
-            elif prop == 'label':
-                enriched_state.addN(
-                    (s, p, o, enriched_state)
-                    for s, p, o, _ in whole.query('''
-                        SELECT ?s ?p ?o
-                          $base # selected solely to please Virtuoso
-                        {
-                            VALUES ?p { rdfs:label skos:prefLabel }
-                            GRAPH $base { $base :contains ?s }
-                            GRAPH ?s    {
-                                $base :contains ?s.
-                                ?s ?p ?o.
-                            }
-                        }
-                    ''', initNs=initNs, initBindings=initBindings)
-                )
-            elif prop == 'obselCount':
-                enriched_state.addN(
-                    (s, KTBS.hasObselCount, o, enriched_state)
-                    for s, o, _ in whole.query('''
-                        SELECT ?t (COUNT(?obs) as ?c)
-                            (SAMPLE($base) as ?sample_base) # selected solely to please Virtuoso
-                        {
-                            VALUES ?tt { :StoredTrace :ComputedTrace }
-                            GRAPH $base { $base :contains ?t. ?t a ?tt }
-                            OPTIONAL { ?obs :hasTrace ?t }
-                        } GROUP BY ?t
-                    ''', initNs=initNs, initBindings=initBindings)
-                )
-            else:
-                pass # ignoring unrecognized properties
-                # should we signal them instead (diagnosis?)
+        if 'obselCount' in props:
+            service = self.service
+            for trace_uri, typ in _iter_traces(state, self.uri):
+                trace = service.get(trace_uri, [typ])
+                count = trace.obsel_collection.get_obsel_count()
+                enriched_state.add((trace_uri, KTBS.hasObselCount,
+                                    Literal(count)))
+        # other properties are ignored
+        # should we signal them instead (diagnosis?)
 
         return enriched_state
 
+    def get_representation_dependencies(self, parameters=None):
+        """I implement the hook used by the cache of
+        `rdfrest.http_server.HttpFrontend`:class:.
+
+        Descriptions enriched with "prop" depend on the state of my children,
+        so they are never cached.
+        """
+        if parameters and "prop" in parameters:
+            return None
+        return ()
+
 
 
     ######## ILocalCore (and mixins) implementation  ########
@@ -175,10 +123,32 @@ class Base(WithLockMixin, BaseMixin, KtbsPostableMixin, KtbsResource):
             editable.remove((parent.uri, KTBS.contains, self.uri))
             editable.remove((self.uri, RDF.type, self.RDF_MAIN_TYPE))
 
+    def prepare_edit(self, parameters):
+        """I override :meth:`rdfrest.cores.local.ILocalCore.prepare_edit`
+
+        I store the old list of items, to handle the change in :meth:`ack_edit`.
+        """
+        ret = super(Base, self).prepare_edit(parameters)
+        ret.old_contained = set(self.state.objects(self.uri, KTBS.contains))
+        return ret
+
+    def ack_edit(self, parameters, prepared):
+        """I override :meth:`rdfrest.cores.local.ILocalCore.ack_edit`
+
+        I discard the cached summary of removed items.
+        """
+        super(Base, self).ack_edit(parameters, prepared)
+        contained = set(self.state.objects(self.uri, KTBS.contains))
+        cache = _get_summary_cache(self.service, self.uri)
+        for removed in prepared.old_contained - contained:
+            cache.pop(removed, None)
+
     def ack_post(self, parameters, created, new_graph):
         """I override :meth:`rdfrest.util.GraphPostableMixin.ack_post`.
         """
         super(Base, self).ack_post(parameters, created, new_graph)
+        # discard any stale summary of a previous item with the same URI
+        _get_summary_cache(self.service, self.uri).pop(created, None)
         with self.edit(_trust=True) as editable:
             editable.add((self.uri, KTBS.contains, created))
             for typ in new_graph.objects(created, RDF.type):
@@ -245,6 +215,36 @@ class Base(WithLockMixin, BaseMixin, KtbsPostableMixin, KtbsResource):
 
         return diag
 
+    ######## Private  ########
+
+    def _get_children_summary(self):
+        """I return a graph summarizing the items of this base.
+
+        The summary contains, for each item, the values of all properties in
+        `_SUMMARY_PREDICATES`. It is cached in memory (never in the store,
+        where SPARQL queries would see it), together with the etag of each
+        item, so that only the summary of items modified since the last call
+        needs to be updated.
+        """
+        service = self.service
+        cache = _get_summary_cache(service, self.uri)
+        summary = Graph()
+        for item in self.state.objects(self.uri, KTBS.contains):
+            etag = service.get_metadata_graph(item).value(item, RDFREST.etag)
+            cached = cache.get(item)
+            if cached is None or cached[0] != etag:
+                item_graph = Graph(service.store, item)
+                cached = (etag, [
+                    (pred, obj)
+                    for pred in _ALL_SUMMARY_PREDICATES
+                    for obj in item_graph.objects(item, pred)
+                ])
+                if etag is not None:
+                    cache[item] = cached
+            summary.addN((item, pred, obj, summary)
+                         for pred, obj in cached[1])
+        return summary
+
     @classmethod
     def create_lock(cls, uri):
         """ I override `WithLockMixin.create_lock`.
@@ -299,3 +299,40 @@ class InBase(InBaseMixin, KtbsResource):
         base = self.get_base()
         with base.lock(self), super(InBase, self).edit(parameters, clear, _trust) as editable:
             yield editable
+
+
+_SUMMARY_PREDICATES = {
+    'comment': (RDFS.comment,),
+    'hasMethod': (KTBS.hasMethod,),
+    'hasModel': (KTBS.hasModel,),
+    'hasSource': (KTBS.hasSource,),
+    'label': (RDFS.label, SKOS.prefLabel),
+}
+
+_ALL_SUMMARY_PREDICATES = [ pred for preds in _SUMMARY_PREDICATES.values()
+                                 for pred in preds ]
+
+def _get_summary_cache(service, base_uri):
+    """Return the in-memory summary cache of the base `base_uri`.
+
+    The dict is keyed by the URIs of the items of the base, and contains pairs
+    (etag, list of (predicate, object) pairs).
+    """
+    summaries = _SUMMARIES.get(service)
+    if summaries is None:
+        summaries = _SUMMARIES[service] = {}
+    ret = summaries.get(base_uri)
+    if ret is None:
+        ret = summaries[base_uri] = {}
+    return ret
+
+_SUMMARIES = WeakKeyDictionary()
+
+def _iter_traces(base_state, base_uri):
+    """Iter over the traces contained in a base, with their type.
+    """
+    for item in base_state.objects(base_uri, KTBS.contains):
+        for typ in base_state.objects(item, RDF.type):
+            if typ in (KTBS.StoredTrace, KTBS.ComputedTrace):
+                yield item, typ
+                break
@@ -136,3 +136,14 @@ class KtbsRoot(WithLockMixin, KtbsRootMixin, KtbsPostableMixin, KtbsResource):
                 # should we signal them instead (diagnosis?)
 
         return enriched_state
+
+    def get_representation_dependencies(self, parameters=None):
+        """I implement the hook used by the cache of
+        `rdfrest.http_server.HttpFrontend`:class:.
+
+        Descriptions enriched with "prop" depend on the state of my bases,
+        so they are never cached.
+        """
+        if parameters and "prop" in parameters:
+            return None
+        return ()
@@ -235,3 +235,62 @@ class WithLockMixin(ILocalCore):
                                         flags=posix_ipc.O_CREAT,
                                         initial_value=1) # if it doesn't exist
         return semaphore
+
+
+def get_dirty_semaphore(root_uri):
+    """Return the semaphore notifying that computed traces need recomputation.
+
+    Unlike the semaphores used as locks, this semaphore is initialized to 0.
+    It is released by `notify_dirty`:func:,
+    and acquired by `wait_dirty`:func: (typically in ``bin/bgcompute``).
+
+    :param basestring root_uri: the URI of the kTBS root.
+    :rtype: posix_ipc.Semaphore
+    """
+    return posix_ipc.Semaphore(name=get_semaphore_name(root_uri + "#dirty"),
+                               flags=posix_ipc.O_CREAT,
+                               initial_value=0)
+
+def notify_dirty(service):
+    """Notify other processes that some computed traces of service are dirty.
+
+    This only happens if option ``notify`` of section ``[bgcompute]``
+    is set in the configuration of the service.
+    """
+    config = service.config
+    if not config.has_section('bgcompute') \
+    or not config.has_option('bgcompute', 'notify') \
+    or not config.getboolean('bgcompute', 'notify'):
+        return
+    semaphore = get_dirty_semaphore(service.root_uri)
+    try:
+        # a single pending notification is enough to wake up the waiters
+        if not posix_ipc.SEMAPHORE_VALUE_SUPPORTED or semaphore.value == 0:
+            semaphore.release()
+    finally:
+        semaphore.close()
+
+def wait_dirty(root_uri, timeout=None):
+    """Wait for a notification sent by `notify_dirty`:func:.
+
+    :param basestring root_uri: the URI of the kTBS root.
+    :param timeout: maximum time to wait (None means forever).
+    :type timeout: int or float
+    :return: whether a notification was received before timeout.
+    :rtype: bool
+    """
+    semaphore = get_dirty_semaphore(root_uri)
+    try:
+        try:
+            semaphore.acquire(timeout)
+        except posix_ipc.BusyError:
+            return False
+        # consume pending notifications, they are all handled at once
+        try:
+            while True:
+                semaphore.acquire(0)
+        except posix_ipc.BusyError:
+            pass
+        return True
+    finally:
+        semaphore.close()
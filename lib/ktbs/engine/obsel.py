@@ -30,11 +30,11 @@ from rdfrest.util.iso8601 import UTC
 from rdfrest.cores.local import ILocalCore
 from rdfrest.cores.mixins import WithCardinalityMixin, WithReservedNamespacesMixin, \
     WithTypedPropertiesMixin
-from rdfrest.util import bounded_description, Diagnosis, make_fresh_uri, parent_uri
+from rdfrest.util import bounded_description, check_new, Diagnosis, parent_uri
 from ..api.obsel import ObselMixin
 from ..namespace import KTBS, RDF
 from ..utils import SKOS
-from ..time import get_converter_to_unit, lit2datetime #pylint: disable=E0611
+from ..time import lit2datetime #pylint: disable=E0611
 
 import logging
 LOG = logging.getLogger(__name__)
@@ -198,13 +198,10 @@ class _ObselImpl(ILocalCore):
                 new_graph.add((uri, KTBS.hasSubject, default_subject))
 
         # compute begin and/or end if beginDT and/or endDT are provided
-        delta2unit = None
-        origin = None
         begin_dt = lit2datetime(new_graph.value(uri, KTBS.hasBeginDT))
         end_dt = lit2datetime(new_graph.value(uri, KTBS.hasEndDT))
         if begin_dt or end_dt:
-            delta2unit = get_converter_to_unit(trace.unit)
-            origin = lit2datetime(trace.origin)
+            _, origin, delta2unit = trace.get_time_conversion()
             if origin is not None:
                 if delta2unit is not None:
                     if begin_dt is not None:
@@ -218,8 +215,7 @@ class _ObselImpl(ILocalCore):
         # complete missing begin with current date
         begin = new_graph.value(uri, KTBS.hasBegin)
         if begin is None:
-            delta2unit = delta2unit or get_converter_to_unit(trace.unit)
-            origin = origin or lit2datetime(trace.origin)
+            _, origin, delta2unit = trace.get_time_conversion()
             begin = Literal(delta2unit(_NOW(UTC) - origin))
             new_graph.add((uri, KTBS.hasBegin, begin))
 
@@ -264,12 +260,58 @@ class _ObselImpl(ILocalCore):
 
         I use the skos:prefLabel of the resource to mint a URI, else the
         basename.
+
+        See `mint_uris`:meth:.
         """
         # Do NOT call super method, as this is the base implementation.
-        label = (new_graph.value(created, SKOS.prefLabel)
-                 or basename).lower()
-        prefix = "%s%s-" % (target.uri, _NON_ALPHA.sub("-", label))
-        return make_fresh_uri(target.obsel_collection.state, prefix, suffix)
+        return cls.mint_uris(target, new_graph, [created], basename,
+                             suffix)[created]
+
+    @classmethod
+    def mint_uris(cls, target, new_graph, created_nodes, basename="o",
+                  suffix=""):
+        """I mint URIs for several obsels posted together to `target`.
+
+        :param target: the trace the obsels are posted to
+        :param new_graph: the posted graph
+        :param created_nodes: the nodes representing the obsels to create
+        :param basename: the basename to use for obsels without skos:prefLabel
+        :param suffix: if provided, will be added to the end of the URIs
+
+        :return: a dict mapping each node of `created_nodes` to a fresh URI
+
+        The URIs are made of the skos:prefLabel of the obsel (else the
+        basename), followed by the value of a counter stored in the metadata
+        of the obsel collection
+        (see `~.trace_obsels.AbstractTraceObsels.reserve_obsel_ids`:meth:).
+        They are therefore distinct from each other, and reflect the order
+        of creation.
+        The value of the counter is padded with zeros to a fixed width,
+        so that the lexicographic order of URIs is also the order of creation.
+
+        URIs are still checked against the obsel collection and `new_graph`
+        (as obsels may have been posted with an explicit URI),
+        but this is a single lookup in the general case.
+        """
+        collection = target.obsel_collection
+        state = collection.state
+        new_graph_value = new_graph.value
+        ids = iter(collection.reserve_obsel_ids(len(created_nodes)))
+        ret = {}
+        for created in created_nodes:
+            label = (new_graph_value(created, SKOS.prefLabel)
+                     or basename).lower()
+            prefix = "%s%s-" % (target.uri, _NON_ALPHA.sub("-", label))
+            while True:
+                ident = next(ids, None)
+                if ident is None:
+                    # some ids were already in use; reserve a new one
+                    ident = collection.reserve_obsel_ids(1)[0]
+                uri = URIRef("%s%0*d%s" % (prefix, _ID_WIDTH, ident, suffix))
+                if check_new(state, uri) and check_new(new_graph, uri):
+                    break
+            ret[created] = uri
+        return ret
 
     @classmethod
     def create(cls, service, uri, new_graph):
@@ -338,4 +380,5 @@ _RELATED_OBSELS = prepareQuery("""
     """ % (KTBS.hasTrace, KTBS.hasTrace))
 
 _NON_ALPHA = re.compile(r'[^\w]+')
+_ID_WIDTH = 10
 _NOW = datetime.now
@@ -0,0 +1,285 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I provide a temporal index for the obsels of a trace.
+
+Obsels are always exposed sorted by their end timestamp, then their begin
+timestamp, then their URI
+(see `~ktbs.api.trace_obsels.AbstractTraceObselsMixin.build_select`:meth:).
+Asking the RDF store to sort the whole obsel collection every time a slice
+of it is required does not scale, so local obsel collections rely on the
+index below instead.
+
+Indexes are kept in memory, attached to the service that owns the obsel
+collection, so that they survive from one request to another.
+Each index remembers the etag of the obsel collection it reflects, which
+makes it possible to detect (and recover from) changes made by another
+process sharing the same store.
+"""
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from weakref import WeakKeyDictionary
+
+from rdflib import Graph
+
+from ..namespace import KTBS
+
+
+class TemporalIndex(object):
+    """I keep the obsels of a trace sorted by (end, begin, uri).
+
+    Every obsel is represented by a *key*, which is a tuple
+    ``(end, begin, uri)`` where `end` and `begin` are numbers
+    and `uri` is a plain `str` (not a URIRef, as comparing plain strings
+    is much faster).
+
+    :param etag: the etag of the obsel collection reflected by this index
+    """
+
+    def __init__(self, etag=None):
+        self.etag = etag
+        self._keys = []
+        self._by_uri = {}
+
+    @classmethod
+    def from_graph(cls, graph, etag=None):
+        """Build the index of all the obsels in `graph`.
+
+        :param graph: the graph of an obsel collection
+        :param etag:  the etag of that obsel collection
+        """
+        ret = cls(etag)
+        begins = {
+            str(obs): int(begin)
+            for obs, _, begin in graph.triples((None, KTBS.hasBegin, None))
+        }
+        by_uri = ret._by_uri
+        for obs, _, end in graph.triples((None, KTBS.hasEnd, None)):
+            obs = str(obs)
+            begin = begins.get(obs)
+            if begin is not None:
+                by_uri[obs] = (int(end), begin, obs)
+        ret._keys = sorted(by_uri.values())
+        return ret
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, uri):
+        return str(uri) in self._by_uri
+
+    def get(self, uri):
+        """Return the key of the obsel identified by `uri`, or None.
+        """
+        return self._by_uri.get(str(uri))
+
+    def add(self, uri, begin, end):
+        """Add (or move) the obsel identified by `uri`.
+        """
+        uri = str(uri)
+        self.discard(uri)
+        key = (int(end), int(begin), uri)
+        self._by_uri[uri] = key
+        keys = self._keys
+        if not keys or keys[-1] < key:
+            keys.append(key) # by far the most common case
+        else:
+            insort(keys, key)
+
+    def discard(self, uri):
+        """Remove the obsel identified by `uri`, if present.
+        """
+        key = self._by_uri.pop(str(uri), None)
+        if key is not None:
+            keys = self._keys
+            del keys[bisect_left(keys, key)]
+
+    def clear(self):
+        """Remove all obsels from this index.
+        """
+        del self._keys[:]
+        self._by_uri.clear()
+
+    def first(self):
+        """Return the key of the first obsel, or None if the index is empty.
+        """
+        keys = self._keys
+        return keys[0] if keys else None
+
+    def last(self):
+        """Return the key of the last obsel, or None if the index is empty.
+        """
+        keys = self._keys
+        return keys[-1] if keys else None
+
+    def slice(self, minb=None, maxb=None, mine=None, maxe=None,
+              after=None, before=None, reverse=False,
+              limit=None, offset=None):
+        """Iter over the keys of the obsels matching the given criteria.
+
+        * minb, maxb: (included) bounds for the begin timestamp
+        * mine, maxe: (included) bounds for the end timestamp
+        * after, before: URIs of obsels; only the obsels strictly after
+          (resp. before) them will be yielded; if they are not in the index,
+          nothing is yielded; keys are also accepted, in which case they
+          need not be in the index (this is used for keyset pagination)
+        * reverse: if true, keys are yielded in decreasing order
+        * limit, offset: as in SPARQL
+
+        Bounds on the end timestamp, `after` and `before` are resolved by
+        binary search; bounds on the begin timestamp require to check each
+        obsel in the resulting range.
+        """
+        keys = self._keys
+        low, high = 0, len(keys)
+        if mine is not None:
+            low = bisect_left(keys, (mine,))
+        if maxe is not None:
+            high = bisect_right(keys, (maxe, _INF))
+        if after is not None:
+            key = after if type(after) is tuple else self._by_uri.get(str(after))
+            if key is None:
+                return iter(())
+            low = max(low, bisect_right(keys, key))
+        if before is not None:
+            key = before if type(before) is tuple \
+                  else self._by_uri.get(str(before))
+            if key is None:
+                return iter(())
+            high = min(high, bisect_left(keys, key))
+        if low >= high:
+            return iter(())
+
+        if reverse:
+            ret = (keys[i] for i in range(high-1, low-1, -1))
+        else:
+            ret = (keys[i] for i in range(low, high))
+        if minb is not None or maxb is not None:
+            ret = _filter_begin(ret, minb, maxb)
+        if offset or limit is not None:
+            offset = offset or 0
+            stop = None if limit is None else offset + limit
+            ret = islice(ret, offset, stop)
+        return ret
+
+
+class TimestampTrackingGraph(Graph):
+    """I am a graph keeping track of the nodes whose timestamps change.
+
+    Every time a ``ktbs:hasBegin`` or ``ktbs:hasEnd`` arc is added or removed,
+    its subject is added to `touched`, so that the temporal index can be
+    patched rather than rebuilt.
+    If an arc is removed with an unspecified subject, I can not tell which
+    nodes are affected, so `touched` is set to None.
+
+    I also maintain in `begin_delta` the number of nodes that gained a
+    ``ktbs:hasBegin`` arc minus the number of nodes that lost their last one,
+    so that the number of obsels can be patched as well
+    (re-adding the timestamps of an existing obsel does not change it).
+    """
+
+    def __init__(self, store, identifier):
+        super(TimestampTrackingGraph, self).__init__(store, identifier)
+        self.touched = set()
+        self.begin_delta = 0
+
+    def reset_touched(self):
+        """Start tracking changes from scratch.
+        """
+        self.touched = set()
+        self.begin_delta = 0
+
+    def add(self, triple):
+        """I override `rdflib.Graph.add`.
+        """
+        touched = self.touched
+        if touched is not None and triple[1] in _TIMESTAMPS:
+            touched.add(triple[0])
+            if triple[1] == _HAS_BEGIN \
+            and (triple[0], _HAS_BEGIN, None) not in self:
+                self.begin_delta += 1
+        return super(TimestampTrackingGraph, self).add(triple)
+
+    def addN(self, quads):
+        """I override `rdflib.Graph.addN`.
+        """
+        if self.touched is not None:
+            quads = self._track_quads(quads)
+        return super(TimestampTrackingGraph, self).addN(quads)
+
+    def remove(self, triple):
+        """I override `rdflib.Graph.remove`.
+        """
+        touched = self.touched
+        if touched is None:
+            return super(TimestampTrackingGraph, self).remove(triple)
+        subj, pred, _ = triple
+        if pred is not None and pred not in _TIMESTAMPS:
+            return super(TimestampTrackingGraph, self).remove(triple)
+        if subj is None:
+            self.touched = None
+            return super(TimestampTrackingGraph, self).remove(triple)
+        touched.add(subj)
+        had_begin = (subj, _HAS_BEGIN, None) in self
+        ret = super(TimestampTrackingGraph, self).remove(triple)
+        if had_begin and (subj, _HAS_BEGIN, None) not in self:
+            self.begin_delta -= 1
+        return ret
+
+    def _track_quads(self, quads):
+        """Pass `quads` through, tracking the subjects of timestamp arcs.
+
+        NB: the membership test below relies on the store adding the quads
+        one at a time, as they are consumed.
+        """
+        touch = self.touched.add
+        for quad in quads:
+            if quad[1] in _TIMESTAMPS:
+                touch(quad[0])
+                if quad[1] == _HAS_BEGIN \
+                and (quad[0], _HAS_BEGIN, None) not in self:
+                    self.begin_delta += 1
+            yield quad
+
+
+def get_temporal_indexes(service):
+    """Return the dict of temporal indexes attached to `service`.
+
+    The dict is keyed by the URIs of the obsel collections.
+    """
+    ret = _INDEXES.get(service)
+    if ret is None:
+        ret = _INDEXES[service] = {}
+    return ret
+
+
+def _filter_begin(keys, minb, maxb):
+    """Filter `keys` according to bounds on the begin timestamp.
+    """
+    for key in keys:
+        begin = key[1]
+        if minb is not None and begin < minb:
+            continue
+        if maxb is not None and begin > maxb:
+            continue
+        yield key
+
+_INF = float("inf")
+_HAS_BEGIN = KTBS.hasBegin
+_TIMESTAMPS = frozenset([KTBS.hasBegin, KTBS.hasEnd])
+_INDEXES = WeakKeyDictionary()
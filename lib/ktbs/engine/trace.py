@@ -21,30 +21,53 @@ I provide the implementation of ktbs:StoredTrace and ktbs:ComputedTrace .
 import traceback
 from datetime import datetime, timezone
 from logging import getLogger
+from numbers import Real
 
-from rdflib import BNode, Graph, Literal, URIRef, XSD
-from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib import BNode, Graph, Literal, RDF, URIRef, XSD
 
 from ktbs.engine.trace_stats import TraceStatistics
 from ktbs.time import lit2datetime, get_converter_to_unit
 from rdfrest.exceptions import InvalidDataError
 from rdfrest.cores.factory import factory as universal_factory
-from rdfrest.cores.local import compute_added_and_removed
+from rdfrest.cores.local import compute_added_and_removed, NS as RDFREST
 from rdfrest.cores.mixins import FolderishMixin
-from rdfrest.util import bounded_description, cache_result, random_token, replace_node_sparse, \
+from rdfrest.util import bounded_description, cache_result, coerce_to_uri, random_token, \
     Diagnosis
+from rdfrest.wrappers import get_wrapped
 from .base import InBase
 from .builtin_method import get_builtin_method_impl
+from .lock import notify_dirty
 from .obsel import Obsel
 from .resource import KtbsPostableMixin, METADATA
 from .trace_obsels import ComputedTraceObsels, StoredTraceObsels
+from ..api.obsel import ObselProxy, ObselRecord, _get_record_type
 from ..api.trace import AbstractTraceMixin, StoredTraceMixin, ComputedTraceMixin
-from ..namespace import KTBS, KTBS_NS_URI
+from ..namespace import KTBS
 from ..utils import extend_api, check_new
 
 
 LOG = getLogger(__name__)
 
+_POST_HOOKS = []
+
+def add_post_hook(f):
+    """Register a function to be called after obsels are posted to a stored trace.
+
+    The function is called once the POST is committed
+    (see `rdfrest.cores.local.Service.after_commit`:meth:),
+    and never if it is rolled back.
+
+    :param f: a function with signature ``f(trace, new_obsels)``,
+              where `new_obsels` is a list of obsel URIs
+              (already present in the obsel collection).
+    """
+    _POST_HOOKS.append(f)
+
+def remove_post_hook(f):
+    """Unregister a function registered with `add_post_hook`:func:.
+    """
+    _POST_HOOKS.remove(f)
+
 @extend_api
 class AbstractTrace(AbstractTraceMixin, InBase):
     """I provide the implementation of ktbs:AbstractTrace .
@@ -63,13 +86,44 @@ class AbstractTrace(AbstractTraceMixin, InBase):
         I get it from the model if available, and store it in the trace's
         metadata in case the model is not available.
         """
+        return self.get_time_conversion()[0]
+
+    def get_time_conversion(self):
+        """I return this trace's unit, origin (as a datetime) and converter.
+
+        :rtype: tuple
+
+        The converter is a function converting a timedelta into this trace's
+        unit (see `ktbs.time.get_converter_to_unit`:func:);
+        the origin and the converter can be None.
+
+        This information is cached, and only recomputed when this trace
+        or its model have changed (according to their etags).
+        """
+        model_uri = self.state.value(self.uri, KTBS.hasModel)
+        # NB: the etag of a model is only available if it is local
+        model_etag = self.service.get_metadata_graph(model_uri) \
+                         .value(model_uri, RDFREST.etag)
+        key = (next(self.iter_etags()), model_uri, model_etag)
+        cached = self._time_conversion
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        metadata = self.metadata
+        stored_unit = metadata.value(self.uri, METADATA.unit)
         try:
             unit = self.get_model().unit
-            self.metadata.set((self.uri, METADATA.unit, unit))
+            if unit != stored_unit:
+                metadata.set((self.uri, METADATA.unit, unit))
         except BaseException:
-            unit = self.metadata.value(self.uri, METADATA.unit) \
-                or KTBS.millisecond
-        return unit
+            unit = stored_unit or KTBS.millisecond
+        ret = (unit,
+               lit2datetime(self.state.value(self.uri, KTBS.hasOrigin)),
+               get_converter_to_unit(unit))
+        self._time_conversion = (key, ret)
+        return ret
+
+    _time_conversion = None
 
     @property
     @cache_result
@@ -83,6 +137,52 @@ class AbstractTrace(AbstractTraceMixin, InBase):
         obsels_uri = self.state.value(self.uri, KTBS.hasObselCollection)
         return self.service.get(obsels_uri, [self._obsels_cls.RDF_MAIN_TYPE])
 
+    ######## Abstract kTBS API ########
+
+    def iter_obsels(self, begin=None, end=None, after=None, before=None, reverse=False, bgp=None, limit=None, offset=None, refresh=None):
+        """I override :meth:`..api.trace.AbstractTraceMixin.iter_obsels`.
+
+        Unless a `bgp` is provided, I use the temporal index of the obsel
+        collection instead of a SPARQL query.
+        """
+        if bgp is not None:
+            yield from super(AbstractTrace, self).iter_obsels(
+                begin, end, after, before, reverse, bgp, limit, offset, refresh)
+            return
+
+        collection, parameters, keys = self._get_obsel_keys(
+            begin, end, after, before, reverse, limit, offset, refresh)
+        obsels_graph = collection.state
+        for _, _, obs_uri in keys:
+            obs_uri = URIRef(obs_uri)
+            types = obsels_graph.objects(obs_uri, RDF.type)
+            cls = get_wrapped(ObselProxy, types)
+            yield cls(obs_uri, collection, obsels_graph, parameters)
+
+    def iter_obsel_records(self, begin=None, end=None, after=None, before=None, reverse=False, bgp=None, limit=None, offset=None, refresh=None):
+        """I override :meth:`..api.trace.AbstractTraceMixin.iter_obsel_records`.
+
+        Unless a `bgp` is provided, I use the temporal index of the obsel
+        collection, which already provides the timestamps of the obsels.
+        """
+        if bgp is not None:
+            yield from super(AbstractTrace, self).iter_obsel_records(
+                begin, end, after, before, reverse, bgp, limit, offset, refresh)
+            return
+
+        collection, _, keys = self._get_obsel_keys(
+            begin, end, after, before, reverse, limit, offset, refresh)
+        obsels_graph = collection.state
+        subject_of = obsels_graph.value
+        for obs_end, obs_begin, obs_uri in keys:
+            obs_uri = URIRef(obs_uri)
+            yield ObselRecord(
+                obs_uri,
+                _get_record_type(obsels_graph, obs_uri),
+                obs_begin,
+                obs_end,
+                subject_of(obs_uri, KTBS.hasSubject),
+            )
 
     ######## ILocalCore (and mixins) implementation  ########
 
@@ -159,6 +259,7 @@ class AbstractTrace(AbstractTraceMixin, InBase):
         I reflect changes in the related resources (sources, obsel collection).
         """
         super(AbstractTrace, self).ack_edit(parameters, prepared)
+        self._time_conversion = None
         # manage changes in pseudo-monotonicity range
         if self.get_pseudomon_range() > prepared.old_pseudomon_range:
             with self.obsel_collection.edit(_trust=True):
@@ -195,6 +296,43 @@ class AbstractTrace(AbstractTraceMixin, InBase):
 
     ######## Private methods  ########
 
+    def _get_obsel_keys(self, begin, end, after, before, reverse, limit,
+                        offset, refresh):
+        """I retrieve the keys of the temporal index matching the parameters.
+
+        I return the (refreshed) obsel collection, the parameters to pass to
+        the obsels, and an iterator over the matching keys.
+
+        The keys are retrieved from the index by chunks of
+        `OBSELS_CHUNK_SIZE`, each chunk starting after the last key of the
+        previous one, so that the iteration can start before all keys are
+        retrieved.
+
+        See `iter_obsels`:meth: for the meaning of the parameters.
+        """
+        for name, val in (("begin", begin), ("end", end)):
+            if val is None or isinstance(val, Real):
+                pass # nothing else to do
+            elif isinstance(val, datetime):
+                raise NotImplementedError(
+                    "datetime as %s is not implemented yet" % name)
+            else:
+                raise ValueError("Invalid value for `%s` (%r)" % (name, val))
+        if after is not None:
+            after = coerce_to_uri(after)
+        if before is not None:
+            before = coerce_to_uri(before)
+
+        parameters = {}
+        if refresh is not None:
+            parameters['refresh'] = refresh
+        collection = self.obsel_collection
+        collection.force_state_refresh(parameters or None)
+        keys = _iter_index_chunks(collection, begin, end, after, before,
+                                  reverse, limit, offset,
+                                  self.OBSELS_CHUNK_SIZE)
+        return collection, parameters or None, keys
+
     def _ack_source_change(self, old_source_uris, new_source_uris):
         """I record the fact that my sources have changed
         """
@@ -320,42 +458,79 @@ class StoredTrace(StoredTraceMixin, KtbsPostableMixin, AbstractTrace):
         """I override :meth:`rdfrest.util.GraphPostableMixin.post_graph`.
 
         I allow for multiple obsels to be posted at the same time.
+
+        All the obsels are processed as a batch:
+        URIs are minted at once for all blank obsels,
+        all obsels are validated before any of them is stored
+        (so either all obsels are created, or none),
+        and they are all stored with a single call to
+        `~.trace_obsels.AbstractTraceObsels.add_obsel_graph`:meth:,
+        which updates the monotonicity tags once.
+        The whole batch is processed while holding the lock of the obsel
+        collection.
+
+        NB: `graph` is not modified.
         """
-        base = self.get_base()
-        post_single_obsel = super(StoredTrace, self).post_graph
-        binding = { "trace": self.uri }
-        ret = []
-        candidates = [ i[0] for i in graph.query(_SELECT_CANDIDATE_OBSELS,
-                                                 initBindings=binding) ]
-        bnode_candidates = { i for i in candidates
-                               if isinstance(i, BNode) }
-        with self.obsel_collection.edit({"add_obsels_only":1}, _trust=True):
-            for candidate in candidates:
-                if isinstance(candidate, BNode):
-                    bnode_candidates.remove(candidate)
-                obs_graph = bounded_description(candidate, graph, prune=bnode_candidates)
-                for other in bnode_candidates:
-                    obs_graph.remove((candidate, None, other))
-                    obs_graph.remove((other, None, candidate))
-
-                ret1 = post_single_obsel(obs_graph, parameters, _trust, candidate,
-                                         KTBS.Obsel)
-                if ret1:
-                    assert len(ret1) == 1
-                    new_obs = ret1[0]
-                    ret.append(new_obs)
-                    if new_obs != candidate:
-                        replace_node_sparse(graph, candidate, new_obs)
-
-        assert not bnode_candidates, bnode_candidates
-        if not ret:
+        # unused argument '_rdf_type' #pylint: disable=W0613
+        self.check_parameters(parameters, parameters, "post_graph")
+        # candidates are sorted by their begin and end timestamps,
+        # obsels with no begin timestamp being considered as the most recent
+        graph_value = graph.value
+        candidates = sorted(
+            graph.subjects(KTBS.hasTrace, self.uri),
+            key=lambda obs: _candidate_key(graph_value(obs, KTBS.hasBegin),
+                                           graph_value(obs, KTBS.hasEnd)),
+        )
+        if not candidates:
             raise InvalidDataError("No obsel found in posted graph")
 
+        # the whole batch is processed inside a single edit context,
+        # so that no other obsel can be posted concurrently
+        # between the minting of the URIs and the storage of the obsels
+        obsels = self.obsel_collection
+        with obsels.edit({"add_obsels_only": 1}, _trust=True):
+            bnode_candidates = [ i for i in candidates if isinstance(i, BNode) ]
+            if bnode_candidates:
+                minted = Obsel.mint_uris(self, graph, bnode_candidates)
+                graph = _replace_nodes(graph, minted)
+                candidates = [ minted.get(i, i) for i in candidates ]
+                minted = set(minted.values())
+            else:
+                minted = ()
+
+            service = self.service
+            check_posted_graph = self.check_posted_graph
+            complete_new_graph = Obsel.complete_new_graph
+            check_new_graph = Obsel.check_new_graph
+            new_graph = Graph()
+            new_graph_addn = new_graph.addN
+            diag = Diagnosis("post_graph")
+            for created in candidates:
+                obs_graph = bounded_description(created, graph)
+                if not _trust:
+                    if created not in minted:
+                        diag &= check_posted_graph(parameters, created,
+                                                   obs_graph)
+                    complete_new_graph(service, created, None, obs_graph)
+                    diag &= check_new_graph(service, created, None, obs_graph)
+                else: # graph is trusted so it SHOULD verify the assert below
+                    assert check_new_graph(service, created, None, obs_graph), \
+                           check_new_graph(service, created, None, obs_graph)
+                new_graph_addn( (s, p, o, new_graph) for s, p, o in obs_graph )
+            if not diag:
+                raise InvalidDataError(str(diag))
+
+            obsels.add_obsel_graph(new_graph)
+            for created in candidates:
+                self.ack_post(parameters, created, new_graph)
+
         stats = self.trace_statistics
         if stats:
             # Traces created before @stats was introduced have no trace_statistics
             stats.metadata.set((stats.uri, METADATA.dirty, YES))
-        return ret
+        for hook in _POST_HOOKS:
+            self.service.after_commit(hook, self, candidates)
+        return candidates
 
     def get_created_class(self, rdf_type):
         """I override
@@ -366,22 +541,55 @@ class StoredTrace(StoredTraceMixin, KtbsPostableMixin, AbstractTrace):
         # self is not used #pylint: disable=R0201
         return Obsel
 
-# the following query gets all the candidate obsels in a POSTed graph,
-# and orders them correctly, guessing implicit values
-_SELECT_CANDIDATE_OBSELS = prepareQuery("""
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    PREFIX : <%s#>
-    SELECT ?obs
-           (IF(bound(?b), ?b, "INF"^^xsd:float) as ?begin)
-           (IF(bound(?e), ?e, ?begin) as ?end)
-           $trace # selected solely to please Virtuoso
-    WHERE {
-        ?obs :hasTrace ?trace
-        OPTIONAL { ?obs :hasBegin ?b }
-        OPTIONAL { ?obs :hasEnd   ?e }
-    }
-    ORDER BY ?begin ?end
-""" % KTBS_NS_URI)
+def _iter_index_chunks(collection, begin, end, after, before, reverse,
+                       limit, offset, chunk_size):
+    """Iter over the keys of the temporal index of `collection`, by chunks.
+
+    See `AbstractTrace._get_obsel_keys`:meth:.
+    """
+    while limit is None or limit > 0:
+        size = chunk_size if limit is None else min(limit, chunk_size)
+        keys = list(collection.get_temporal_index().slice(
+            minb=begin, maxe=end, after=after, before=before,
+            reverse=reverse, limit=size, offset=offset,
+        ))
+        yield from keys
+        if len(keys) < size:
+            return
+        if limit is not None:
+            limit -= size
+        offset = None
+        if reverse:
+            before = keys[-1]
+        else:
+            after = keys[-1]
+
+def _candidate_key(begin, end):
+    """Compute the sort key of a posted obsel, given its timestamps.
+
+    Missing (or invalid) begin timestamps are considered infinite,
+    missing end timestamps are considered equal to the begin timestamp.
+    """
+    try:
+        begin = float(begin)
+    except (TypeError, ValueError):
+        begin = _INF
+    try:
+        end = float(end)
+    except (TypeError, ValueError):
+        end = begin
+    return begin, end
+
+def _replace_nodes(graph, replacements):
+    """Return a copy of `graph` where some nodes are replaced.
+
+    :param graph: the graph to copy
+    :param replacements: a dict mapping nodes to their replacement
+    """
+    ret = Graph()
+    get = replacements.get
+    ret.addN( (get(s, s), p, get(o, o), ret) for s, p, o in graph )
+    return ret
 
 
 class ComputedTrace(ComputedTraceMixin, FolderishMixin, AbstractTrace):
@@ -556,13 +764,16 @@ class ComputedTrace(ComputedTraceMixin, FolderishMixin, AbstractTrace):
         """Notify me that my source(s) have changed.
 
         Note that the resulting recomputation will only occur when my state
-        (or the state of my obsel collection) is required.
+        (or the state of my obsel collection) is required,
+        unless a background process is notified (see `.lock.notify_dirty`:func:)
+        -- which only happens once the dirty bit is committed.
         """
         if metadata:
             self.metadata.add((self.uri, METADATA.dirty, YES))
         if obsels:
             obsels = self.obsel_collection
             obsels.metadata.add((obsels.uri, METADATA.dirty, YES))
+            self.service.after_commit(notify_dirty, self.service)
 
     __method_impl = None
     # do NOT use @cache_result here, as the result may change over time
@@ -594,3 +805,4 @@ class ComputedTrace(ComputedTraceMixin, FolderishMixin, AbstractTrace):
         return ret
 
 YES = Literal('yes')
+_INF = float("inf")
@@ -23,8 +23,7 @@ from itertools import chain
 from logging import getLogger
 import sys
 
-from rdflib import Graph, Literal, RDF
-from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib import BNode, Graph, Literal, RDF, URIRef
 
 from rdfrest.exceptions import CanNotProceedError, InvalidParametersError, \
     MethodNotAllowedError
@@ -32,6 +31,8 @@ from rdfrest.cores.local import NS as RDFREST
 from rdfrest.util import Diagnosis, coerce_to_uri
 from .lock import WithLockMixin
 from .resource import KtbsResource, METADATA
+from .temporal_index import TemporalIndex, TimestampTrackingGraph, \
+    get_temporal_indexes
 from ..api.trace_obsels import AbstractTraceObselsMixin
 from ..namespace import KTBS
 
@@ -41,6 +42,11 @@ LOG = getLogger(__name__)
 class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource):
     """I provide the implementation of ktbs:AbstractTraceObsels
     """
+    def __init__(self, service, uri):
+        super(AbstractTraceObsels, self).__init__(service, uri)
+        # track timestamp changes, in order to patch the temporal index
+        self._graph = TimestampTrackingGraph(service.store, uri)
+
     ######## Public methods ########
     # (only available in the local implementation)
 
@@ -145,12 +151,75 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         with self.edit({"add_obsels_only": 1}, _trust=_trust) \
         as editable:
             prepared = self._edit_context[2]
+            # keep track of actually new obsels, for incremental statistics
+            trace_uri = self.trace_uri
+            prepared.new_obsels.extend(
+                obs for obs in graph.subjects(KTBS.hasTrace, trace_uri)
+                if (obs, KTBS.hasTrace, trace_uri) not in editable
+            )
             # inner context is used to apply the changes and have them
             # go through check_new_graph
             editable.addN( (s, p, o, editable) for (s, p, o) in graph)
 
             self._detect_mon_change(graph, prepared)
 
+    def get_temporal_index(self):
+        """Return the `.temporal_index.TemporalIndex`:class: of this collection.
+
+        The index is built from the store the first time it is required,
+        or if it has been invalidated by a change it could not track.
+        It is then patched by `ack_edit`:meth: after every edit.
+
+        NB: this does *not* refresh a computed obsel collection;
+        `force_state_refresh`:meth: must be called beforehand if required.
+        """
+        indexes = get_temporal_indexes(self.service)
+        etag = self.etag
+        ret = indexes.get(self.uri)
+        if ret is None or ret.etag != etag:
+            LOG.debug("building temporal index of <%s>", self.uri)
+            ret = indexes[self.uri] = TemporalIndex.from_graph(self._graph,
+                                                               etag)
+        return ret
+
+
+    def reserve_obsel_ids(self, count=1):
+        """Reserve `count` values of the obsel counter of this collection.
+
+        :rtype: range
+
+        The counter is stored in the metadata of the collection, and is used
+        to mint obsel URIs
+        (see `~.obsel._ObselImpl.mint_uris`:meth:).
+        The counter is read and updated while holding the lock of this
+        collection, so that concurrent calls never reserve the same values.
+        """
+        metadata = self.metadata
+        with self.lock(self):
+            start = metadata.value(self.uri, METADATA.obsel_counter)
+            start = 0 if start is None else int(start)
+            metadata.set((self.uri, METADATA.obsel_counter,
+                          Literal(start+count)))
+        return range(start, start+count)
+
+    def get_obsel_count(self):
+        """Return the number of obsels in this collection.
+
+        The count is stored in the metadata of the collection,
+        and maintained by `ack_edit`:meth: whenever possible;
+        otherwise, it is recomputed (and stored) on demand.
+
+        NB: this does *not* refresh a computed obsel collection;
+        `force_state_refresh`:meth: must be called beforehand if required.
+        """
+        metadata = self.metadata
+        count = metadata.value(self.uri, METADATA.obsel_count)
+        if count is None:
+            count = sum( 1 for _ in
+                         self._graph.subjects(KTBS.hasTrace, self.trace_uri) )
+            metadata.set((self.uri, METADATA.obsel_count, Literal(count)))
+            return count
+        return int(count)
 
     ######## ICore implementation  ########
 
@@ -183,16 +252,10 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
             for triple in self.state.triples((None, None, self.uri)):
                 graph_add(triple)
 
-            # build SPARQL query to retrieve matching obsels
-            # NB: not sure if caching the parsed query would be beneficial here
-            query_filter = []
+            # retrieve matching obsels from the temporal index
             minb = parameters.get("minb")
             maxb = parameters.get("maxb")
-            if maxb is not None:
-                query_filter.append("?b <= %s" % maxb)
             mine = parameters.get("mine")
-            if mine is not None:
-                query_filter.append("?e >= %s" % mine)
             maxe = parameters.get("maxe")
             after = parameters.get("after")
             if after is not None:
@@ -200,77 +263,29 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
             before = parameters.get("before")
             if before is not None:
                 before = coerce_to_uri(before)
-            if query_filter:
-                query_filter = "FILTER((%s))" % (") && (".join(query_filter))
-            else:
-                query_filter = ""
 
             reverse = (parameters.get("reverse", "no").lower()
                        not in ("false", "no", "0"))
             limit = parameters.get("limit")
             offset = parameters.get("offset")
 
-            matching_obsels = [
-                row[0].n3() for row in self.state.query(
-                    self.build_select(minb, maxe, after, before, reverse,
-                                      query_filter, limit, offset),
-                    initNs={
-                        "ktbs": "http://liris.cnrs.fr/silex/2009/ktbs#"
-                    },
-                )
-            ]
-
-            LOG.debug("%s matching obsels", len(matching_obsels))
-            if len(matching_obsels) == 0:
-                matching_obsels.append('<tag:>')
-                # this is a hack because rdflib 4.2.2 does not support an empty VALUES list
-                # but it should not match anything
-
-            query_str = """PREFIX ktbs: <http://liris.cnrs.fr/silex/2009/ktbs#>
-                SELECT ?s ?p ?o ?strc ?otrc ?obs {
-                  VALUES ?obs { %s }
-                  {
-                    ?obs ?p ?o.
-                    BIND(?obs as ?s)
-                    OPTIONAL { ?o ktbs:hasTrace ?otrc }
-                  } UNION {
-                    ?s ?p ?obs.
-                    BIND(?obs as ?o)
-                    OPTIONAL { ?s ktbs:hasTrace ?strc }
-                  } UNION {
-                    ?obs ?p1 ?s.
-                    FILTER isBlank(?s)
-                    ?s ?p ?o.
-                  } UNION {
-                    ?obs ?p1 ?b1.
-                    FILTER isBlank(?b1)
-                    ?b1 ?p2 ?s.
-                    FILTER isBlank(?s)
-                    ?s ?p ?o.
-                  }
-                }
-                """% (' '.join(matching_obsels))
-
-            results = self.state.query(query_str)
-            LOG.debug("described by %s triples", len(results))
+            matching_keys = list(self.get_temporal_index().slice(
+                minb, maxb, mine, maxe, after, before, reverse, limit, offset,
+            ))
+            LOG.debug("%s matching obsels", len(matching_keys))
 
             # add description of all matching obsels
-            old_graph_len = len(graph)
-            graph_add = graph.add
-            for s, p, o, strc, otrc, obs in results:
-                graph_add((s, p, o))
-                if strc is not None:
-                    graph_add((s, KTBS.hasTrace, strc))
-                if otrc is not None:
-                    graph_add((o, KTBS.hasTrace, otrc))
-
-            if len(graph) > old_graph_len:
-                maxe_triple = max(( t for t in graph.triples((None, KTBS.hasEnd, None)) ),
-                                  key=lambda t: t[2].toPython() )
-                maxobs = maxe_triple[0]
-                maxobs_end = maxe_triple[2].toPython()
+            self._describe_obsels((URIRef(key[2]) for key in matching_keys),
+                                  graph)
+            LOG.debug("described by %s triples", len(graph))
+
+            if matching_keys:
+                # the next page starts after the last obsel of this page
+                # (in the order of this page)
+                lastobs = matching_keys[-1][2]
+                maxobs_end = max(matching_keys[0][0], matching_keys[-1][0])
             else:
-                maxobs = maxobs_end = None
+                lastobs = maxobs_end = None
 
             # canonical link
             graph.links = links = [{
@@ -280,8 +295,8 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
                 'mstable-etag': self.get_str_mon_tag(),
             }]
             # link to next page
-            if limit and maxobs:
-                obs_id = maxobs.rsplit("/", 1)[1]
+            if limit and lastobs:
+                obs_id = lastobs.rsplit("/", 1)[1]
                 if reverse:
                     qstr = "?reverse&limit=%s&before=%s" % (limit, obs_id)
                 else:
@@ -369,10 +384,20 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         ret = super(AbstractTraceObsels, self).prepare_edit(parameters)
         ret.last_obsel = obs = self.metadata.value(self.uri, METADATA.last_obsel)
         if obs is not None:
-            ret.last_begin = int(self.state.value(obs, KTBS.hasBegin))
-            ret.last_end = int(self.state.value(obs, KTBS.hasEnd))
+            ret.last_begin, ret.last_end = self._get_last_timestamps(obs)
         ret.str_mon = ret.pse_mon = ret.log_mon = (
             parameters and "add_obsels_only" in parameters)
+        ret.old_etag = self.etag
+        ret.new_obsels = []
+        ret.obsel_count = self.metadata.value(self.uri, METADATA.obsel_count)
+        # the temporal index is withdrawn during the edit,
+        # so that it does not survive a failed edit;
+        # it is patched in ack_edit with the obsels whose timestamps changed
+        self._graph.reset_touched()
+        index = get_temporal_indexes(self.service).pop(self.uri, None)
+        if index is not None and index.etag != self.etag:
+            index = None
+        ret.temporal_index = index
         return ret
 
     def ack_edit(self, parameters, prepared):
@@ -383,33 +408,74 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         # additional argument _query_cache #pylint: disable=W0221
         super(AbstractTraceObsels, self).ack_edit(parameters, prepared)
 
+        # patch the temporal index
+        index = prepared.temporal_index
+        touched = self._graph.touched
+        obsel_count = None
+        if index is not None and touched is not None:
+            graph_value = self._graph.value
+            for node in touched:
+                begin = graph_value(node, KTBS.hasBegin)
+                end = graph_value(node, KTBS.hasEnd)
+                if begin is not None and end is not None:
+                    index.add(node, begin, end)
+                else:
+                    index.discard(node)
+            index.etag = self.etag
+            get_temporal_indexes(self.service)[self.uri] = index
+            obsel_count = len(index)
+        elif prepared.obsel_count is not None and touched is not None:
+            # obsels whose timestamps were merely re-added are not counted
+            obsel_count = int(prepared.obsel_count) + self._graph.begin_delta
+        self._graph.reset_touched()
+
         # find the last obsel and store it in metadata
         if parameters and "add_obsels_only" in parameters:
-            new_last_obsel = prepared.last_obsel
-        else:
-            init_bindings = {}
-            if prepared.last_obsel is not None:
-                last_end = self.state.value(prepared.last_obsel, KTBS.hasEnd)
-                # NB: last_end can still be None if last_obsel has been deleted
-                if last_end is not None:
-                    init_bindings['last_end'] = Literal(prepared.last_end)
-            results = list(self.state.query(FIND_LAST_OBSEL,
-                                            initBindings=init_bindings))
-            if results:
-                new_last_obsel = results[0][0]
+            if prepared.last_obsel is None:
+                last_key = None
             else:
-                new_last_obsel = None
+                last_key = (prepared.last_end, prepared.last_begin,
+                            prepared.last_obsel)
+        else:
+            # NB: if the index was not patched above, it is rebuilt here
+            last_key = self.get_temporal_index().last()
 
-        if new_last_obsel is not None:
-            self.metadata.set((self.uri, METADATA.last_obsel, new_last_obsel))
+        metadata = self.metadata
+        if obsel_count is not None:
+            metadata.set((self.uri, METADATA.obsel_count, Literal(obsel_count)))
         else:
-            self.metadata.remove((self.uri, METADATA.last_obsel, None))
+            # will be recomputed by get_obsel_count if required
+            metadata.remove((self.uri, METADATA.obsel_count, None))
+
+        if last_key is not None:
+            last_end, last_begin, last_obsel = last_key
+            metadata.set((self.uri, METADATA.last_obsel, URIRef(last_obsel)))
+            metadata.set((self.uri, METADATA.last_begin, Literal(last_begin)))
+            metadata.set((self.uri, METADATA.last_end, Literal(last_end)))
+        else:
+            metadata.remove((self.uri, METADATA.last_obsel, None))
+            metadata.remove((self.uri, METADATA.last_begin, None))
+            metadata.remove((self.uri, METADATA.last_end, None))
 
-        # force transformed traces to refresh
+        # update statistics incrementally if possible
         trace = self.trace
+        if (parameters and "add_obsels_only" in parameters
+            and prepared.new_obsels):
+            stats = trace.trace_statistics
+            if stats is not None:
+                stats.ack_new_obsels(prepared.old_etag, self.etag,
+                                     prepared.new_obsels)
+
+        # force transformed traces to refresh
         for ttr in trace.iter_transformed_traces():
             ttr._mark_dirty(False, True)
 
+    def ack_delete(self, parameters):
+        """I override :meth:`rdfrest.util.EditableCore.ack_delete`.
+        """
+        super(AbstractTraceObsels, self).ack_delete(parameters)
+        get_temporal_indexes(self.service).pop(self.uri, None)
+
     def delete(self, parameters=None, _trust=False):
         """I override :meth:`.KtbsResource.delete`.
 
@@ -428,6 +494,16 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
     # TODO SOON implement check_new_graph on ObselCollection?
     # we should check that the graph only contains well formed obsels
 
+    def get_representation_dependencies(self, parameters=None):
+        """I implement the hook used by the cache of
+        `rdfrest.http_server.HttpFrontend`:class:.
+
+        Some serializations embed information about the trace
+        (e.g. its model), so they depend on it.
+        """
+        # unused argument 'parameters' #pylint: disable=W0613
+        return (self.trace,)
+
     def iter_etags(self, parameters=None):
         """I override :meth:`rdfrest.cores.mixins.BookkeepingMixin._iter_etags`
 
@@ -445,9 +521,11 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         if parameters is not None:
             last_obsel = self.metadata.value(self.uri, METADATA.last_obsel)
             if last_obsel is not None:
-                last_end = int(self.state.value(last_obsel, KTBS.hasEnd))
+                _, last_end = self._get_last_timestamps(last_obsel)
                 maxe = parameters.get("maxe")
                 before = parameters.get("before")
+                if before is not None:
+                    before = coerce_to_uri(before)
                 if before == last_obsel:
                     yield self.str_mon_tag
                 elif maxe is not None or before is not None:
@@ -480,63 +558,137 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         if prepared is None  or  not prepared.log_mon:
             graph.set((uri, METADATA.log_mon_tag, Literal(token+"l")))
 
+    def _get_last_timestamps(self, last_obsel):
+        """Return the begin and end timestamps of the last obsel.
+
+        They are stored in metadata by `ack_edit`:meth:,
+        but stores populated by older versions may lack them.
+        """
+        metadata_value = self.metadata.value
+        last_begin = metadata_value(self.uri, METADATA.last_begin)
+        last_end = metadata_value(self.uri, METADATA.last_end)
+        if last_begin is None or last_end is None:
+            last_begin = self._graph.value(last_obsel, KTBS.hasBegin)
+            last_end = self._graph.value(last_obsel, KTBS.hasEnd)
+        return int(last_begin), int(last_end)
+
+    def _describe_obsels(self, obsels, graph):
+        """Add to `graph` the description of all `obsels`.
+
+        The description of an obsel contains:
+
+        * all its outgoing arcs, and the outgoing arcs of blank nodes
+          reachable from it (up to two levels deep),
+        * all its incoming arcs,
+        * the ``ktbs:hasTrace`` arcs of its neighbouring obsels
+          (which may belong to other traces).
+
+        This uses direct `triples` lookups rather than a SPARQL query,
+        as the latter would have to enumerate all the obsels.
+        """
+        state = self.state
+        triples = state.triples
+        objects = state.objects
+        graph_add = graph.add
+        has_trace = KTBS.hasTrace
+        for obs in obsels:
+            for triple in triples((obs, None, None)):
+                graph_add(triple)
+                obj = triple[2]
+                if isinstance(obj, BNode):
+                    for triple1 in triples((obj, None, None)):
+                        graph_add(triple1)
+                        obj1 = triple1[2]
+                        if isinstance(obj1, BNode):
+                            for triple2 in triples((obj1, None, None)):
+                                graph_add(triple2)
+                elif isinstance(obj, URIRef):
+                    for trc in objects(obj, has_trace):
+                        graph_add((obj, has_trace, trc))
+            for triple in triples((None, None, obs)):
+                graph_add(triple)
+                subj = triple[0]
+                for trc in objects(subj, has_trace):
+                    graph_add((subj, has_trace, trc))
+
     def _detect_mon_change(self, graph, prepared):
         """Detect monotonicity changed induced by 'graph', and update `prepared` accordingly.
 
         Note that this is called after graph has been added to self.state,
         so all arcs from graph are also in state.
+
+        `graph` may contain several new obsels; they are all compared to the
+        last obsel *before* the edit, so adding a batch of obsels after all
+        existing obsels is strictly monotonic, regardless of how the new
+        obsels relate to each other.
         """
         trace_uri = self.trace_uri
-        new_obs = graph.value(None, KTBS.hasTrace, trace_uri)
-        if prepared.last_obsel is None:
-            prepared.last_obsel = new_obs
-            prepared.last_begin = int(graph.value(new_obs, KTBS.hasBegin))
-            prepared.last_end = int(graph.value(new_obs, KTBS.hasEnd))
+        new_obsels = list(graph.subjects(KTBS.hasTrace, trace_uri))
+        if not new_obsels:
             return
+        self_state_value = self.state.value
 
         old_last_obsel = prepared.last_obsel
-        old_last_begin = prepared.last_begin
-        old_last_end = prepared.last_end
-        pseudomon_range = self.trace.pseudomon_range
-        pse_mon_b_limit = old_last_begin - pseudomon_range
-        pse_mon_e_limit = old_last_end - pseudomon_range
+        if old_last_obsel is None:
+            last_key = None
+        else:
+            old_last_begin = prepared.last_begin
+            old_last_end = prepared.last_end
+            last_key = (old_last_end, old_last_begin, str(old_last_obsel))
+            pseudomon_range = self.trace.pseudomon_range
+            pse_mon_b_limit = old_last_begin - pseudomon_range
+            pse_mon_e_limit = old_last_end - pseudomon_range
 
         str_mon = True
         pse_mon = True
-        self_state_value = self.state.value
+        new_last_key = last_key
+        new_last_obsel = old_last_obsel
         # we used a SPARQL query before, but this seems to be more efficient...
         # check all new obsels, but also their *related* obsels
         # (as the relation changes *both* obsels)
-        for obs in chain( [new_obs],
-                          graph.objects(new_obs, None),
-                          graph.subjects(None, new_obs)):
-            if not obs.startswith(trace_uri):
-                continue # not an obsel of this trace, skip it
-            end = self_state_value(obs, KTBS.hasEnd)
+        for new_obs in new_obsels:
+            end = self_state_value(new_obs, KTBS.hasEnd)
             if end is None:
                 continue # not an obsel, skip it
-            end = int(end)
-            begin = None
-            if end < old_last_end:
-                str_mon = False
-                if end < pse_mon_e_limit:
-                    pse_mon = False
-            elif end == old_last_end:
-                begin = int(self_state_value(obs, KTBS.hasBegin))
-                if begin < old_last_begin:
+            key = (int(end), int(self_state_value(new_obs, KTBS.hasBegin)),
+                   str(new_obs))
+            if new_last_key is None or key > new_last_key:
+                new_last_key = key
+                new_last_obsel = new_obs
+            if last_key is None:
+                continue # the collection was empty, monotonicity is preserved
+
+            for obs in chain( [new_obs],
+                              graph.objects(new_obs, None),
+                              graph.subjects(None, new_obs)):
+                if not obs.startswith(trace_uri):
+                    continue # not an obsel of this trace, skip it
+                if obs is new_obs:
+                    end, begin = key[0], key[1]
+                else:
+                    end = self_state_value(obs, KTBS.hasEnd)
+                    if end is None:
+                        continue # not an obsel, skip it
+                    end = int(end)
+                    begin = None
+                if end < old_last_end:
                     str_mon = False
-                    if begin < pse_mon_b_limit:
+                    if end < pse_mon_e_limit:
                         pse_mon = False
-                elif begin == old_last_begin:
-                    if obs <= old_last_obsel:
+                elif end == old_last_end:
+                    if begin is None:
+                        begin = int(self_state_value(obs, KTBS.hasBegin))
+                    if begin < old_last_begin:
                         str_mon = False
-            if obs is new_obs and str_mon:
-                prepared.last_obsel = new_obs
-                if begin is None:
-                    begin = int(graph.value(new_obs, KTBS.hasBegin))
-                prepared.last_begin = begin
-                prepared.last_end = end
-
+                        if begin < pse_mon_b_limit:
+                            pse_mon = False
+                    elif begin == old_last_begin:
+                        if obs <= old_last_obsel:
+                            str_mon = False
+
+        if new_last_key is not None:
+            prepared.last_obsel = new_last_obsel
+            prepared.last_end, prepared.last_begin = new_last_key[:2]
         prepared.str_mon = prepared.str_mon and str_mon
         prepared.pse_mon = prepared.pse_mon and pse_mon
 
@@ -587,8 +739,8 @@ class ComputedTraceObsels(AbstractTraceObsels):
                 trace = self.trace
                 if refresh_param == 2:
                     parameters['refresh'] = 'default' # do not transmit 'force' to sources
-                for src in trace._iter_effective_source_traces():
-                    src.obsel_collection.force_state_refresh(parameters)
+                impl = trace._method_impl # friend #pylint: disable=W0212
+                impl.refresh_sources(trace, parameters)
                 if (refresh_param >= 2 or
                     self.metadata.value(self.uri, METADATA.dirty, None) is not None):
 
@@ -598,7 +750,6 @@ class ComputedTraceObsels(AbstractTraceObsels):
                         # get_state do not result in an infinite recursion
                         self.metadata.remove((self.uri, METADATA.dirty, None))
                         trace.force_state_refresh()
-                        impl = trace._method_impl # friend #pylint: disable=W0212
                         try:
                             diag = impl.compute_obsels(trace, refresh_param >= 2)
                         except BaseException as ex:
@@ -651,17 +802,6 @@ class ComputedTraceObsels(AbstractTraceObsels):
             editable.remove((None, None, None))
             self.init_graph(editable, self.uri, trace_uri)
 
-FIND_LAST_OBSEL = prepareQuery("""
-    PREFIX : <http://liris.cnrs.fr/silex/2009/ktbs#>
-    SELECT ?o
-        ?last__end # selected solely to please Virtuoso
-    {
-        ?o :hasEnd ?e .
-        FILTER ( !BOUND(?last_end) || (?e >= ?last_end) )
-    }
-    ORDER BY DESC(?e) LIMIT 1
-""")
-
 _REFRESH_VALUES = {
     "no": 0,
     "default": 1,
@@ -670,3 +810,22 @@ _REFRESH_VALUES = {
     "recursive": 3,
     None: 1,
 }
+
+def iter_dirty_obsel_collections(service):
+    """Iter over the computed obsel collections of service requiring recomputation.
+
+    The dirty bits set in the metadata of obsel collections
+    (see `.trace.ComputedTrace._mark_dirty`:meth:)
+    are looked up directly in the store,
+    which is much cheaper than crawling all the traces.
+    Only the URIs of obsel collections are considered
+    (the dirty bits of traces and trace statistics are ignored),
+    so that no other resource is loaded.
+    """
+    uris = set( s for (s, _, _), _
+                in service.store.triples((None, METADATA.dirty, None), None)
+                if s.endswith("@obsels") )
+    for uri in uris:
+        obsels = service.get(uri)
+        if isinstance(obsels, ComputedTraceObsels):
+            yield obsels
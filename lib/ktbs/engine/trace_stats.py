@@ -24,7 +24,7 @@ from rdflib import Literal, RDF, BNode, Variable
 from rdflib.namespace import Namespace
 
 from rdfrest.exceptions import InvalidParametersError, MethodNotAllowedError
-from .lock import WithLockMixin
+from .lock import WithLockMixin, posix_ipc
 from .resource import KtbsResource, METADATA
 from .trace_obsels import _REFRESH_VALUES
 from ..api.trace_stats import TraceStatisticsMixin
@@ -35,12 +35,31 @@ LOG = getLogger(__name__)
 
 NS = Namespace('http://tbs-platform.org/2016/trace-stats#')
 _PLUGINS = []
+_INCREMENTAL_HOOKS = {}
 
-def add_plugin(f):
+def add_plugin(f, incremental=None):
+    """Register a statistics plugin.
+
+    :param f: a function populating the statistics graph, with signature
+              ``f(graph, trace)``
+    :param incremental: an optional function updating the statistics graph
+              after obsels have been added to the trace, with signature
+              ``incremental(graph, trace, new_obsels)``,
+              where `new_obsels` is a list of obsel URIs
+              (already present in the obsel collection).
+
+    As long as one of the registered plugins has no incremental hook,
+    statistics are fully recomputed after every change.
+    """
     _PLUGINS.append(f)
+    if incremental is not None:
+        _INCREMENTAL_HOOKS[f] = incremental
 
 def remove_plugin(f):
+    """Unregister a statistics plugin.
+    """
     _PLUGINS.remove(f)
+    _INCREMENTAL_HOOKS.pop(f, None)
 
 class TraceStatistics(TraceStatisticsMixin, WithLockMixin, KtbsResource):
     """I provide the implementation of TraceStatistics
@@ -55,6 +74,46 @@ class TraceStatistics(TraceStatisticsMixin, WithLockMixin, KtbsResource):
         graph.add((trace_uri, KTBS.hasTraceStatistics, stats_uri))
         graph.add((stats_uri, RDF.type, cls.RDF_MAIN_TYPE))
 
+    def ack_new_obsels(self, old_obsels_etag, new_obsels_etag, new_obsels):
+        """Update the statistics after obsels have been added to the trace.
+
+        :param old_obsels_etag: the etag of the obsel collection before
+                                the obsels were added
+        :param new_obsels_etag: the etag of the obsel collection after
+                                the obsels were added
+        :param new_obsels: the URIs of the added obsels
+
+        :return: whether the statistics could be updated
+
+        This is only possible if the statistics were up to date before the
+        obsels were added, and if all plugins support incremental updates.
+        Otherwise, the statistics are left as is, and will be fully
+        recomputed on the next refresh.
+        """
+        metadata = self.metadata
+        seen_obs_etag = metadata.value(self.uri, METADATA.obselsEtag, None)
+        if seen_obs_etag is None or str(seen_obs_etag) != old_obsels_etag:
+            return False
+        seen_trc_etag = metadata.value(self.uri, METADATA.traceEtag, None)
+        if seen_trc_etag is None \
+        or str(seen_trc_etag) != next(self.trace.iter_etags()):
+            return False
+        if any(plugin not in _INCREMENTAL_HOOKS for plugin in _PLUGINS):
+            return False
+
+        try:
+            # we may be called while the obsel collection is locked,
+            # so we must not wait for this lock (to avoid deadlocks)
+            with self.lock(self, 0):
+                with self.edit(None, _trust=True) as editable:
+                    self._populate_incrementally(editable, self.trace,
+                                                 new_obsels)
+                    metadata.set((self.uri, METADATA.obselsEtag,
+                                  Literal(new_obsels_etag)))
+        except posix_ipc.BusyError:
+            return False
+        return True
+
     ######## ICore implementation  ########
 
     __forcing_state_refresh = None
@@ -199,6 +258,45 @@ class TraceStatistics(TraceStatisticsMixin, WithLockMixin, KtbsResource):
                 LOG.error("Error while populating <%s>", self.uri)
                 LOG.exception(ex)
 
+    def _populate_incrementally(self, graph, trace, new_obsels):
+        """I update graph with statistics about new obsels of trace.
+
+        :type graph: :class:`rdflib.Graph`
+
+        """
+        obsels_graph = trace.obsel_collection.state
+        obsels_value = obsels_graph.value
+        trace_uri = trace.uri
+
+        # Obsel count
+        count = graph.value(trace_uri, NS.obselCount)
+        count = (0 if count is None else int(count)) + len(new_obsels)
+        graph.set((trace_uri, NS.obselCount, Literal(count)))
+
+        # Duration statistics
+        minb = graph.value(trace_uri, NS.minTime)
+        maxe = graph.value(trace_uri, NS.maxTime)
+        minb = None if minb is None else int(minb)
+        maxe = None if maxe is None else int(maxe)
+        for obs in new_obsels:
+            begin = int(obsels_value(obs, KTBS.hasBegin))
+            end = int(obsels_value(obs, KTBS.hasEnd))
+            if minb is None or begin < minb:
+                minb = begin
+            if maxe is None or end > maxe:
+                maxe = end
+        if minb is not None:
+            graph.set((trace_uri, NS.minTime, Literal(minb)))
+            graph.set((trace_uri, NS.maxTime, Literal(maxe)))
+            graph.set((trace_uri, NS.duration, Literal(maxe - minb)))
+
+        for plugin in _PLUGINS:
+            try:
+                _INCREMENTAL_HOOKS[plugin](graph, trace, new_obsels)
+            except BaseException as ex:
+                LOG.error("Error while populating <%s>", self.uri)
+                LOG.exception(ex)
+
 
 COUNT_OBSELS='SELECT (COUNT(?o) as ?c) { ?o :hasTrace $trace }'
 DURATION_TIME="""
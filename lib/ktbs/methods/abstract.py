@@ -105,6 +105,26 @@ class AbstractMonosourceMethod(IMethod):
         """
         pass
 
+    def get_obsel_stream(self, computed_trace, cstate, graph):
+        """Return a function computing the obsels as a stream, or None.
+
+        The returned function accepts an iterable of
+        `~..api.obsel.ObselRecord`:class:, describing obsels in `graph`
+        (which may be the source trace or one of its own sources,
+        see `.pipe`:mod:),
+        and yields one record for each obsel that the method would produce
+        as a copy of the obsel with the same URI, with possibly another type.
+        It must yield each record before consuming the next one.
+
+        This is only possible for methods that select (and possibly retype)
+        obsels independently of each other.
+        The default implementation returns None,
+        meaning that the method does not support streaming.
+
+        `cstate` is the custom computation state, as set by `init_state`:meth:.
+        """
+        return None
+
     # the following methods must be overridden by subclasses
 
     def do_compute_obsels(self, computed_trace, cstate, monotonicity, diag):
@@ -193,6 +213,22 @@ class AbstractMonosourceMethod(IMethod):
                                      ))
         return diag
 
+    def prepare_obsel_stream(self, computed_trace, graph, diag):
+        """Return the stream function of the method, or None.
+
+        See `get_obsel_stream`:meth:.
+        None is also returned if the parameters of `computed_trace`
+        are not valid.
+        """
+        params = self._prepare_params(computed_trace, diag)
+        if params is None or len(computed_trace.source_traces) != 1:
+            return None
+        cstate = {}
+        self.init_state(computed_trace, params, cstate, diag)
+        if not diag:
+            return None
+        return self.get_obsel_stream(computed_trace, cstate, graph)
+
     def _prepare_params(self, computed_trace, diag):
         """I check and prepare the parameters passed to the method.
 
@@ -23,9 +23,8 @@ import logging
 
 from rdflib import Literal, URIRef
 from rdfrest.util.iso8601 import parse_date
-from rdfrest.util import check_new
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
-from .utils import copy_obsel, translate_node
+from .utils import copy_obsels, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
 from ..namespace import KTBS
 from ..time import get_converter_to_unit, lit2datetime #pylint: disable=E0611
@@ -156,14 +155,11 @@ class _FilterMethod(AbstractMonosourceMethod):
 
         source_uri = source.uri
         target_uri = computed_trace.uri
-        source_state = source_obsels.state
         target_contains = target_obsels.state.__contains__
-        target_add_graph = target_obsels.add_obsel_graph
-        check_new_obs = lambda uri, g=target_obsels.state: check_new(g, uri)
         source_obsels = source.iter_obsels(after=after, begin=begin,
                                            end=maxtime, bgp=bgp, refresh="no")
 
-        with target_obsels.edit({"add_obsels_only":1}, _trust=True):
+        def iter_kept_obsels():
             for obs in source_obsels:
                 new_obs_uri = translate_node(obs.uri, computed_trace,
                                              source_uri, False)
@@ -173,11 +169,10 @@ class _FilterMethod(AbstractMonosourceMethod):
                     continue # already added
 
                 LOG.debug("--- keeping %s", obs)
-                new_obs_graph = copy_obsel(obs.uri, computed_trace, source,
-                                           new_obs_uri=new_obs_uri,
-                                           check_new_obs=check_new_obs,
-                )
-                target_add_graph(new_obs_graph)
+                yield obs.uri, new_obs_uri, None
+
+        with target_obsels.edit({"add_obsels_only":1}, _trust=True):
+            copy_obsels(iter_kept_obsels(), computed_trace, source)
 
         for obs in source.iter_obsels(begin=begin, reverse=True, limit=1):
             # iter only once on the last obsel, if any
@@ -191,6 +186,28 @@ class _FilterMethod(AbstractMonosourceMethod):
         cstate["last_seen_u"] = last_seen_u
         cstate["last_seen_b"] = last_seen_b
 
+    def get_obsel_stream(self, computed_trace, cstate, graph):
+        """I override :meth:`.abstract.AbstractMonosourceMethod.get_obsel_stream`
+
+        Streaming is not supported with parameter 'bgp'.
+        """
+        if cstate["bgp"]:
+            return None
+        mintime = cstate["mintime"]
+        maxtime = cstate["maxtime"]
+        otypes = cstate["otypes"]
+        if otypes:
+            otypes = set( URIRef(i) for i in otypes )
+
+        def stream(records):
+            for record in records:
+                if mintime is not None  and  record.begin < mintime \
+                or maxtime is not None  and  record.end > maxtime \
+                or otypes  and  record.type not in otypes:
+                    continue
+                yield record
+        return stream
+
 def robust_iter_subtypes(model, otype_uri):
     """
     Iter over subtype URIs of the given obsel type in the given model.
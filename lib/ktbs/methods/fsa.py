@@ -24,7 +24,9 @@ from fsa4streams import FSA
 from fsa4streams.matcher import DIRECTORY as matcher_directory
 from fsa4streams.state import State
 from json import dumps
-from rdflib import Literal, RDF, URIRef, Graph
+from rdflib import BNode, Literal, RDF, URIRef, Graph, Variable
+from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib.plugins.stores.sparqlstore import SPARQLStore
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
 from .utils import boolean_parameter, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
@@ -39,12 +41,8 @@ def match_obseltype(transition, event, token, fsa):
     With this matcher,
     transition conditions are interpreted as obseltype URIs.
     """
-    triple = (
-        URIRef(event),
-        RDF.type,
-        URIRef(transition['condition'], fsa.source.model_uri)
-    )
-    return triple in fsa.source_obsels_graph
+    return fsa.get_obsel_type_uri(transition['condition']) \
+        in fsa.get_event_types(event)
 
 matcher_directory['obseltype'] = match_obseltype
 
@@ -57,11 +55,9 @@ def match_sparql_ask(transition, event, token, fsa):
     where variable ?obs is bound to the considered obsel,
     and prefix m: is bound to the source trace URI.
 
-
+    Each condition is compiled only once per computation
+    (see :meth:`KtbsFSA.get_ask_function`).
     """
-    m_ns = fsa.source.model_uri
-    if m_ns[-1] != '/' and m_ns[-1] != '#':
-        m_ns += '#'
     history = token and token.get('history_events')
     if history:
         pred = URIRef(history[-1])
@@ -69,32 +65,171 @@ def match_sparql_ask(transition, event, token, fsa):
     else:
         pred = None
         first = None
-    condition = transition['condition']
-    ## this would be the correct way to do it
-    # initBindings = { "obs": URIRef(event), "pred": pred, "first": first }
-    ## unfortunately, Virtuoso does not support VALUES clauses after the ASK clause,
-    ## which is how SPARQLUpdateStore handles initBindings
-    ## so we generate that clause in the condition instead
-    condition = """
-      BIND (%s as ?obs)
-      BIND (%s as ?pred)
-      BIND (%s as ?first)
-    """ % (
-          URIRef(event).n3(),
-          pred.n3() if pred else '""', # simulating NULL
-          first.n3() if first else '""', # simulating NULL
-    ) + condition
-    ## thank you for nothing Virtuoso :-(
-
-    return fsa.source_obsels_graph.query(
-        "ASK { %s }" % condition,
-        initNs={"": KTBS, "m": m_ns},
-        # initBindings=initBindings, # not supported by Virtuoso :-(
-    ).askAnswer
+    ask = fsa.get_ask_function(transition['condition'])
+    return ask(URIRef(event), pred, first)
 
 matcher_directory['sparql-ask'] = match_sparql_ask
 
 
+class KtbsFSA(FSA):
+    """I am an FSA whose events are the obsels of a kTBS trace.
+
+    I cache the compiled transition conditions,
+    and the information about the obsels that I need to check them.
+    """
+
+    def __init__(self, structure, source, target):
+        FSA.__init__(self, structure, False) # do not check structure again
+        self.source = source
+        self.target = target
+        self.source_obsels_graph = source.obsel_collection.state
+        self._obsel_type_uris = {}
+        self._ask_functions = {}
+        self._event = None
+        self._event_types = None
+        self._event_values = {}
+
+    def get_obsel_type_uri(self, condition):
+        """Return the obsel type URI designated by `condition`."""
+        ret = self._obsel_type_uris.get(condition)
+        if ret is None:
+            ret = self._obsel_type_uris[condition] = \
+                URIRef(condition, self.source.model_uri)
+        return ret
+
+    def get_event_types(self, event):
+        """Return the set of types of the obsel `event`.
+
+        The types of the last event are kept,
+        as all transitions are checked against the same event in a row.
+        """
+        if event != self._event:
+            self._event = event
+            self._event_types = set(
+                self.source_obsels_graph.objects(URIRef(event), RDF.type))
+        return self._event_types
+
+    def get_ask_function(self, condition):
+        """Return a function checking the sparql-ask `condition`.
+
+        The returned function accepts three parameters (obs, pred, first),
+        pred and first being None at the start of the FSA.
+
+        If the condition is a plain BGP, where other variables than ?obs,
+        ?pred and ?first occur only once, it is compiled to a python predicate.
+        Otherwise, it is compiled to a prepared query.
+        """
+        ret = self._ask_functions.get(condition)
+        if ret is None:
+            ret = self._ask_functions[condition] = \
+                self._compile_ask_function(condition)
+        return ret
+
+    def _compile_ask_function(self, condition):
+        """Implement `get_ask_function`:meth:."""
+        graph = self.source_obsels_graph
+        m_ns = self.source.model_uri
+        if m_ns[-1] != '/' and m_ns[-1] != '#':
+            m_ns += '#'
+
+        if isinstance(graph.store, SPARQLStore):
+            ## Virtuoso does not support VALUES clauses after the ASK clause,
+            ## which is how SPARQLUpdateStore handles initBindings
+            ## so we generate BIND clauses in the condition instead
+            def ask(obs, pred, first):
+                query = """
+                  BIND (%s as ?obs)
+                  BIND (%s as ?pred)
+                  BIND (%s as ?first)
+                """ % (
+                    obs.n3(),
+                    pred.n3() if pred else '""', # simulating NULL
+                    first.n3() if first else '""', # simulating NULL
+                ) + condition
+                return graph.query(
+                    "ASK { %s }" % query,
+                    initNs={"": KTBS, "m": m_ns},
+                ).askAnswer
+            return ask
+
+        query = prepareQuery("ASK { %s }" % condition,
+                             initNs={"": KTBS, "m": m_ns})
+        patterns = _get_simple_bgp(query.algebra)
+        if patterns is not None:
+            def ask(obs, pred, first):
+                bindings = {
+                    _OBS: obs,
+                    _PRED: pred or _NULL,
+                    _FIRST: first or _NULL,
+                }
+                for pattern in patterns:
+                    triple = tuple(
+                        bindings.get(term) if isinstance(term, Variable)
+                        else term
+                        for term in pattern
+                    )
+                    if triple not in graph:
+                        return False
+                return True
+        else:
+            def ask(obs, pred, first):
+                return graph.query(query, initBindings={
+                    "obs": obs,
+                    "pred": pred or _NULL,
+                    "first": first or _NULL,
+                }).askAnswer
+        return ask
+
+    def get_attribute_values(self, event, attribute):
+        """Return the list of the values of `attribute` for obsel `event`.
+
+        The values are kept for all the events involved in a pending match,
+        until the FSA is not busy anymore (see `forget_events`:meth:).
+        """
+        key = (event, attribute)
+        ret = self._event_values.get(key)
+        if ret is None:
+            ret = self._event_values[key] = list(
+                self.source_obsels_graph.objects(URIRef(event), attribute))
+        return ret
+
+    def forget_events(self):
+        """Forget the information kept about the events, if no token needs it.
+        """
+        self._event = self._event_types = None
+        if not self.is_busy():
+            self._event_values.clear()
+
+_OBS = Variable("obs")
+_PRED = Variable("pred")
+_FIRST = Variable("first")
+_NULL = Literal("")  # simulating NULL
+
+def _get_simple_bgp(algebra):
+    """Return the triple patterns of `algebra` if it is a simple BGP.
+
+    A simple BGP is one where every variable other than ?obs, ?pred and
+    ?first occurs only once (so it can be replaced by a wildcard),
+    and which contains no blank node
+    (as blank nodes in a query behave like variables).
+    Otherwise, return None.
+    """
+    if algebra.name != "AskQuery" or algebra.p.name != "Project" \
+    or algebra.p.p.name != "BGP":
+        return None
+    triples = algebra.p.p.triples
+    occurrences = {}
+    for triple in triples:
+        for term in triple:
+            if isinstance(term, BNode):
+                return None
+            if isinstance(term, Variable):
+                occurrences[term] = occurrences.get(term, 0) + 1
+    for var, count in occurrences.items():
+        if var not in (_OBS, _PRED, _FIRST) and count > 1:
+            return None
+    return [ tuple(triple) for triple in triples ]
+
 
 class _FSAMethod(AbstractMonosourceMethod):
     """I implement the fsa builtin method.
@@ -128,13 +263,10 @@ class _FSAMethod(AbstractMonosourceMethod):
         target_obsels = computed_trace.obsel_collection
         last_seen = cstate["last_seen"]
 
-        fsa = FSA(cstate['fsa'], False) # do not check structure again
+        fsa = KtbsFSA(cstate['fsa'], source, computed_trace)
         if fsa.default_matcher is None:
             #fsa.default_matcher = "obseltype"              # <- doesn't work in fsa4streams v0.4
             fsa._structure['default_matcher'] = "obseltype" # <- workaround
-        fsa.source = source
-        fsa.target = computed_trace
-        fsa.source_obsels_graph = source_obsels.state
 
         if monotonicity is STRICT_MON:
             LOG.debug("strictly temporally monotonic %s, reloading state", computed_trace)
@@ -149,21 +281,21 @@ class _FSAMethod(AbstractMonosourceMethod):
 
         source_uri = source.uri
         source_model_uri = source.model_uri
-        source_state = source_obsels.state
-        source_value = source_state.value
+        source_value = source_obsels.state.value
         target_uri = computed_trace.uri
         target_model_uri = computed_trace.model_uri
         target_add_graph = target_obsels.add_obsel_graph
         after = last_seen and URIRef(last_seen)
 
         with target_obsels.edit({"add_obsels_only":1}, _trust=True):
-            for obs in source.iter_obsels(after=after, refresh="no"):
+            for obs in source.iter_obsel_records(after=after, refresh="no"):
                 last_seen = event = str(obs.uri)
                 matching_tokens = fsa.feed(event, obs.end)
                 for i, token in enumerate(matching_tokens):
                     state = KtbsFsaState(fsa, token['state'],
                                          source_model_uri, target_model_uri)
-                    source_obsels = [ URIRef(uri) for uri in token['history_events']]
+                    history = token['history_events']
+                    source_obsels = [ URIRef(uri) for uri in history ]
                     otype_uri = state.get_obsel_type()
                     LOG.debug("matched {} -> {}".format(source_obsels[-1], otype_uri))
                     if otype_uri is None:
@@ -182,37 +314,19 @@ class _FSAMethod(AbstractMonosourceMethod):
                     for source_obsel in source_obsels:
                         new_obs_add((new_obs_uri, KTBS.hasSourceObsel, source_obsel))
 
-                    attributes = state.get_attributes()
-                    if attributes:
-                        qvars = []
-                        qwhere = [ '?obs <{}> ?end .'.format(KTBS.hasEnd) ]
-                        for i, triple in enumerate(attributes):
-                            var = '?v{}'.format(i)
-                            qvars.append(var)
-                            qwhere.append('OPTIONAL {{?obs <{}> {} .}}'
-                                          .format(triple[1], var))
-                        query = ('SELECT {} {{'
-                                 '\nVALUES (?obs) {{\n(<{}>)\n}}'
-                                 '\n{}\n'
-                                 '}} ORDER BY ?end')\
-                            .format(
-                            ' '.join(qvars),
-                            '>)\n(<'.join(source_obsels),
-                            '\n'.join(qwhere),
-                            )
-                        results = source_state.query(query)
-                        for i, triple in enumerate(attributes):
-                            target_attr, _, aggr_func = triple
-                            try:
-                                val = aggr_func(results, i)
-                                if val is not None:
-                                    new_obs_add((new_obs_uri, target_attr, val))
-                            except Exception as ex:
-                                LOG.warning(ex.args[0])
-
-
+                    for target_attr, source_attr, aggr_func in state.get_attributes():
+                        values = [ val for hist_event in history
+                                   for val in fsa.get_attribute_values(
+                                       hist_event, source_attr) ]
+                        try:
+                            val = aggr_func(values)
+                            if val is not None:
+                                new_obs_add((new_obs_uri, target_attr, val))
+                        except Exception as ex:
+                            LOG.warning(ex.args[0])
 
                     target_add_graph(new_obs_graph)
+                fsa.forget_events()
 
         cstate["last_seen"] = last_seen
         cstate["tokens"] = fsa.export_tokens_as_dict()
@@ -258,26 +372,23 @@ def _split_source_attribute(source_attribute, source_model_uri):
     )
 
 
-def _last(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return lst[-1]
+def _last(values):
+    if values:
+        return values[-1]
     else:
         return None
 
-def _first(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return lst[0]
+def _first(values):
+    if values:
+        return values[0]
     else:
         return None
 
-def _count(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    return Literal(len(lst))
+def _count(values):
+    return Literal(len(values))
 
-def _sum(data, index):
-    lst = [ tpl[index].toPython() for tpl in data if tpl[index] is not None ]
+def _sum(values):
+    lst = [ val.toPython() for val in values ]
     if lst:
         try:
             return Literal(sum(lst))
@@ -286,8 +397,8 @@ def _sum(data, index):
     else:
         return None
 
-def _avg(data, index):
-    lst = [ tpl[index].toPython() for tpl in data if tpl[index] is not None ]
+def _avg(values):
+    lst = [ val.toPython() for val in values ]
     if lst:
         try:
             sumval = sum(lst)
@@ -300,25 +411,22 @@ def _avg(data, index):
     else:
         return None
 
-def _min(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return min(lst)
+def _min(values):
+    if values:
+        return min(values)
     else:
         return None
 
-def _max(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return max(lst)
+def _max(values):
+    if values:
+        return max(values)
     else:
         return None
 
-def _span(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        minval = min(lst).toPython()
-        maxval = max(lst).toPython()
+def _span(values):
+    if values:
+        minval = min(values).toPython()
+        maxval = max(values).toPython()
         try:
             val = maxval - minval
         except TypeError:
@@ -327,8 +435,8 @@ def _span(data, index):
     else:
         return None
 
-def _concat(data, index):
-    lst = [ str(tpl[index]) for tpl in data if tpl[index] is not None ]
+def _concat(values):
+    lst = [ str(val) for val in values ]
     if lst:
         return Literal(" ".join(lst))
     else:
@@ -18,15 +18,16 @@
 """
 Implementation of the fusion builtin methods.
 """
+import heapq
 import traceback
 from json import dumps as json_dumps, loads as json_loads
 import logging
 
-from rdflib import Literal, URIRef
+from rdflib import Graph, Literal, URIRef
 
 from rdfrest.util import Diagnosis
 from .interface import IMethod
-from .utils import translate_node
+from .utils import add_obsel_graphs, translate_node
 from ..namespace import KTBS
 from ..engine.builtin_method import register_builtin_method_impl
 from ..engine.resource import METADATA
@@ -71,7 +72,7 @@ class _FusionMethod(IMethod):
             computed_trace.metadata.value(computed_trace.uri,
                                           METADATA.computation_state))
         if from_scratch:
-            for key in ("last_seens", "old_log_mon_tags"):
+            for key in ("last_seens", "old_log_mon_tags", "old_str_mon_tags"):
                 cstate[key] = {}
         errors = cstate.get("errors")
         if errors:
@@ -83,59 +84,62 @@ class _FusionMethod(IMethod):
         # start anew if sources have changed or have been modified in a
         # non-monotonic way
         old_log_mon_tags = cstate["old_log_mon_tags"]
+        last_seens = cstate["last_seens"]
         target_obsels = computed_trace.obsel_collection
+        # NB: JSON keys are str, so they must be looked up with str(src.uri)
         for src in effective_sources:
-            old_tag = old_log_mon_tags.get(src.uri)
-            if old_tag != src.obsel_collection.log_mon_tag:
+            old_tag = old_log_mon_tags.get(str(src.uri))
+            last_seen = last_seens.get(str(src.uri))
+            if old_tag != src.obsel_collection.log_mon_tag \
+            or last_seen is not None and not isinstance(last_seen, list):
+                # NB: last_seens used to be begin timestamps
                 target_obsels._empty() # friend #pylint: disable=W0212
                 LOG.debug("non-monotonic %s", computed_trace)
-                cstate["last_seens"] = {}
+                cstate["last_seens"] = last_seens = {}
                 cstate["old_log_mon_tags"] = old_log_mon_tags = {}
+                cstate["old_str_mon_tags"] = {}
                 break
         if not old_log_mon_tags:
             cstate["old_log_mon_tags"] = old_log_mon_tags = dict(
-                (src.uri, src.obsel_collection.log_mon_tag)
+                (str(src.uri), src.obsel_collection.log_mon_tag)
                 for src in effective_sources
                 )
-        
-        last_seens = cstate["last_seens"]
-        target_uri = computed_trace.uri
-        with target_obsels.edit(_trust=True) as editable:
-            target_contains = editable.__contains__
-            target_add = editable.add
-            for src in effective_sources:
-                src_uri = src.uri
-                src_triples = src.obsel_collection.get_state({"refresh":"no"}).triples
-                for obs in src.iter_obsels(begin=last_seens.get(src_uri), refresh="no"):
-                    last_seens[src_uri] = obs.begin
-
-                    new_obs_uri = translate_node(obs.uri, computed_trace,
-                                                 src_uri, True)
-                    if target_contains((new_obs_uri,
-                                        KTBS.hasTrace,
-                                        target_uri)):
-                        LOG.debug("--- skipping %s", new_obs_uri)
-                        continue # already added
-
-                    LOG.debug("--- keeping %s", obs)
-                    target_add((new_obs_uri, KTBS.hasTrace, target_uri))
-                    target_add((new_obs_uri, KTBS.hasSourceObsel, obs.uri))
-
-                    for _, pred, obj in src_triples((obs.uri, None, None)):
-                        if pred == KTBS.hasTrace \
-                        or pred == KTBS.hasSourceObsel:
-                            continue
-                        new_obj = translate_node(obj, computed_trace, src_uri,
-                                                 True)
-                        target_add((new_obs_uri, pred, new_obj))
-                    for subj, pred, _ in src_triples((None, None, obs.uri)):
-                        if pred == KTBS.hasTrace \
-                        or pred == KTBS.hasSourceObsel:
-                            continue
-                        new_subj = translate_node(subj, computed_trace, src_uri,
-                                                  True)
-                        target_add((new_subj, pred, new_obs_uri))
-        
+        old_str_mon_tags = cstate.get("old_str_mon_tags", {})
+        cstate["old_str_mon_tags"] = dict(
+            (str(src.uri), src.obsel_collection.str_mon_tag)
+            for src in effective_sources
+            )
+
+        # merge the new obsels of all sources in temporal order
+        target_contains = target_obsels.state.__contains__
+        cursors = []
+        for src in effective_sources:
+            src_uri = str(src.uri)
+            last_seen = last_seens.get(src_uri)
+            if old_str_mon_tags.get(src_uri) == src.obsel_collection.str_mon_tag:
+                # new obsels (if any) are all after the last seen one
+                after = last_seen and URIRef(last_seen[2])
+                contains = None
+            else:
+                # obsels may have been inserted anywhere
+                LOG.debug("non-strictly monotonic %s", src_uri)
+                after = None
+                contains = target_contains if last_seen is not None else None
+            cursors.append(_iter_source_obsels(src, computed_trace, after,
+                                               contains))
+
+        def iter_new_obsel_graphs():
+            for key, src, obs_uri, new_obs_uri in heapq.merge(*cursors):
+                LOG.debug("--- keeping %s", obs_uri)
+                src_uri = str(src.uri)
+                last_seen = last_seens.get(src_uri)
+                if last_seen is None or key > tuple(last_seen):
+                    last_seens[src_uri] = list(key)
+                yield _copy_fused_obsel(obs_uri, new_obs_uri, src,
+                                        computed_trace)
+
+        with target_obsels.edit({"add_obsels_only":1}, _trust=True):
+            add_obsel_graphs(target_obsels, iter_new_obsel_graphs())
 
         computed_trace.metadata.set((computed_trace.uri,
                                      METADATA.computation_state,
@@ -203,6 +207,7 @@ class _FusionMethod(IMethod):
         cstate = { "method": "fusion",
                    "last_seens": {},
                    "old_log_mon_tags": {},
+                   "old_str_mon_tags": {},
         }
 
         if not diag:
@@ -215,6 +220,50 @@ class _FusionMethod(IMethod):
 
 
 
+def _iter_source_obsels(src, computed_trace, after, target_contains=None):
+    """I iter over the obsels of `src` to be copied in `computed_trace`.
+
+    I yield tuples (key, src, obs_uri, new_obs_uri) in temporal order,
+    where key is the (end, begin, uri) key of the source obsel,
+    so that the obsels of several sources can be merged with `heapq.merge`.
+
+    If `target_contains` is provided, obsels already copied are skipped.
+    """
+    src_uri = src.uri
+    target_uri = computed_trace.uri
+    for obs in src.iter_obsel_records(after=after, refresh="no"):
+        obs_uri = obs.uri
+        new_obs_uri = translate_node(obs_uri, computed_trace, src_uri, True)
+        if target_contains is not None and target_contains((new_obs_uri, KTBS.hasTrace,
+                                                target_uri)):
+            LOG.debug("--- skipping %s", new_obs_uri)
+            continue # already added
+        yield (obs.end, obs.begin, str(obs_uri)), src, obs_uri, new_obs_uri
+
+def _copy_fused_obsel(obs_uri, new_obs_uri, src, computed_trace):
+    """I prepare the graph of `new_obs_uri`, a copy of `obs_uri` from `src`.
+    """
+    src_uri = src.uri
+    src_triples = src.obsel_collection.state.triples
+    graph = Graph()
+    graph_add = graph.add
+    graph_add((new_obs_uri, KTBS.hasTrace, computed_trace.uri))
+    graph_add((new_obs_uri, KTBS.hasSourceObsel, obs_uri))
+    for _, pred, obj in src_triples((obs_uri, None, None)):
+        if pred == KTBS.hasTrace \
+        or pred == KTBS.hasSourceObsel:
+            continue
+        new_obj = translate_node(obj, computed_trace, src_uri, True)
+        graph_add((new_obs_uri, pred, new_obj))
+    for subj, pred, _ in src_triples((None, None, obs_uri)):
+        if pred == KTBS.hasTrace \
+        or pred == KTBS.hasSourceObsel:
+            continue
+        new_subj = translate_node(subj, computed_trace, src_uri, True)
+        graph_add((new_subj, pred, new_obs_uri))
+    return graph
+
+
 _PARAMETERS_TYPE = {
     "origin": Literal,
     "model": URIRef,
@@ -19,14 +19,17 @@
 Implementation of the filter builtin methods.
 """
 import logging
+import operator
 
 import json
+from datetime import date, datetime
+from decimal import Decimal
 from rdflib import Literal, RDF, URIRef, XSD
-from rdfrest.util import check_new
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
-from .utils import copy_obsel, translate_node
+from .utils import copy_obsels, translate_node
+from ..api.obsel import ObselRecord
 from ..engine.builtin_method import register_builtin_method_impl
-from ..namespace import KTBS, KTBS_NS_URI
+from ..namespace import KTBS
 
 LOG = logging.getLogger(__name__)
 
@@ -53,7 +56,7 @@ class _HRulesMethod(AbstractMonosourceMethod):
                 domains[str(atype.uri)] = dtypes[0]
 
         rules = params['rules']
-        bgps = []
+        compiled = []
         for rulepos, rule in enumerate(rules):
             if not rule.get('visible', True):
                 continue
@@ -63,35 +66,28 @@ class _HRulesMethod(AbstractMonosourceMethod):
                 new_type = '#'.join([params["model"], new_type])
             for subrule in rule['rules']:
                 rank = 0
-                bgp = []
-                old_type = subrule.get("type", "")
+                old_type = subrule.get("type", "") or None
                 if old_type:
                     rank += 1000000
-                    bgp.append("?obs a <%s>." % old_type)
-                for attno, att in enumerate(subrule.get("attributes", ())):
+                conditions = []
+                for att in subrule.get("attributes", ()):
                     rank += 1000
                     if isinstance(att['value'], str):
                         dtype = domains.get(att['uri'], XSD.string)
-                        value = Literal(att['value'], datatype=dtype)
+                        value = att['value']
                     else:
                         dtype = att['value'].get('@datatype', XSD.string)
-                        value = Literal(att['value']['@value'], datatype=dtype)
-                    att['sparql_value'] = value.n3()
-                    filter_template = FILTER_TEMPLATE.get(att['operator'])
-                    if filter_template is None:
+                        value = att['value']['@value']
+                    if att['operator'] not in OPERATORS:
                         diag.append("WARN: unrecognized operator %(operator)s" % att)
-                        filter_template = "FALSE"
-                    att['var'] = '?att%s' % attno
-                    bgp.append('?obs <%(uri)s> %(var)s. FILTER(' % att)
-                    bgp.append(filter_template % att)
-                    bgp.append(').')
-                bgp = "".join(bgp)
+                    conditions.append([att['uri'], att['operator'],
+                                       str(value), str(dtype)])
                 rank -= rulepos
-                bgps.append([rank, new_type, bgp])
-        bgps.sort(reverse=True)
+                compiled.append([rank, new_type, old_type, conditions])
+        compiled.sort(reverse=True)
 
         cstate.update([
-            ("bgps", bgps),
+            ("rules", compiled),
             ("last_seen_u", None),
             ("last_seen_b", None),
         ])
@@ -99,11 +95,20 @@ class _HRulesMethod(AbstractMonosourceMethod):
 
     def do_compute_obsels(self, computed_trace, cstate, monotonicity, diag):
         """I implement :meth:`.abstract.AbstractMonosourceMethod.do_compute_obsels
+
+        The rules are compiled into python predicates,
+        and each source obsel is evaluated against them (by decreasing rank)
+        in a single scan of the source trace.
         """
         source = computed_trace.source_traces[0]
         source_obsels = source.obsel_collection
         target_obsels = computed_trace.obsel_collection
-        bgps = cstate["bgps"]
+        if "rules" not in cstate:
+            # state computed by an older version of this method
+            params = self._prepare_params(computed_trace, diag)
+            self.init_state(computed_trace, params, cstate, diag)
+            cstate.pop("bgps", None)
+            monotonicity = NOT_MON
         last_seen_u = cstate["last_seen_u"]
         if last_seen_u:
             last_seen_u = URIRef(last_seen_u)
@@ -126,41 +131,37 @@ class _HRulesMethod(AbstractMonosourceMethod):
         else:
             LOG.debug("non-temporally monotonic %s", computed_trace)
 
+        source_state = source_obsels.state
+        rules = [ (URIRef(new_type), compile_rule(source_state, old_type,
+                                                  conditions))
+                  for _rank, new_type, old_type, conditions
+                  in cstate["rules"] ]
+
         source_uri = source.uri
         target_uri = computed_trace.uri
-        source_state = source_obsels.state
         target_contains = target_obsels.state.__contains__
-        target_add_graph = target_obsels.add_obsel_graph
-        check_new_obs = lambda uri, g=target_obsels.state: check_new(g, uri)
 
-        inserted = set()
+        def iter_matching_obsels():
+            for record in source.iter_obsel_records(begin=begin, after=after):
+                obs_uri = record.uri
+                for new_type, matches in rules:
+                    if matches(obs_uri):
+                        break
+                else:
+                    continue
+                new_obs_uri = translate_node(obs_uri, computed_trace,
+                                             source_uri, False)
+                if monotonicity is not STRICT_MON\
+                and target_contains((new_obs_uri, KTBS.hasTrace, target_uri)):
+                    LOG.debug("--- already seen %s", new_obs_uri)
+                    continue # already added
+                yield obs_uri, new_obs_uri, new_type
+
         with target_obsels.edit({"add_obsels_only":1}, _trust=True):
-            for _rank, new_type, bgp in bgps:
-                new_type = URIRef(new_type)
-                select = source_obsels.build_select(after=after, bgp=bgp)
-                query_str = "PREFIX ktbs: <%s#> %s" % (KTBS_NS_URI, select)
-                tuples = list(source_obsels.state.query(query_str))
-
-                for obs_uri, in tuples:
-                    new_obs_uri = translate_node(obs_uri, computed_trace,
-                                                 source_uri, False)
-                    if monotonicity is PSEUDO_MON\
-                    and target_contains((new_obs_uri, KTBS.hasTrace, target_uri))\
-                    or new_obs_uri in inserted:
-                        # could be either because of pseudo-monotony,
-                        # or because a BGP with higher priority already matched
-                        LOG.debug("--- already seen %s", new_obs_uri)
-                        continue # already added
-
-                    new_obs_graph = copy_obsel(obs_uri, computed_trace, source,
-                                               new_obs_uri=new_obs_uri,
-                                               check_new_obs=check_new_obs,
-                    )
-                    new_obs_graph.set((new_obs_uri, RDF.type, new_type))
-                    target_add_graph(new_obs_graph)
-                    inserted.add(new_obs_uri)
-
-        for obs in source.iter_obsels(begin=begin, reverse=True, limit=1):
+            copy_obsels(iter_matching_obsels(), computed_trace, source)
+
+        for obs in source.iter_obsel_records(begin=begin, reverse=True,
+                                             limit=1):
             # iter only once on the last obsel, if any
             last_seen_u = obs.uri
             last_seen_b = obs.begin
@@ -170,14 +171,109 @@ class _HRulesMethod(AbstractMonosourceMethod):
         cstate["last_seen_u"] = last_seen_u
         cstate["last_seen_b"] = last_seen_b
 
-FILTER_TEMPLATE = {
-    '==': '%(var)s = %(sparql_value)s',
-    '!=': '%(var)s != %(sparql_value)s',
-    '<' : '%(var)s < %(sparql_value)s',
-    '>' : '%(var)s > %(sparql_value)s',
-    '<=': '%(var)s <= %(sparql_value)s',
-    '>=': '%(var)s >= %(sparql_value)s',
-    'contains': 'CONTAINS(STR(%(var)s), STR(%(sparql_value)s))',
+
+    def get_obsel_stream(self, computed_trace, cstate, graph):
+        """I override :meth:`.abstract.AbstractMonosourceMethod.get_obsel_stream`
+        """
+        rules = [ (URIRef(new_type), old_type and URIRef(old_type),
+                   compile_rule(graph, None, conditions))
+                  for _rank, new_type, old_type, conditions
+                  in cstate["rules"] ]
+
+        def stream(records):
+            for record in records:
+                for new_type, old_type, matches in rules:
+                    if (old_type is None or record.type == old_type) \
+                    and matches(record.uri):
+                        yield ObselRecord(record.uri, new_type, record.begin,
+                                          record.end, record.subject)
+                        break
+        return stream
+
+
+def compile_rule(graph, old_type, conditions):
+    """Compile a subrule into a predicate on the obsels of `graph`.
+
+    :param graph: the graph containing the obsels to test
+    :param old_type: the URI of the required obsel type, or None
+    :param conditions: a list of [attribute_uri, operator, lexical, datatype]
+
+    The returned function accepts an obsel URI, and returns True iff the obsel
+    has type `old_type`, and for each condition, at least one value of the
+    attribute satisfying it (as the corresponding FILTER would in SPARQL).
+    """
+    tests = []
+    if old_type:
+        old_type = URIRef(old_type)
+        tests.append(lambda obs: (obs, RDF.type, old_type) in graph)
+    for att_uri, op, lexical, datatype in conditions:
+        tests.append(_compile_condition(graph, URIRef(att_uri), op,
+                                        Literal(lexical,
+                                                datatype=URIRef(datatype))))
+
+    def matches(obs):
+        for test in tests:
+            if not test(obs):
+                return False
+        return True
+    return matches
+
+def _compile_condition(graph, att_uri, op, ref):
+    """Compile an attribute condition into a predicate on obsel URIs."""
+    compare = OPERATORS.get(op)
+    if compare is None:
+        return lambda obs: False
+    if op == 'contains':
+        ref_value = str(ref)
+        ref_category = None
+    else:
+        ref_category, ref_value = _comparable(ref)
+
+    def test(obs):
+        for val in graph.objects(obs, att_uri):
+            if ref_category is None:
+                if compare(str(val), ref_value):
+                    return True
+                continue
+            category, value = _comparable(val)
+            if category != ref_category:
+                continue
+            if category == 'other':
+                # only term equality is defined for other datatypes
+                if op == '==' and val == ref:
+                    return True
+                continue
+            try:
+                if compare(value, ref_value):
+                    return True
+            except TypeError:
+                pass
+        return False
+    return test
+
+def _comparable(node):
+    """Return the comparison category of `node` and its python value."""
+    if not isinstance(node, Literal):
+        return 'other', node
+    if node.language is None and node.datatype in (None, XSD.string):
+        return 'string', str(node)
+    value = node.toPython()
+    if isinstance(value, bool):
+        return 'boolean', value
+    if isinstance(value, (int, float, Decimal)):
+        return 'numeric', value
+    if isinstance(value, (datetime, date)):
+        return 'datetime', value
+    return 'other', node
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<' : operator.lt,
+    '>' : operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+    'contains': lambda val, ref: ref in val,
 }
 
 register_builtin_method_impl(_HRulesMethod())
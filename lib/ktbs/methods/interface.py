@@ -50,3 +50,16 @@ class IMethod(object):
 
         """
         raise NotImplementedError
+
+    def refresh_sources(self, computed_trace, parameters=None):
+        """I refresh the obsels of the effective sources of the given trace
+
+        :param computed_trace: a :class:`..engine.trace.ComputedTrace`
+        :param parameters: the parameters passed to
+                           `~.engine.trace_obsels.ComputedTraceObsels.force_state_refresh`:meth:
+
+        This is called before `compute_obsels`:meth:.
+        The default implementation refreshes the sources one after the other.
+        """
+        for src in computed_trace._iter_effective_source_traces():
+            src.obsel_collection.force_state_refresh(parameters)
@@ -23,7 +23,7 @@ import logging
 from rdflib import Literal, RDF, URIRef, Graph
 from rdfrest.util import check_new
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
-from .utils import translate_node
+from .utils import add_obsel_graphs, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
 from ..namespace import KTBS, KTBS_NS_URI
 
@@ -112,17 +112,22 @@ class _ISparqlMethod(AbstractMonosourceMethod):
         source_uri = source.uri
         target_uri = computed_trace.uri
         target_contains = target_obsels.state.__contains__
-        target_add_graph = target_obsels.add_obsel_graph
-        with target_obsels.edit({"add_obsels_only":1}, _trust=True):
+
+        def iter_new_obsel_graphs():
+            # obsels are added by chunks, so obsels emitted in this
+            # computation may not be in the target yet
+            emitted = set()
             for row in rows:
                 sourceObsel = row[i_sourceObsel]
 
                 new_obs_uri = translate_node(sourceObsel, computed_trace,
                                              source_uri, False)
-                if monotonicity is not STRICT_MON\
-                and target_contains((new_obs_uri, KTBS.hasTrace, target_uri)):
-                    LOG.debug("--- already seen %s", new_obs_uri)
-                    continue # already added
+                if monotonicity is not STRICT_MON:
+                    if new_obs_uri in emitted or target_contains(
+                            (new_obs_uri, KTBS.hasTrace, target_uri)):
+                        LOG.debug("--- already seen %s", new_obs_uri)
+                        continue # already added
+                    emitted.add(new_obs_uri)
 
                 LOG.debug("--- transforming %s", sourceObsel)
                 new_obs_graph = Graph()
@@ -131,7 +136,10 @@ class _ISparqlMethod(AbstractMonosourceMethod):
                 for pred, obj in zip(columns, row):
                     if obj is not None:
                         add((new_obs_uri, pred, obj))
-                target_add_graph(new_obs_graph)
+                yield new_obs_graph
+
+        with target_obsels.edit({"add_obsels_only":1}, _trust=True):
+            add_obsel_graphs(target_obsels, iter_new_obsel_graphs())
 
         for obs in source.iter_obsels(begin=begin, reverse=True, limit=1):
             # iter only once on the last obsel, if any
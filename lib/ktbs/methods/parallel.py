@@ -19,12 +19,19 @@
 Implementation of the filter builtin methods.
 """
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from multiprocessing import get_context
+from weakref import WeakKeyDictionary
 
-from rdflib import Literal
+from rdflib import Literal, URIRef
 
 from rdfrest.cores.factory import factory
+from rdfrest.exceptions import CanNotProceedError
+from rdfrest.util.config import apply_global_config
 from rdfrest.util import Diagnosis
 from .interface import IMethod
+from ..config import get_ktbs_configuration
 from ..engine.builtin_method import get_builtin_method_impl, \
     register_builtin_method_impl
 from ..engine.resource import METADATA
@@ -114,6 +121,42 @@ class _ParallelMethod(IMethod):
         return _FUSION_IMPL.compute_obsels(computed_trace, from_scratch,
                                            effective_sources, diag)
 
+    def refresh_sources(self, computed_trace, parameters=None):
+        """I override :meth:`.interface.IMethod.refresh_sources`.
+
+        If option ``workers`` of section ``[parallel]`` of the configuration
+        is greater than 1, the intermediate traces are computed concurrently
+        by that number of worker processes (see `get_workers`:func:).
+        """
+        service = computed_trace.service
+        workers = get_workers(service.config)
+        if workers <= 1:
+            return super(_ParallelMethod, self).refresh_sources(computed_trace,
+                                                                parameters)
+        # the shared source is refreshed first,
+        # so that the intermediate traces only have to read it
+        for src in computed_trace.source_traces:
+            src.obsel_collection.force_state_refresh(parameters)
+        refresh = parameters.get("refresh") if parameters else None
+        to_compute = [
+            int_trace for int_trace
+            in computed_trace._iter_effective_source_traces()
+            if refresh == "recursive"
+            or int_trace.obsel_collection.metadata.value(
+                int_trace.obsel_collection.uri, METADATA.dirty) is not None
+        ]
+        if len(to_compute) > 1:
+            pool = _get_pool(service, workers)
+            futures = [ pool.submit(_refresh_in_worker, str(int_trace.uri),
+                                    refresh)
+                        for int_trace in to_compute ]
+            for future in futures:
+                future.result() # re-raise exceptions, if any
+        # the intermediate traces computed by the workers are now up-to-date
+        # in the store, so this only computes the others (if any)
+        super(_ParallelMethod, self).refresh_sources(computed_trace,
+                                                     parameters)
+
     @staticmethod
     def _prepare_intermediate_traces(computed_trace, params):
         method_params = params['method_params']
@@ -168,4 +211,75 @@ class _ParallelMethod(IMethod):
         return effective_sources
 
 
+def get_workers(config):
+    """Return the number of processes computing the intermediate traces.
+
+    This is configured by option ``workers`` of section ``[parallel]``
+    (1 by default, i.e. intermediate traces are computed sequentially).
+    As worker processes have to open the RDF store of the kTBS,
+    1 is always returned for a volatile in-memory store.
+    """
+    if config is None \
+    or not config.has_section('parallel') \
+    or not config.has_option('parallel', 'workers'):
+        return 1
+    repository = config.get('rdf_database', 'repository', raw=1)
+    if not repository or repository == ":Memory:":
+        LOG.info("intermediate traces of ktbs:parallel can only be "
+                 "computed concurrently with a persistent repository")
+        return 1
+    return config.getint('parallel', 'workers')
+
+def _get_pool(service, workers):
+    """Return the pool of worker processes attached to `service`.
+
+    The pool is created the first time it is required,
+    or if the number of workers has changed.
+    Each worker process opens its own `~ktbs.engine.service.KtbsService`
+    on the same repository; concurrent computations are coordinated by the
+    locks of the obsel collections
+    (see `~ktbs.engine.lock.WithLockMixin`:class:),
+    which are shared by all processes.
+    """
+    pool_workers, pool = _POOLS.get(service, (None, None))
+    if pool is not None and pool_workers != workers:
+        pool.shutdown()
+        pool = None
+    if pool is None:
+        config_file = StringIO()
+        service.config.write(config_file)
+        pool = ProcessPoolExecutor(
+            workers, mp_context=get_context("spawn"),
+            initializer=_init_worker, initargs=(config_file.getvalue(),))
+        _POOLS[service] = (workers, pool)
+    return pool
+
+def _init_worker(config_str):
+    """Open the service of a worker process.
+    """
+    #pylint: disable=W0603
+    global _WORKER_SERVICE
+    # imported here to avoid circular imports
+    from ..engine.service import KtbsService
+    config = get_ktbs_configuration(StringIO(config_str))
+    # the repository is already initialized by the main process
+    config.set('rdf_database', 'force-init', 'false')
+    apply_global_config(config, logging=False)
+    _WORKER_SERVICE = KtbsService(config)
+
+def _refresh_in_worker(int_trace_uri, refresh):
+    """Compute an intermediate trace in a worker process.
+    """
+    int_trace = _WORKER_SERVICE.get(URIRef(int_trace_uri),
+                                    [KTBS.ComputedTrace])
+    if int_trace is None:
+        raise CanNotProceedError("Intermediate trace <%s> can not be found "
+                                 "by worker process" % int_trace_uri)
+    parameters = None if refresh is None else {"refresh": refresh}
+    int_trace.obsel_collection.force_state_refresh(parameters)
+
+_POOLS = WeakKeyDictionary()
+_WORKER_SERVICE = None
+
+
 register_builtin_method_impl(_ParallelMethod())
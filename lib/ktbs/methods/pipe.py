@@ -19,12 +19,15 @@
 Implementation of the filter builtin methods.
 """
 import logging
+from json import dumps as json_dumps, loads as json_loads
 
-from rdflib import Literal
+from rdflib import Literal, URIRef
 
 from rdfrest.cores.factory import factory
 from rdfrest.util import Diagnosis
+from .abstract import AbstractMonosourceMethod
 from .interface import IMethod
+from .utils import boolean_parameter, copy_obsels
 from ..engine.builtin_method import get_builtin_method_impl, register_builtin_method_impl
 from ..engine.resource import METADATA
 from ..namespace import KTBS
@@ -57,6 +60,7 @@ class _PipeMethod(IMethod):
         id_template = '_%s_{}'.format(computed_trace.id)
 
         # create or update intermediate traces
+        int_traces = []
         for i, method in enumerate(methods):
             int_trace_id = id_template % i
             int_trace = base.get(int_trace_id)
@@ -74,15 +78,40 @@ class _PipeMethod(IMethod):
                     for item in method_params[i].items():
                         editable.add((int_trace_uri, KTBS.hasParameter,
                                       Literal('{}={}'.format(*item))))
+            int_trace.metadata.remove((int_trace.uri, METADATA.lazy, None))
             prev = int_trace
+            int_traces.append(int_trace)
+
         effective_source = prev
+        if params['streaming']:
+            if _get_stream(source, int_traces) is not None:
+                # intermediate traces are only computed if required;
+                # the obsels of the source are directly streamed through
+                effective_source = source
+                cstate = json_loads(computed_trace.metadata.value(
+                    computed_trace.uri, METADATA.computation_state))
+                cstate.update([
+                    ("streaming", [ str(i.uri) for i in int_traces ]),
+                    ("str_mon_tag", None),
+                    ("last_seen_u", None),
+                ])
+                computed_trace.metadata.set((computed_trace.uri,
+                                             METADATA.computation_state,
+                                             Literal(json_dumps(cstate))))
+                for int_trace in int_traces:
+                    # prevents eager computation (see ktbs.plugins.eager)
+                    int_trace.metadata.set((int_trace.uri, METADATA.lazy,
+                                            Literal("yes")))
+            else:
+                LOG.info("not all methods of <%s> support streaming",
+                         computed_trace.uri)
         computed_trace.metadata.set((computed_trace.uri,
                                      METADATA.effective_source,
                                      effective_source.uri))
 
-        # inherit trace description from effecive_source
-        model_uri = effective_source.model_uri
-        origin = effective_source.state.value(effective_source.uri, KTBS.hasOrigin)
+        # inherit trace description from the last method
+        model_uri = prev.model_uri
+        origin = prev.state.value(prev.uri, KTBS.hasOrigin)
         with computed_trace.edit(_trust=True) as editable:
             editable.set((computed_trace.uri, KTBS.hasModel, model_uri))
             editable.set((computed_trace.uri, KTBS.hasOrigin, origin))
@@ -113,10 +142,74 @@ class _PipeMethod(IMethod):
             LOG.error(msg)
             diag.append(msg)
             return diag
+        cstate = json_loads(
+            computed_trace.metadata.value(computed_trace.uri,
+                                          METADATA.computation_state))
+        if cstate.get("streaming"):
+            return self._compute_streamed_obsels(computed_trace, cstate,
+                                                 effective_source,
+                                                 from_scratch, diag)
         else:
             return _FUSION_IMPL.compute_obsels(computed_trace, from_scratch,
                                                [effective_source], diag)
 
+    @staticmethod
+    def _compute_streamed_obsels(computed_trace, cstate, source, from_scratch,
+                                 diag):
+        """I compute the obsels of computed_trace in streaming mode.
+
+        The obsels of the source are streamed through all the methods,
+        and only those coming out of the last one are stored.
+        They are copies of the obsels of the source
+        (with possibly another type).
+        """
+        int_traces = [ computed_trace.factory(URIRef(uri))
+                       for uri in cstate["streaming"] ]
+        stream = _get_stream(source, int_traces)
+        if stream is None:
+            diag.append("Intermediate traces of <%s> do not support "
+                        "streaming anymore" % computed_trace.uri)
+            return diag
+
+        target_obsels = computed_trace.obsel_collection
+        source_obsels = source.obsel_collection
+        after = None
+        if not from_scratch \
+        and cstate["str_mon_tag"] == source_obsels.str_mon_tag:
+            LOG.debug("strictly temporally monotonic %s", computed_trace)
+            after = cstate["last_seen_u"] and URIRef(cstate["last_seen_u"])
+        else:
+            LOG.debug("non-strictly monotonic %s", computed_trace)
+            target_obsels._empty() # friend #pylint: disable=W0212
+
+        last_read = [None]
+        def iter_source_records():
+            for record in source.iter_obsel_records(after=after,
+                                                    refresh="no"):
+                last_read[0] = record
+                yield record
+
+        def iter_kept_obsels():
+            for record in stream(iter_source_records()):
+                # streams yield each record before reading the next one
+                source_record = last_read[0]
+                new_type = record.type
+                if new_type == source_record.type:
+                    new_type = None # keep all the types of the source obsel
+                yield record.uri, None, new_type
+
+        with target_obsels.edit({"add_obsels_only":1}, _trust=True):
+            copy_obsels(iter_kept_obsels(), computed_trace, source)
+
+        for record in source.iter_obsel_records(reverse=True, limit=1,
+                                                refresh="no"):
+            cstate["last_seen_u"] = str(record.uri)
+        cstate["str_mon_tag"] = source_obsels.str_mon_tag
+        computed_trace.metadata.set((computed_trace.uri,
+                                     METADATA.computation_state,
+                                     Literal(json_dumps(cstate))))
+        return diag
+
     @staticmethod
     def _prepare_source_and_params(computed_trace, diag):
         """I check and prepare the data required by the method.
@@ -163,16 +256,43 @@ class _PipeMethod(IMethod):
             'methods_uris': method_uris,
             'methods': methods,
             'method_params': method_params,
+            'streaming': False,
         }
 
+        streaming = params.pop('streaming', None)
         if len(params) > 1:
             diag.append("WARN: Method ktbs:pipe does not support "
                         "additional parameters yet")
             # TODO implement a way to dispatch parameters to submethods
+        if streaming is not None:
+            ret_params['streaming'] = boolean_parameter(streaming)
 
         if critical:
             return None, None
         else:
             return sources[0], ret_params
 
+def _get_stream(source, int_traces):
+    """I return a function streaming obsel records of source through the
+    methods of all int_traces, or None if one of them does not support it.
+
+    See `.abstract.AbstractMonosourceMethod.get_obsel_stream`:meth:.
+    """
+    graph = source.obsel_collection.state
+    streams = []
+    for int_trace in int_traces:
+        impl = int_trace._method_impl # friend #pylint: disable=W0212
+        if not isinstance(impl, AbstractMonosourceMethod):
+            return None
+        stream = impl.prepare_obsel_stream(int_trace, graph, Diagnosis())
+        if stream is None:
+            return None
+        streams.append(stream)
+
+    def stream_all(records):
+        for stream in streams:
+            records = stream(records)
+        return records
+    return stream_all
+
 register_builtin_method_impl(_PipeMethod())
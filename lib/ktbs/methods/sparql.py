@@ -18,7 +18,9 @@
 """
 Implementation of the sparql builtin methods.
 """
+import re
 import traceback
+from json import dumps as json_dumps, loads as json_loads
 
 from pyparsing import ParseException
 from rdfrest.exceptions import ParseError
@@ -29,8 +31,9 @@ import rdflib.plugins.sparql.algebra
 
 from rdfrest.util.prefix_conjunctive_view import PrefixConjunctiveView
 from .interface import IMethod
-from .utils import replace_obsels
-from ..namespace import KTBS
+from .utils import add_obsels, boolean_parameter, replace_obsels
+from ..engine.resource import METADATA
+from ..namespace import KTBS, KTBS_NS_URI
 from ..engine.builtin_method import register_builtin_method_impl
 
 import logging
@@ -66,6 +69,15 @@ class _SparqlMethod(IMethod):
             with computed_trace.edit(_trust=True) as editable:
                 editable.add((computed_trace.uri, KTBS.hasModel, model))
                 editable.add((computed_trace.uri, KTBS.hasOrigin, origin))
+            if params.get("incremental") and not _is_incremental(params):
+                LOG.info("%s can not be computed incrementally",
+                         computed_trace.uri)
+
+        # reset the computation state, used by the incremental mode
+        computed_trace.metadata.set((computed_trace.uri,
+                                     METADATA.computation_state,
+                                     Literal(json_dumps({}))
+                                     ))
 
         return diag
 
@@ -75,9 +87,30 @@ class _SparqlMethod(IMethod):
         diag = Diagnosis("sparql.compute_obsels")
 
         source = computed_trace.source_traces[0]
+        source_obsels = source.obsel_collection
         parameters = computed_trace.parameters_as_dict
         parameters["__destination__"] = computed_trace.uri
         parameters["__source__"] = source.uri
+        if "incremental" in parameters:
+            parameters["incremental"] = \
+                boolean_parameter(parameters["incremental"])
+        incremental = _is_incremental(parameters)
+
+        cstate = {}
+        if incremental:
+            cstate = json_loads(
+                computed_trace.metadata.value(computed_trace.uri,
+                                              METADATA.computation_state,
+                                              default="{}"))
+
+        # in incremental mode, only new obsels are considered,
+        # unless the source has changed in a non strictly monotonic way
+        after = None
+        if incremental and not from_scratch \
+        and cstate.get("last_seen_u") is not None \
+        and cstate.get("str_mon_tag") == source_obsels.str_mon_tag:
+            LOG.debug("strictly temporally monotonic %s", computed_trace)
+            after = URIRef(cstate["last_seen_u"])
 
         scope = parameters.get('scope', 'trace')
         try:
@@ -88,13 +121,39 @@ class _SparqlMethod(IMethod):
                                              source.service.store)
             else:
                 # scope == 'trace'
-                data = source.obsel_collection.get_state({"refresh":"no"})
-            sparql = parameters["sparql"] % parameters
-            result = data.query(sparql, base=source.obsel_collection.uri).graph
-            replace_obsels(computed_trace, result, ("inherit" in parameters))
+                data = source_obsels.get_state({"refresh":"no"})
+            sparql = parameters["sparql"]
+            if "%(__subselect__)s" in sparql:
+                # the 'ktbs' prefix required by the subselect is expanded,
+                # as rdflib ignores it if the query binds another prefix
+                # to the kTBS namespace
+                subselect = source_obsels.build_select(after=after,
+                                                       selected=_SUBSELECTED)
+                parameters["__subselect__"] = "{%s}" % _KTBS_PNAME.sub(
+                    r"<%s#\1>" % KTBS_NS_URI, subselect)
+            sparql = sparql % parameters
+            result = data.query(sparql, base=source_obsels.uri).graph
+            if after is None:
+                replace_obsels(computed_trace, result, ("inherit" in parameters))
+            else:
+                add_obsels(computed_trace, result, ("inherit" in parameters))
         except Exception as exc:
             LOG.warning(traceback.format_exc())
             diag.append(str(exc))
+            incremental = False
+
+        if incremental:
+            last_seen_u = cstate.get("last_seen_u")
+            for obs in source.iter_obsels(reverse=True, limit=1,
+                                          refresh="no"):
+                # iter only once on the last obsel, if any
+                last_seen_u = str(obs.uri)
+            cstate["last_seen_u"] = last_seen_u
+            cstate["str_mon_tag"] = source_obsels.str_mon_tag
+            computed_trace.metadata.set((computed_trace.uri,
+                                         METADATA.computation_state,
+                                         Literal(json_dumps(cstate))
+                                         ))
 
         return diag
 
@@ -147,6 +206,22 @@ class _SparqlMethod(IMethod):
         else:
             return sources[0], params
 
+def _is_incremental(params):
+    """I check whether the incremental mode can be used with `params`.
+
+    This requires the ``incremental`` parameter to be set,
+    the query to be evaluated against the source trace only,
+    and the SPARQL query to contain the ``%(__subselect__)s`` placeholder.
+    """
+    return bool(params.get("incremental")) \
+        and params.get("scope", "trace") == "trace" \
+        and "%(__subselect__)s" in params.get("sparql", "")
+
+_SUBSELECTED = \
+    "(?obs as ?sourceObsel) (?b as ?sourceBegin) (?e as ?sourceEnd)"
+
+_KTBS_PNAME = re.compile(r"\bktbs:(\w+)")
+
 def _scope_datatype(value):
     if value in {'trace', 'base', 'store'}:
         return value
@@ -158,6 +233,7 @@ _PARAMETERS_TYPE = {
     "sparql": str,
     "inherit": str,
     "scope": _scope_datatype,
+    "incremental": boolean_parameter,
 }
 
 # monkeypatch to fix issue #381 in rdflib.plugins.sparql
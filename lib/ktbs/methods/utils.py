@@ -18,7 +18,9 @@
 """
 Utility functions for method implementations.
 """
-from rdflib import BNode, Graph, URIRef
+from itertools import islice
+
+from rdflib import BNode, Graph, RDF, URIRef
 from rdfrest.util import check_new, make_fresh_uri
 
 from ..namespace import KTBS
@@ -32,6 +34,39 @@ def replace_obsels(computed_trace, raw_graph, inherit=False):
     so it must be valid.
     """
     obsels = computed_trace.obsel_collection
+    triples = _prepare_raw_graph(computed_trace, raw_graph, inherit)
+    with obsels.edit(_trust=True) as editable:
+        obsels._empty() # friend #pylint: disable=W0212
+        editable.addN( (s, p, o, editable) for s, p, o in triples )
+
+def add_obsels(computed_trace, raw_graph, inherit=False):
+    """
+    Add the obsels described in raw_graph to the @obsels graph of computed_trace.
+
+    This works as `replace_obsels`:func:, except that the obsels already
+    present in computed_trace are kept, and that the generated URIs are
+    guaranteed to be fresh in the @obsels graph as well.
+    As the obsels are added with
+    `~.engine.trace_obsels.AbstractTraceObsels.add_obsel_graph`:meth:,
+    the monotonicity of computed_trace is preserved
+    as long as the new obsels come after the existing ones.
+    """
+    obsels = computed_trace.obsel_collection
+    triples = _prepare_raw_graph(computed_trace, raw_graph, inherit,
+                                 obsels.state)
+    graph = Graph()
+    graph.addN( (s, p, o, graph) for s, p, o in triples )
+    with obsels.edit({"add_obsels_only":1}, _trust=True):
+        obsels.add_obsel_graph(graph)
+
+def _prepare_raw_graph(computed_trace, raw_graph, inherit, target_state=None):
+    """
+    I prepare raw_graph for `replace_obsels`:func: or `add_obsels`:func:,
+    and return an iterable of triples.
+
+    If target_state is provided, the URIs generated for blank obsels
+    are also fresh in target_state.
+    """
     rg_add = raw_graph.add
     ct_uri = computed_trace.uri
 
@@ -50,22 +85,19 @@ def replace_obsels(computed_trace, raw_graph, inherit=False):
 
     bnodes = [ i for i in raw_graph.subjects(KTBS.hasBegin, None)
                if isinstance(i, BNode) ]
-    bnode_map = None
-    if bnodes:
-        bnode_map = {}
-        for bnode in bnodes:
-            new_uri = make_fresh_uri(raw_graph, ct_uri + "o-")
-            bnode_map[bnode] = new_uri
-            rg_add((new_uri, KTBS.hasTrace, ct_uri))
+    if not bnodes:
+        return iter(raw_graph)
 
-    with obsels.edit(_trust=True) as editable:
-        obsels._empty() # friend #pylint: disable=W0212
-        if bnodes:
-            bm_get = bnode_map.get
-            triples = ( [ bm_get(x, x) for x in triple] for triple in raw_graph )
-        else:
-            triples = iter(raw_graph)
-        editable.addN( (s, p, o, editable) for s, p, o in triples )
+    bnode_map = {}
+    for bnode in bnodes:
+        new_uri = make_fresh_uri(raw_graph, ct_uri + "o-")
+        while target_state is not None \
+        and not check_new(target_state, new_uri):
+            new_uri = make_fresh_uri(raw_graph, ct_uri + "o-")
+        bnode_map[bnode] = new_uri
+        rg_add((new_uri, KTBS.hasTrace, ct_uri))
+    bm_get = bnode_map.get
+    return ( [ bm_get(x, x) for x in triple] for triple in raw_graph )
 
 def translate_node(node, transformed_trace, src_uri, multiple_sources, prevent=None):
     """
@@ -126,6 +158,101 @@ def copy_obsel(obsel_uri, computed_trace, source_trace, new_obs_uri=None, check_
 
     return new_obs_graph
 
+COPY_CHUNK_SIZE = 1000
+
+def iter_chunks(iterable, size=None):
+    """
+    I iter over lists of (at most) ``size`` consecutive items of ``iterable``.
+
+    ``size`` defaults to `COPY_CHUNK_SIZE`.
+    """
+    if size is None:
+        size = COPY_CHUNK_SIZE
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def add_obsel_graphs(target_obsels, graphs, size=None):
+    """
+    I add obsels to ``target_obsels``, by chunks of ``size`` obsel graphs.
+
+    ``graphs`` is an iterable of graphs, each describing a new obsel.
+    All the graphs of a chunk are merged and added at once with
+    `~.engine.trace_obsels.AbstractTraceObsels.add_obsel_graph`:meth:,
+    so that monotonicity is evaluated only once per chunk.
+
+    NB: ``graphs`` is consumed lazily, so the graphs of a chunk are not yet
+    in ``target_obsels`` when the following graphs are produced.
+    """
+    target_add_graph = target_obsels.add_obsel_graph
+    for chunk in iter_chunks(graphs, size):
+        merged = chunk[0]
+        for graph in chunk[1:]:
+            merged.addN( (s, p, o, merged) for s, p, o in graph )
+        target_add_graph(merged)
+
+def copy_obsels(obsels, computed_trace, source_trace, size=None):
+    """
+    I copy obsels of ``source_trace`` into ``computed_trace``, by chunks.
+
+    ``obsels`` is an iterable of triples
+    ``(obsel_uri, new_obs_uri, new_type)``, where ``new_obs_uri`` may be None
+    (in which case it is computed with `translate_node`:func:)
+    and ``new_type``, if not None, overrides the type of the source obsel.
+
+    This is equivalent to calling `copy_obsel`:func: (with ``check_new_obs``)
+    on each obsel, then adding the resulting graph to the obsel collection
+    of ``computed_trace``, except that the triples of a whole chunk of obsels
+    are gathered in a single graph and added at once.
+    As with `add_obsel_graphs`:func:, ``obsels`` is consumed lazily.
+    """
+    target_obsels = computed_trace.obsel_collection
+    target_state = target_obsels.state
+    target_add_graph = target_obsels.add_obsel_graph
+    target_uri = computed_trace.uri
+    source_uri = source_trace.uri
+    source_triples = source_trace.obsel_collection.state.triples
+
+    for chunk in iter_chunks(obsels, size):
+        graph = Graph()
+        graph_add = graph.add
+        def check_new_obs(uri):
+            return check_new(target_state, uri) and check_new(graph, uri)
+
+        for obsel_uri, new_obs_uri, new_type in chunk:
+            if new_obs_uri is None:
+                new_obs_uri = translate_node(obsel_uri, computed_trace,
+                                             source_uri, False)
+            graph_add((new_obs_uri, KTBS.hasTrace, target_uri))
+            graph_add((new_obs_uri, KTBS.hasSourceObsel, obsel_uri))
+            if new_type is not None:
+                graph_add((new_obs_uri, RDF.type, new_type))
+
+            for _, pred, obj in source_triples((obsel_uri, None, None)):
+                if pred == KTBS.hasTrace  or  pred == KTBS.hasSourceObsel:
+                    continue
+                if pred == RDF.type  and  new_type is not None:
+                    continue
+                new_obj = translate_node(obj, computed_trace, source_uri,
+                                         False, check_new_obs)
+                if new_obj is None:
+                    continue # skip relations to nodes that are filtered out or not created yet
+                graph_add((new_obs_uri, pred, new_obj))
+
+            for subj, pred, _ in source_triples((None, None, obsel_uri)):
+                if pred == KTBS.hasTrace  or  pred == KTBS.hasSourceObsel:
+                    continue
+                new_subj = translate_node(subj, computed_trace, source_uri,
+                                          False, check_new_obs)
+                if new_subj is None:
+                    continue # skip relations from nodes that are filtered out or not created yet
+                graph_add((new_subj, pred, new_obs_uri))
+
+        target_add_graph(graph)
+
 
 def boolean_parameter(value):
     return value.strip().lower() not in { "false", "no", "0" }
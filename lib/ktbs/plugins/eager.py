@@ -0,0 +1,200 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This kTBS plugin recomputes computed traces eagerly,
+whenever obsels are posted to one of their (direct or indirect) sources.
+
+By default, computed traces are only recomputed when their state is required,
+so the first client reading them after a burst of obsels
+pays for the whole recomputation.
+With this plugin,
+recomputation is performed asynchronously by a background thread,
+shortly after the obsels are posted.
+Computed traces are still recomputed lazily if required before that.
+
+The computed traces to recompute eagerly are configured in section
+``[eager]`` of the configuration file:
+
+* ``traces``: a space-separated list of computed trace URIs,
+* ``bases``: a space-separated list of base URIs;
+  all the computed traces contained in those bases (or their sub-bases)
+  are recomputed eagerly,
+* ``delay``: the number of seconds to wait after the last posted obsels
+  before recomputing (default: 1),
+  so that bursts of obsels are handled at once,
+* ``max-delay``: the maximum number of seconds to wait after the first posted
+  obsels (default: 10), in case obsels keep being posted.
+
+Intermediate traces of a streaming `pipe <../methods/composite>`:doc:
+are never recomputed eagerly.
+"""
+import logging
+from threading import Condition, Thread
+from time import monotonic
+
+from ktbs.engine.resource import METADATA
+from ktbs.engine.trace import add_post_hook, remove_post_hook
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_DELAY = 1.0
+DEFAULT_MAX_DELAY = 10.0
+
+class EagerScheduler(object):
+    """I recompute the computed traces depending on stored traces
+    that received new obsels.
+
+    Stored traces are queued by `enqueue`:meth:,
+    and processed by a background thread
+    once no obsel has been posted to them for `delay` seconds
+    (or at the latest `max_delay` seconds after they were queued).
+    """
+    def __init__(self, traces=(), bases=(), delay=DEFAULT_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY):
+        self.traces = set( str(i) for i in traces )
+        self.bases = tuple( str(i) for i in bases )
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending = {} # trace uri -> [trace, first post, last post]
+        self._condition = Condition()
+        self._thread = None
+        self._running = False
+
+    def enqueue(self, trace, _new_obsels=None):
+        """Queue the transformed traces of `trace` for recomputation.
+
+        This method can be registered with
+        `ktbs.engine.trace.add_post_hook`:func:.
+        """
+        now = monotonic()
+        with self._condition:
+            entry = self._pending.get(trace.uri)
+            if entry is None:
+                self._pending[trace.uri] = [trace, now, now]
+            else:
+                entry[2] = now
+            if self._thread is None:
+                self._running = True
+                self._thread = Thread(target=self._run,
+                                      name="ktbs-eager-recomputation")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self):
+        """Stop the background thread, dropping pending recomputations."""
+        with self._condition:
+            thread = self._thread
+            self._running = False
+            self._pending.clear()
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        self._thread = None
+
+    def is_eager(self, computed_trace):
+        """Whether `computed_trace` must be recomputed eagerly."""
+        if computed_trace.metadata.value(computed_trace.uri,
+                                         METADATA.lazy) is not None:
+            return False
+        uri = str(computed_trace.uri)
+        return uri in self.traces  or  uri.startswith(self.bases)
+
+    def iter_eager_traces(self, trace):
+        """Iter over the computed traces depending on `trace`
+        that must be recomputed eagerly,
+        closest ones first.
+        """
+        seen = set()
+        queue = list(trace.iter_transformed_traces())
+        while queue:
+            ctr = queue.pop(0)
+            if ctr.uri in seen:
+                continue
+            seen.add(ctr.uri)
+            if self.is_eager(ctr):
+                yield ctr
+            queue.extend(ctr.iter_transformed_traces())
+
+    def recompute(self, trace):
+        """Recompute the computed traces depending on `trace`."""
+        for ctr in self.iter_eager_traces(trace):
+            LOG.debug("eagerly recomputing <%s>", ctr.uri)
+            try:
+                ctr.obsel_collection.force_state_refresh()
+            except Exception as exc:
+                # the error will be raised again to the next reader
+                LOG.warning("could not recompute <%s>: %s", ctr.uri, exc)
+
+    def _pop_ready(self):
+        """Wait until some queued traces are ready, and return them.
+
+        Return None if the scheduler is stopped.
+        """
+        with self._condition:
+            while self._running:
+                now = monotonic()
+                ready = []
+                timeout = None
+                for uri, (_, first, last) in list(self._pending.items()):
+                    deadline = min(last + self.delay, first + self.max_delay)
+                    if deadline <= now:
+                        ready.append(self._pending.pop(uri)[0])
+                    elif timeout is None or deadline - now < timeout:
+                        timeout = deadline - now
+                if ready:
+                    return ready
+                self._condition.wait(timeout)
+            return None
+
+    def _run(self):
+        while True:
+            ready = self._pop_ready()
+            if ready is None:
+                return
+            for trace in ready:
+                try:
+                    self.recompute(trace)
+                except Exception:
+                    LOG.exception("eager recomputation failed for <%s>",
+                                  trace.uri)
+
+SCHEDULER = None
+
+def start_plugin(config):
+    #pylint: disable=W0603
+    global SCHEDULER
+    kw = {}
+    if config.has_section('eager'):
+        if config.has_option('eager', 'traces'):
+            kw['traces'] = config.get('eager', 'traces').split()
+        if config.has_option('eager', 'bases'):
+            kw['bases'] = config.get('eager', 'bases').split()
+        if config.has_option('eager', 'delay'):
+            kw['delay'] = config.getfloat('eager', 'delay')
+        if config.has_option('eager', 'max-delay'):
+            kw['max_delay'] = config.getfloat('eager', 'max-delay')
+    SCHEDULER = EagerScheduler(**kw)
+    add_post_hook(SCHEDULER.enqueue)
+
+def stop_plugin():
+    #pylint: disable=W0603
+    global SCHEDULER
+    remove_post_hook(SCHEDULER.enqueue)
+    SCHEDULER.stop()
+    SCHEDULER = None
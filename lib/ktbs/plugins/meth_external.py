@@ -25,15 +25,24 @@ Therefore, it is mostly intended for single-user localhost instances of kTBS.
 import logging
 import traceback
 
-from os import getenv
+from collections import OrderedDict
+from contextlib import contextmanager
+from json import dumps as json_dumps, loads as json_loads
+from os import getenv, read as os_read
 from rdflib import Literal, Graph, URIRef
+from rdflib.plugins.parsers.ntriples import NTGraphSink, W3CNTriplesParser
 from rdfrest.util import Diagnosis
 from rdfrest.exceptions import ParseError
+from select import select
 from subprocess import Popen, PIPE
+from threading import Lock, Thread
+from time import monotonic
 
 from ktbs.methods.interface import IMethod
-from ktbs.methods.utils import replace_obsels
+from ktbs.methods.utils import add_obsels, boolean_parameter, iter_chunks, \
+    replace_obsels
 from ktbs.engine.builtin_method import register_builtin_method_impl
+from ktbs.engine.resource import METADATA
 from ktbs.namespace import KTBS
 
 LOG = logging.getLogger(__name__)
@@ -77,6 +86,12 @@ class _ExternalMethod(IMethod):
                 editable.add((computed_trace.uri, KTBS.hasModel, model))
                 editable.add((computed_trace.uri, KTBS.hasOrigin, origin))
 
+        # reset the computation state, used by the persistent mode
+        computed_trace.metadata.set((computed_trace.uri,
+                                     METADATA.computation_state,
+                                     Literal(json_dumps({}))
+                                     ))
+
         return diag
 
     def compute_obsels(self, computed_trace, from_scratch=False):
@@ -92,7 +107,8 @@ class _ExternalMethod(IMethod):
         rdfformat = parameters.get("format", "n3")
 
         command_line = parameters["command-line"] % parameters
-        if parameters.get("feed-to-stdin"):
+        persistent = boolean_parameter(parameters.get("persistent", "false"))
+        if parameters.get("feed-to-stdin") and not persistent:
             stdin = PIPE
             stdin_data = (sources[0].obsel_collection
                           .get_state({"refresh":"no"})
@@ -105,6 +121,11 @@ class _ExternalMethod(IMethod):
             "PATH": getenv("PATH", ""),
             "PYTHONPATH": getenv("PYTHONPATH", ""),
             }
+        if persistent:
+            self._compute_obsels_persistent(computed_trace, command_line,
+                                            popen_env, from_scratch, diag)
+            return diag
+
         LOG.info("Running: %s" % command_line)
         child = Popen(command_line, shell=True, stdin=stdin, stdout=PIPE,
                       close_fds=True, env=popen_env)
@@ -122,6 +143,80 @@ class _ExternalMethod(IMethod):
 
         return diag
 
+    @staticmethod
+    def _compute_obsels_persistent(computed_trace, command_line, popen_env,
+                                   from_scratch, diag):
+        """I compute the obsels of `computed_trace` with a persistent worker.
+
+        The computation state (stored in the metadata of the computed trace)
+        records the state of the first source at the end of the last
+        computation.
+        The worker is reused across computations as long as the source
+        is only appended obsels, and the worker agrees with that state;
+        it is then only sent the new obsels of the source,
+        and the obsels it returns are added to the computed trace.
+        Otherwise, a fresh worker is started and sent all the obsels,
+        and the obsels it returns replace those of the computed trace.
+        """
+        source = computed_trace.source_traces[0]
+        str_mon_tag = source.obsel_collection.str_mon_tag
+        metadata = computed_trace.metadata
+        cstate = json_loads(metadata.value(computed_trace.uri,
+                                           METADATA.computation_state,
+                                           default="{}"))
+        with WORKERS.locked_worker(computed_trace.uri, command_line,
+                                   popen_env) as worker:
+            # the worker must agree with the computation state,
+            # which must agree with the source
+            incremental = (not from_scratch
+                           and worker.process is not None
+                           and worker.str_mon_tag is not None
+                           and worker.str_mon_tag == cstate.get("str_mon_tag")
+                           and worker.last_seen_u == cstate.get("last_seen_u")
+                           and cstate.get("str_mon_tag") == str_mon_tag)
+            if worker.process is None \
+            or worker.str_mon_tag is not None and not incremental:
+                LOG.debug("restarting worker for %s", computed_trace.uri)
+                worker.restart()
+            last_seen_u = worker.last_seen_u if incremental else None
+            after = None if last_seen_u is None else URIRef(last_seen_u)
+
+            # keep track of the last obsel actually sent to the worker
+            last_seen = [last_seen_u]
+            def iter_batches():
+                obsels = source.iter_obsels(after=after, refresh="no")
+                triples = source.obsel_collection.state.triples
+                for chunk in iter_chunks(obsels):
+                    graph = Graph()
+                    for obs in chunk:
+                        graph.addN( (s, p, o, graph) for s, p, o
+                                    in triples((obs.uri, None, None)) )
+                    last_seen[0] = str(chunk[-1].uri)
+                    yield graph.serialize(format="nt", encoding="utf-8")
+
+            raw_graph = Graph()
+            try:
+                worker.call(iter_batches(), raw_graph, TIMEOUT)
+            except Exception as exc:
+                LOG.warning(traceback.format_exc())
+                diag.append(str(exc))
+                cstate = {}
+            else:
+                if incremental:
+                    add_obsels(computed_trace, raw_graph)
+                else:
+                    replace_obsels(computed_trace, raw_graph)
+                worker.str_mon_tag = str_mon_tag
+                worker.last_seen_u = last_seen[0]
+                cstate = {
+                    "str_mon_tag": str_mon_tag,
+                    "last_seen_u": last_seen[0],
+                }
+            metadata.set((computed_trace.uri,
+                          METADATA.computation_state,
+                          Literal(json_dumps(cstate))
+                          ))
+
     @staticmethod
     def _prepare_sources_and_params(computed_trace, diag):
         """I check and prepare the data required by the method.
@@ -163,6 +258,9 @@ class _ExternalMethod(IMethod):
                     critical = True
 
         nsrc = len(sources)
+        if params.get("persistent") and nsrc == 0:
+            diag.append("Parameter persistent requires at least one source")
+            critical = True
         minsrc = params.get("min-sources")
         if minsrc and  nsrc < minsrc:
             diag.append("Too few sources (%s, min is %s)" % (nsrc, minsrc))
@@ -186,12 +284,195 @@ _PARAMETERS_TYPE = {
     "max-sources": int,
     "feed-to-stdin": bool, # for the moment assume 1st source
     "format": str,
+    "persistent": boolean_parameter,
 }
 
-def start_plugin(_config):
+
+class WorkerError(Exception):
+    """I am raised when a persistent worker fails to process a batch."""
+    pass
+
+class _Worker(object):
+    """I wrap a persistent child process running a command line.
+
+    For each computation, the child process is sent a batch of obsels
+    as N-Triples on its standard input, followed by an empty line.
+    It must reply on its standard output with the new obsels
+    as N-Triples, followed by an empty line,
+    then wait for the next batch.
+
+    `str_mon_tag` and `last_seen_u` record the state of the source
+    at the end of the last computation performed by this worker
+    (to be checked against the computation state of the computed trace);
+    `str_mon_tag` is None if the worker has not processed any batch yet.
+    """
+    def __init__(self, command_line, env):
+        self.command_line = command_line
+        self.env = env
+        self.lock = Lock()
+        self.process = None
+        self.restart()
+
+    def restart(self):
+        """Start (or restart) the child process."""
+        self.close()
+        LOG.info("Starting worker: %s" % self.command_line)
+        self.process = Popen(self.command_line, shell=True, stdin=PIPE,
+                             stdout=PIPE, close_fds=True, env=self.env)
+        self.str_mon_tag = None
+        self.last_seen_u = None
+
+    def close(self):
+        """Terminate the child process."""
+        process = self.process
+        if process is not None:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            for pipe in (process.stdin, process.stdout):
+                try:
+                    pipe.close()
+                except OSError:
+                    pass # unflushed data can not be sent to a dead process
+            self.process = None
+        self.str_mon_tag = None
+        self.last_seen_u = None
+
+    def call(self, batches, graph, timeout):
+        """Send `batches` to the child process, and parse its reply in `graph`.
+
+        `batches` is an iterable of N-Triples byte strings;
+        it is consumed by another thread, while the reply is parsed
+        line by line as soon as it is received.
+
+        If the child process fails, or does not reply within `timeout`
+        seconds, it is terminated and a `WorkerError` is raised.
+        """
+        process = self.process
+        stdin = process.stdin
+        def write():
+            try:
+                for data in batches:
+                    stdin.write(data)
+                stdin.write(b"\n")
+                stdin.flush()
+            except (OSError, ValueError):
+                pass # the child process died, reported by the reading loop
+        writer = Thread(target=write)
+        writer.daemon = True
+        writer.start()
+
+        parser = W3CNTriplesParser(NTGraphSink(graph))
+        bnode_context = {}
+        stdout = process.stdout.fileno()
+        deadline = monotonic() + timeout
+        pending = b""
+        try:
+            while True:
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not select([stdout], [], [], remaining)[0]:
+                    raise WorkerError("worker timed out after %ss" % timeout)
+                data = os_read(stdout, 65536)
+                if not data:
+                    raise WorkerError("worker ended with error: %s"
+                                      % process.wait())
+                lines = (pending + data).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    line = line.decode("utf-8").strip()
+                    if not line:
+                        writer.join(max(deadline - monotonic(), 0))
+                        if writer.is_alive():
+                            raise WorkerError("worker replied before reading "
+                                              "its whole input")
+                        return
+                    parser.line = line
+                    parser.parseline(bnode_context)
+        except Exception:
+            # killing the child process and closing its stdin
+            # makes the writer fail if it is blocked;
+            # it must not outlive this call
+            self.close()
+            writer.join(timeout)
+            raise
+
+class _WorkerPool(object):
+    """I manage a bounded pool of persistent workers.
+
+    Workers are identified by the URI of the computed trace they compute.
+    When the pool is full, the least recently used worker is terminated.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._workers = OrderedDict()
+        self._lock = Lock()
+
+    @contextmanager
+    def locked_worker(self, key, command_line, env):
+        """Provide the worker for `key` (starting it if required), locked.
+
+        The worker is guaranteed to be still in the pool once locked,
+        so it can not be evicted (and closed) by another thread before its
+        lock is released; a worker restarted while it is locked is therefore
+        always tracked by the pool.
+        """
+        while True:
+            worker = self._get_worker(key, command_line, env)
+            with worker.lock:
+                with self._lock:
+                    in_pool = self._workers.get(key) is worker
+                if in_pool:
+                    yield worker
+                    return
+            # else the worker was evicted in the meantime; try again
+
+    def _get_worker(self, key, command_line, env):
+        """Return the worker for `key`, starting it if required."""
+        evicted = []
+        with self._lock:
+            worker = self._workers.pop(key, None)
+            if worker is not None and worker.command_line != command_line:
+                evicted.append(worker)
+                worker = None
+            if worker is None:
+                worker = _Worker(command_line, env)
+            self._workers[key] = worker
+            while len(self._workers) > self.size:
+                evicted.append(self._workers.popitem(last=False)[1])
+        for old in evicted:
+            with old.lock:
+                old.close()
+        return worker
+
+    def close(self):
+        """Terminate all workers."""
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            with worker.lock:
+                worker.close()
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 60.0
+
+WORKERS = _WorkerPool(DEFAULT_WORKERS)
+TIMEOUT = DEFAULT_TIMEOUT
+
+def start_plugin(config):
     """I get the configuration values from the main kTBS configuration.
 
     .. note:: This function is called automatically by the kTBS.
               It is called once when the kTBS starts, not at each request.
     """
+    global TIMEOUT
+    if config.has_section('external'):
+        if config.has_option('external', 'workers'):
+            WORKERS.size = config.getint('external', 'workers')
+        if config.has_option('external', 'timeout'):
+            TIMEOUT = config.getfloat('external', 'timeout')
     register_builtin_method_impl(_ExternalMethod())
+
+def stop_plugin():
+    """I terminate all persistent workers."""
+    WORKERS.close()
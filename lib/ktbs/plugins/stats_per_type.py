@@ -14,7 +14,7 @@
 #
 #    You should have received a copy of the GNU Lesser General Public License
 #    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
-from rdflib import BNode, Variable
+from rdflib import BNode, Literal, RDF, Variable
 
 from ktbs.engine.trace_stats import add_plugin, remove_plugin, NS
 from ktbs.namespace import KTBS
@@ -40,6 +40,25 @@ def populate_stats(graph, trace):
 
             graph.add((trace.uri, NS.obselCountPerType, ot_infos))
 
+def update_stats(graph, trace, new_obsels):
+    # Obsel type statistics, updated with the types of the new obsels
+    obsels_graph = trace.obsel_collection.state
+    ot_infos_by_type = {
+        graph.value(ot_infos, NS.hasObselType): ot_infos
+        for ot_infos in graph.objects(trace.uri, NS.obselCountPerType)
+    }
+    for obs in new_obsels:
+        for otype in obsels_graph.objects(obs, RDF.type):
+            ot_infos = ot_infos_by_type.get(otype)
+            if ot_infos is None:
+                ot_infos = ot_infos_by_type[otype] = BNode()
+                graph.add((ot_infos, NS.nb, Literal(1)))
+                graph.add((ot_infos, NS.hasObselType, otype))
+                graph.add((trace.uri, NS.obselCountPerType, ot_infos))
+            else:
+                nb = graph.value(ot_infos, NS.nb).toPython()
+                graph.set((ot_infos, NS.nb, Literal(nb+1)))
+
 COUNT_OBSEL_TYPES= '''
     SELECT ?t (count(?o) as ?nb)
         $trace # selected solely to please Virtuoso
@@ -55,4 +74,4 @@ def start_plugin(_config):
     .. note:: This function is called automatically by the kTBS.
               It is called once when the kTBS starts, not at each request.
     """
-    add_plugin(populate_stats)
+    add_plugin(populate_stats, update_stats)
@@ -16,7 +16,7 @@
 #    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
 from ktbs.engine.trace_stats import add_plugin, NS
 from ktbs.namespace import KTBS
-from rdflib import Variable
+from rdflib import Literal, Variable
 
 def populate_stats(graph, trace):
     # Obsel type statistics
@@ -35,6 +35,24 @@ def populate_stats(graph, trace):
         if nbs.value > 0:
             graph.add((trace.uri, NS.distinctSubjects, nbs))
 
+def update_stats(graph, trace, new_obsels):
+    # Distinct subjects, updated with the subjects of the new obsels
+    obsels_graph = trace.obsel_collection.state
+    new_obsels = set(new_obsels)
+    new_subjects = set()
+    for obs in new_obsels:
+        subject = obsels_graph.value(obs, KTBS.hasSubject)
+        if subject is None or subject in new_subjects:
+            continue
+        if all( other in new_obsels for other
+                in obsels_graph.subjects(KTBS.hasSubject, subject) ):
+            new_subjects.add(subject)
+
+    if new_subjects:
+        nbs = graph.value(trace.uri, NS.distinctSubjects)
+        nbs = (0 if nbs is None else nbs.toPython()) + len(new_subjects)
+        graph.set((trace.uri, NS.distinctSubjects, Literal(nbs)))
+
 # NB: do NOT remove ?trace from the SELECT; it is required by Virtuoso
 COUNT_DISTINCT_SUBJECTS = '''
     SELECT (COUNT(DISTINCT ?s) as ?nbs)
@@ -51,4 +69,4 @@ def start_plugin(_config):
     .. note:: This function is called automatically by the kTBS.
               It is called once when the kTBS starts, not at each request.
     """
-    add_plugin(populate_stats)
+    add_plugin(populate_stats, update_stats)
@@ -835,6 +835,176 @@ _KTBS_HAS_TRACE = KTBS.hasTrace
 _KTBS_HAS_SOURCE_OBSEL = KTBS.hasSourceObsel
 
 
+def iter_trace_obsels_json(graph, tobsels, bindings=None, chunk_size=100):
+    """
+    I iter over the JSON-LD serialization of the trace obsels, chunk by chunk.
+
+    The result is equivalent to dumping the output of `trace_obsels_to_json`,
+    but obsels are converted one at a time, in the order of the temporal
+    index, which is walked a chunk at a time;
+    memory usage does therefore not depend on the number of obsels.
+
+    The key order of each obsel differs slightly, though:
+    `trace_obsels_to_json` inserts keys in the order of the whole graph,
+    so ``@reverse`` may appear anywhere after the keys of `_OBSEL_TEMPLATE`,
+    while here it is always the last key of the obsel.
+    The output is therefore not byte-compatible
+    (which it could not be anyway, as that order depends on the store).
+
+    :param graph: Obsel collection graph
+    :param tobsels: the obsel collection
+    :param bindings: ?
+    :param chunk_size: the number of obsels per yielded string
+    """
+    model_uri = tobsels.trace.model_uri
+    if model_uri[-1] not in { "/", "#" }:
+        model_uri += "#"
+    valconv = ValueConverter(tobsels.uri, { model_uri: "m" })
+    valconv_uri = valconv.uri
+    val2jsonobj = valconv.val2jsonobj
+    triples = graph.triples
+
+    if (tobsels.uri, RDF.type, KTBS.StoredTraceObsels) in graph:
+        tobsels_type = "StoredTraceObsels"
+    else:
+        tobsels_type = "ComputedTraceObsels"
+
+    head = dumps(OrderedDict([
+        ('@context', [ CONTEXT_URI, {'m': model_uri} ]),
+        ('@id', './'),
+        ('hasObselList', { '@id': '', '@type': tobsels_type }),
+        ('obsels', []),
+    ]), ensure_ascii=False, indent=4)
+    assert head.endswith("[]\n}")
+    yield head[:-4]
+
+    trace_uri = valconv_uri(tobsels.trace.uri)
+    def has_trace(node):
+        return (node, _KTBS_HAS_TRACE, None) in graph
+
+    def ref_count(node):
+        return sum( 1 for _, pred, _ in triples((None, None, node))
+                    if pred not in _IGNORED_REFS )
+
+    shared_bnodes = set()
+    def bnode_factory(node):
+        if ref_count(node) == 1:
+            return node_dict(node, {})
+        bnode_id = '_:%s' % node
+        if node in shared_bnodes:
+            return {'@id': bnode_id}
+        shared_bnodes.add(node)
+        return node_dict(node, {'@id': bnode_id})
+
+    def node_dict(subj, jsonobj):
+        # see trace_obsels_to_json
+        for _, pred, obj in triples((subj, None, None)):
+            if pred == _RDF_TYPE:
+                at_type = jsonobj.get('@type')
+                if at_type is None:
+                    jsonobj['@type'] = valconv_uri(obj)
+                else:
+                    if not type(at_type) is list:
+                        jsonobj['@type'] = at_type = [at_type]
+                    at_type.append(valconv_uri(obj))
+                continue
+            if pred == _KTBS_HAS_TRACE:
+                continue
+            if pred == _KTBS_HAS_SOURCE_OBSEL:
+                jsonobj['hasSourceObsel'].append(valconv_uri(obj))
+                continue
+
+            pred_key = KTBS_SPECIAL_KEYS.get(pred) or valconv_uri(pred)
+            new_val = val2jsonobj(obj, bnode_factory)
+            if not isinstance(obj, Literal) and has_trace(obj):
+                new_val['hasTrace'] = trace_uri
+            if pred_key == 'subject' and type(new_val) is OrderedDict:
+                pred_key = 'hasSubject'
+                new_val = new_val['@id']
+            _add_value(jsonobj, pred_key, new_val)
+        return jsonobj
+
+    def obsel_dict(obs):
+        jsonobj = OrderedDict(_OBSEL_TEMPLATE)
+        jsonobj['@id'] = valconv_uri(obs)
+        jsonobj['hasSourceObsel'] = []
+        node_dict(obs, jsonobj)
+        for subj, pred, _ in triples((None, None, obs)):
+            if pred in _IGNORED_REFS:
+                continue
+            pred_key = KTBS_SPECIAL_KEYS.get(pred) or valconv_uri(pred)
+            if pred_key == 'subject':
+                pred_key = 'hasSubject'
+            new_val = { "@id": valconv_uri(subj) }
+            if has_trace(subj):
+                new_val["hasTrace"] = trace_uri
+            _add_value(jsonobj.setdefault('@reverse', {}), pred_key, new_val)
+        for key in [ key for key, val in jsonobj.items()
+                     if val is None or val == [] ]:
+            del jsonobj[key]
+        return jsonobj
+
+    sep = "["
+    chunk = []
+    for obs in _iter_sorted_obsels(graph, tobsels, chunk_size):
+        obsel_json = dumps(obsel_dict(obs), ensure_ascii=False, indent=4)
+        chunk.append("%s\n        %s" % (sep, obsel_json.replace("\n", "\n        ")))
+        sep = ","
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if sep == "[":
+        chunk.append("[]\n}")
+    else:
+        chunk.append("\n    ]\n}")
+    yield "".join(chunk)
+
+def _iter_sorted_obsels(graph, tobsels, chunk_size):
+    """Iter over the obsels of `graph`, sorted by (end, begin, uri).
+
+    If `graph` is the state of `tobsels`, the keys are read from its
+    temporal index, a chunk at a time, so that nothing proportional to the
+    number of obsels is kept in memory.
+    Otherwise (e.g. for a slice of the collection, which is a copy held in
+    memory anyway), the obsels of `graph` are sorted.
+    """
+    get_temporal_index = getattr(tobsels, "get_temporal_index", None)
+    if get_temporal_index is not None \
+    and graph.store is tobsels.service.store \
+    and graph.identifier == tobsels.uri:
+        last = None
+        while True:
+            keys = list(get_temporal_index().slice(after=last,
+                                                   limit=chunk_size))
+            for key in keys:
+                obs = URIRef(key[2])
+                # the obsel may have been removed in the meantime
+                if (obs, KTBS.hasBegin, None) in graph:
+                    yield obs
+            if len(keys) < chunk_size:
+                return
+            last = keys[-1]
+    else:
+        ends = dict(graph.subject_objects(KTBS.hasEnd))
+        keys = [ (int(ends.get(obs, -1)), int(begin), str(obs), obs)
+                 for obs, begin in graph.subject_objects(KTBS.hasBegin) ]
+        del ends
+        keys.sort(key=lambda x: x[:3])
+        for _, _, _, obs in keys:
+            yield obs
+
+def _add_value(jsonobj, key, val):
+    """Add `val` to the values of `key` in `jsonobj`."""
+    old_val = jsonobj.get(key)
+    if old_val is None:
+        jsonobj[key] = val
+    elif type(old_val) == list:
+        old_val.append(val)
+    else:
+        jsonobj[key] = [old_val, val]
+
+_IGNORED_REFS = { _RDF_TYPE, _KTBS_HAS_TRACE, _KTBS_HAS_SOURCE_OBSEL }
+
 @register_serializer(JSONLD, "jsonld", 85, KTBS.ComputedTraceObsels)
 @register_serializer(JSONLD, "jsonld", 85, KTBS.StoredTraceObsels)
 @register_serializer(JSON, "json", 60, KTBS.ComputedTraceObsels)
@@ -845,14 +1015,14 @@ def serialize_json_trace_obsels(graph, tobsels, bindings=None):
     """
     I serialize the trace obsels to a json-ld string.
 
+    Obsels are serialized incrementally (see `iter_trace_obsels_json`).
+
     :param graph:
     :param tobsels:
     :param bindings:
     :return:
     """
-    tobsels_dict = trace_obsels_to_json(graph, tobsels, bindings)
-
-    yield dumps(tobsels_dict, ensure_ascii=False, indent=4)
+    return iter_trace_obsels_json(graph, tobsels, bindings)
 
 def trace_stats_to_json(graph, tstats, bindings=None):
     """
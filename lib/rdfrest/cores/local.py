@@ -137,6 +137,7 @@ class Service(object):
         # same resource.
         self._resource_cache = WeakValueDictionary()
         self._context_level = 0
+        self._after_commit = []
 
         metadata_graph = self.get_metadata_graph(root_uri)
         initialized = list(metadata_graph.triples((self.root_uri,
@@ -259,14 +260,32 @@ class Service(object):
             self.store.transaction()
         self._context_level += 1
 
+    def after_commit(self, func, *args):
+        """Call ``func(*args)`` once the current modifications are committed.
+
+        If no service context is active, ``func`` is called immediately.
+        Otherwise, it is called when the *outermost* context exits normally,
+        and never if it exits with an exception.
+        Several calls with the same `func` and `args` in the same context
+        result in a single call.
+        """
+        if self._context_level == 0:
+            func(*args)
+        elif (func, args) not in self._after_commit:
+            self._after_commit.append((func, args))
+
     def __exit__(self, typ, _value, _traceback):
         """Ends modifications to this service.
         """
         level = self._context_level - 1
         self._context_level = level
         if level == 0:
+            callbacks = self._after_commit
+            self._after_commit = []
             if typ is None:
                 self.store.commit()
+                for func, args in callbacks:
+                    func(*args)
             else:
                 self.store.rollback()
                 # we rollback *in case* the store supports it,
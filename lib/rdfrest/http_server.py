@@ -20,8 +20,15 @@ I implement a WSGI-based HTTP server
 wrapping a given :class:`.cores.local.Service`.
 """
 from bisect import insort
+from collections import OrderedDict
 from contextlib import closing
+from itertools import chain
+from shutil import rmtree
+from tempfile import mkdtemp, mkstemp
+from threading import Lock
 from time import time
+from weakref import finalize
+import os
 
 from pyparsing import ParseException
 from rdflib import URIRef
@@ -101,6 +108,12 @@ class HttpFrontend(object):
           accepts to serve or to consume.
         - max_triples (int): the maximum number of triples that this server
           accepts to serve or to consume.
+        - representation_cache_size (int): the maximum number of bytes of
+          serialized representations kept in memory
+          (see `RepresentationCache`:class:);
+          representation_cache_spill_dir,
+          representation_cache_spill_threshold and
+          representation_cache_spill_size configure its on-disk spill.
         """
         # __init__ not called in mixin #pylint: disable=W0231
         # NB: strange, pylint should recognized it is a mixin...
@@ -129,6 +142,23 @@ class HttpFrontend(object):
         else:
             self.max_triples = None
 
+        self.representation_cache = None
+        cache_size = service_config.getint(
+            'server', 'representation-cache-size', fallback=0)
+        if cache_size > 0:
+            self.representation_cache = RepresentationCache(
+                cache_size,
+                service_config.get(
+                    'server', 'representation-cache-spill-dir', fallback=None)
+                or None,
+                service_config.getint(
+                    'server', 'representation-cache-spill-threshold',
+                    fallback=DEFAULT_SPILL_THRESHOLD),
+                service_config.getint(
+                    'server', 'representation-cache-spill-size',
+                    fallback=DEFAULT_SPILL_SIZE),
+            )
+
         self.reset_connection = \
             service_config.getboolean('server', 'reset-connection')
 
@@ -215,6 +245,23 @@ class HttpFrontend(object):
     def http_get(self, request, resource):
         """Process a GET request on the given resource.
         """
+        return self._get_or_head(request, resource, False)
+
+    def http_head(self, request, resource):
+        """Process a HEAD request on the given resource.
+
+        Unlike GET, the representation is not serialized;
+        and the state of the resource is not even retrieved
+        when its etags are enough to produce the headers
+        (i.e. when no parameter is given).
+        Note that, as a consequence, the limits `max_triples` and `max_bytes`
+        are not checked.
+        """
+        return self._get_or_head(request, resource, True)
+
+    def _get_or_head(self, request, resource, head):
+        """I implement `http_get`:meth: and `http_head`:meth:."""
+        # too many branches #pylint: disable=R0912
         headerlist = []
         params = request.environ['rdfrest.parameters']
 
@@ -247,13 +294,33 @@ class HttpFrontend(object):
             # else we can be certain that the serializer exists, so:
             serializer, ext = get_serializer_by_content_type(ctype, rdf_type)
 
-        # get graph and redirect if needed
         cache_bypass = params.pop("_", None) # dummy param used by JQuery to invalidate cache
-        graph = resource.get_state(params or None)
-        redirect = getattr(graph, "redirected_to", None)
-        if redirect is not None:
-            return self.issue_error(303, request, None,
-                                    location=redirect)
+        cache = self.representation_cache
+
+        # compute etags before building and serializing the graph
+        fresh_etags = None
+        if request.if_none_match or cache is not None or head:
+            fresh_etags = self._get_fresh_etags(resource, params)
+
+        # check conditional request
+        if request.if_none_match and fresh_etags:
+            response = self._check_not_modified(request, fresh_etags, ctype,
+                                                headerlist)
+            if response is not None:
+                if cache_bypass:
+                    response.cache_control = "no-cache"
+                elif self.cache_control:
+                    response.cache_control = self.cache_control
+                return response
+
+        # look for a cached representation
+        cache_key = cached = None
+        if cache is not None and fresh_etags:
+            cache_etag = self._get_cache_etag(resource, params, fresh_etags)
+            if cache_etag is not None:
+                cache_key = (str(resource.uri), _freeze_params(params), ctype,
+                             cache_etag)
+                cached = cache.get(cache_key)
 
         # populate response header according to serializer
         if ctype[:5] == "text/":
@@ -264,17 +331,78 @@ class HttpFrontend(object):
             headerlist.append(("content-location",
                                str("%s.%s" % (resource.uri, ext))))
 
-        # also insert etags, if available
-        etag_list = getattr(graph, "etags", None)
-        if etag_list is None:
-            iter_etags = getattr(resource, "iter_etags", None)
-            if iter_etags is not None:
-                etag_list = list(iter_etags(params or None))
-        if etag_list:
-            etag_list = [ 'W/"%s"' % taint_etag(i, ctype)
-                          for i in etag_list ]
-            headerlist.append(("etag", etag_list[-1]))
-            headerlist.append(("x-etags", " ".join(etag_list)))
+        payload = app_iter = None
+        if cached is not None:
+            graph_headers, payload = cached
+            app_iter = [payload]
+        elif head and fresh_etags is not None and not params:
+            # the state is not required to produce the headers
+            graph_headers = _etag_headers(fresh_etags, ctype)
+        else:
+            # get graph and redirect if needed
+            graph = resource.get_state(params or None)
+            redirect = getattr(graph, "redirected_to", None)
+            if redirect is not None:
+                return self.issue_error(303, request, None,
+                                        location=redirect)
+            graph_headers = []
+
+            # also insert etags, if available
+            etag_list = getattr(graph, "etags", None)
+            if etag_list is None:
+                etag_list = fresh_etags
+            if etag_list is None:
+                iter_etags = getattr(resource, "iter_etags", None)
+                if iter_etags is not None:
+                    etag_list = list(iter_etags(params or None))
+            if etag_list:
+                graph_headers.extend(_etag_headers(etag_list, ctype))
+
+            # also insert links (navigation and other) if available
+            links = getattr(graph, "links", ())
+            for link in links:
+                uri = link.pop('uri')
+                link_props = ';'.join( '%s="%s"' % item for item in link.items() )
+                link_val = '<%s>;%s' % (uri, link_props)
+                graph_headers.append(("link", link_val))
+
+            # check triples & bytes limitations and serialize
+            if self.max_triples is not None  and  len(graph) > self.max_triples:
+                return self.issue_error(403, request, resource,
+                                        "max_triple (%s) was exceeded"
+                                        % self.max_triples )
+            if self.max_bytes is not None  and  len(graph) > self.max_bytes:
+                # no serialization uses less than one byte per triple
+                return self.issue_error(403, request, resource,
+                                        "max_bytes (%s) was exceeded"
+                                        % self.max_bytes )
+            if not head:
+                app_iter = serializer(graph, resource)
+                if self.max_bytes is not None:
+                    app_iter = _read_within(app_iter, self.max_bytes)
+                    if app_iter is None:
+                        return self.issue_error(403, request, resource,
+                                                "max_bytes (%s) was exceeded"
+                                                % self.max_bytes )
+                if cache_key is not None:
+                    # only buffer the payload if it can be cached,
+                    # else stream it
+                    chunks, rest = _read_ahead(app_iter, cache.max_body_size)
+                    if rest is None:
+                        payload = b"".join(chunks)
+                        app_iter = [payload]
+                        cache.put(cache_key, (graph_headers, payload))
+                    else:
+                        app_iter = rest
+
+        # check bytes limitation of cached representation
+        if self.max_bytes is not None  and  payload is not None \
+        and len(payload) > self.max_bytes:
+            return self.issue_error(403, request, resource,
+                                    "max_bytes (%s) was exceeded"
+                                    % self.max_bytes )
+
+        headerlist.extend(graph_headers)
 
         # also insert last-modified, if available
         last_modified = getattr(resource, "last_modified", None)
@@ -282,30 +410,10 @@ class HttpFrontend(object):
             last_modified = datetime.fromtimestamp(last_modified, UTC)
             headerlist.append(("last-modified", last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')))
 
-        # also insert links (navigation and other) if available
-        links = getattr(graph, "links", ())
-        for link in links:
-            uri = link.pop('uri')
-            link_props = ';'.join( '%s="%s"' % item for item in link.items() )
-            link_val = '<%s>;%s' % (uri, link_props)
-            headerlist.append(("link", link_val))
-
-        # check triples & bytes limitations and serialize
-        if self.max_triples is not None  and  len(graph) > self.max_triples:
-            return self.issue_error(403, request, resource,
-                                    "max_triple (%s) was exceeded"
-                                    % self.max_triples )
-        app_iter = serializer(graph, resource)
-        if self.max_bytes is not None:
-            # TODO LATER find a better way to guess the number of bytes?
-            payload = b"".join(app_iter)
-            if len(payload) >  self.max_bytes:
-                return self.issue_error(403, request, resource,
-                                        "max_bytes (%s) was exceeded"
-                                        % self.max_bytes )
-            app_iter = [payload]
-
-        response = MyResponse(headerlist=headerlist, app_iter=app_iter)
+        if head:
+            response = MyResponse(headerlist=headerlist, request=request)
+        else:
+            response = MyResponse(headerlist=headerlist, app_iter=app_iter)
 
         if cache_bypass:
             response.cache_control = "no-cache"
@@ -316,12 +424,73 @@ class HttpFrontend(object):
         return response
 
 
-    def http_head(self, request, resource):
-        """Process a HEAD request on the given resource.
+    def _get_cache_etag(self, resource, params, fresh_etags):
+        """I return the etag to use in the cache key of `resource`,
+        or None if its representation for `params` must not be cached.
+
+        Resources may implement a ``get_representation_dependencies`` method,
+        accepting the query parameters,
+        and returning the other resources that their representation depends on
+        (whose etags are then included in the cache key),
+        or None if those dependencies can not be determined.
+        """
+        # method could be a function #pylint: disable=R0201
+        get_dependencies = getattr(resource, "get_representation_dependencies",
+                                   None)
+        if get_dependencies is None:
+            return fresh_etags[0]
+        dependencies = get_dependencies(params or None)
+        if dependencies is None:
+            return None
+        return (fresh_etags[0],) + tuple(
+            next(iter(dep.iter_etags())) for dep in dependencies
+        )
+
+    def _get_fresh_etags(self, resource, params):
+        """I return the list of etags of `resource` for `params`,
+        or None if `resource` has no `iter_etags` method.
+
+        The resource is refreshed first (so that computed resources are
+        up-to-date), but its state is not retrieved.
+        None is also returned when `params` force the recomputation of the
+        resource.
+        Note that `iter_etags` may not yield all the etags that `get_state`
+        would provide (e.g. monotonicity tags of obsel slices).
         """
-        response = self.http_get(request, resource)
-        return MyResponse(status=response.status,
-                           headerlist=response.headerlist, request=request)
+        # method could be a function #pylint: disable=R0201
+        iter_etags = getattr(resource, "iter_etags", None)
+        if iter_etags is None:
+            return None
+        if params and params.get("refresh") in _FORCING_REFRESH:
+            # get_state will recompute the resource anyway,
+            # and refreshing it here would do it twice
+            return None
+        checked = dict(params) if params else None
+        try:
+            resource.force_state_refresh(checked)
+        except InvalidParametersError:
+            # some parameters may be accepted by get_state only
+            return None
+        return list(iter_etags(checked))
+
+    def _check_not_modified(self, request, etag_list, ctype, headerlist):
+        """I return a 304 response if one of the etags in `etag_list`
+        matches the ``If-None-Match`` header of `request`, else None.
+
+        This allows to answer conditional requests
+        without invoking `get_state` and the serializer at all;
+        when no etag matches, the request is simply processed normally.
+        """
+        # method could be a function #pylint: disable=R0201
+        for i in chain(etag_list, etag_variants(etag_list)):
+            if taint_etag(i, ctype) in request.if_none_match:
+                break
+        else: # no matching etag found in 'for' loop
+            return None
+
+        headerlist = headerlist + _etag_headers(etag_list, ctype)
+        return MyResponse(status="304 Not Modified", headerlist=headerlist,
+                          request=request)
 
     def http_options(self, request, resource):
         """Process an OPTIONS request on the given resource.
@@ -497,6 +666,202 @@ def etag_variants(etags):
     for etag in etags:
         yield "%s-gzip" % etag # Apache with gzip encoding
 
+def _read_within(app_iter, max_bytes):
+    """I read the chunks of `app_iter` as long as they fit in `max_bytes`.
+
+    Return the list of chunks,
+    or None as soon as `max_bytes` is exceeded
+    (in which case `app_iter` is not consumed any further).
+
+    Chunks are kept as is (not joined),
+    so the payload is never copied in memory.
+    """
+    chunks = []
+    size = 0
+    try:
+        for chunk in app_iter:
+            size += len(chunk)
+            if size > max_bytes:
+                return None
+            chunks.append(chunk)
+    finally:
+        close = getattr(app_iter, "close", None)
+        if close is not None:
+            close()
+    return chunks
+
+def _read_ahead(app_iter, max_bytes):
+    """I read the chunks of `app_iter` as long as they fit in `max_bytes`.
+
+    Return a pair (chunks, rest).
+    If `app_iter` was exhausted, `chunks` contains the whole payload,
+    and `rest` is None.
+    Else, `rest` is an iterable yielding the whole payload
+    (starting with the chunks already read),
+    and `app_iter` is not read any further until `rest` is consumed.
+    """
+    chunks = []
+    size = 0
+    iterator = iter(app_iter)
+    for chunk in iterator:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            return chunks, _ResumedIter(chunks, iterator, app_iter)
+    close = getattr(app_iter, "close", None)
+    if close is not None:
+        close()
+    return chunks, None
+
+class _ResumedIter(object):
+    """I yield the chunks read by `_read_ahead`:func:,
+    then the rest of the original app_iter.
+    """
+    #pylint: disable=R0903
+    #  too few public methods
+
+    def __init__(self, chunks, iterator, app_iter):
+        self._chunks = chunks
+        self._iterator = iterator
+        self._app_iter = app_iter
+
+    def __iter__(self):
+        return chain(self._chunks, self._iterator)
+
+    def close(self):
+        """I close the original app_iter, as required by WSGI."""
+        close = getattr(self._app_iter, "close", None)
+        if close is not None:
+            close()
+
+def _etag_headers(etags, ctype):
+    """I return the header fields conveying the given etags."""
+    if not etags:
+        return []
+    etags = [ 'W/"%s"' % taint_etag(i, ctype) for i in etags ]
+    return [("etag", etags[-1]), ("x-etags", " ".join(etags))]
+
+def _freeze_params(params):
+    """I convert query parameters into a hashable value."""
+    return tuple(sorted( (key, str(val)) for key, val in params.items() ))
+
+DEFAULT_SPILL_THRESHOLD = 1 << 20 # 1MB
+DEFAULT_SPILL_SIZE = 1 << 28 # 256MB
+
+class RepresentationCache(object):
+    """I am a LRU cache of serialized representations, bounded in bytes.
+
+    Keys are expected to contain the URI of the resource as their first item,
+    and its etag (possibly combined with the etags of the resources that the
+    representation depends on) as their last item,
+    so that an entry can never be served once the resource has changed.
+    When an entry is stored with a new etag,
+    all the entries for the same URI with the previous etag are discarded.
+
+    If `spill_dir` is provided, bodies bigger than `spill_threshold` are
+    stored in a temporary sub-directory (bounded to `spill_size` bytes)
+    rather than in memory.
+
+    The number of hits and misses are available as attributes `hits` and
+    `misses`.
+    """
+    def __init__(self, max_size, spill_dir=None,
+                 spill_threshold=DEFAULT_SPILL_THRESHOLD,
+                 spill_size=DEFAULT_SPILL_SIZE):
+        self.max_size = max_size
+        self.spill_threshold = spill_threshold
+        self.spill_size = spill_size
+        self.size = 0
+        self.spilled_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key -> (headers, body, path, size)
+        self._by_uri = {} # uri -> (etag, set of keys)
+        self._lock = Lock()
+        self._spill_dir = None
+        if spill_dir is not None:
+            self._spill_dir = mkdtemp(prefix="rdfrest-cache-", dir=spill_dir)
+            finalize(self, rmtree, self._spill_dir, True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_body_size(self):
+        """The size of the biggest body that this cache may store."""
+        if self._spill_dir is None:
+            return self.max_size
+        return max(self.max_size, self.spill_size)
+
+    def get(self, key):
+        """I return the (headers, body) pair cached for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            headers, body, path, _ = entry
+            if body is None:
+                # read it while locked, so that it is not evicted meanwhile
+                with open(path, "rb") as spilled:
+                    body = spilled.read()
+        return headers, body
+
+    def put(self, key, value):
+        """I cache the (headers, body) pair `value` for `key`."""
+        headers, body = value
+        size = len(body)
+        if size > self.spill_threshold  and  self._spill_dir is not None:
+            if size > self.spill_size:
+                return
+            fd, path = mkstemp(dir=self._spill_dir)
+            with os.fdopen(fd, "wb") as spilled:
+                spilled.write(body)
+            entry = (headers, None, path, size)
+        elif size > self.max_size:
+            return
+        else:
+            entry = (headers, body, None, size)
+
+        uri, etag = key[0], key[-1]
+        with self._lock:
+            old_etag, keys = self._by_uri.get(uri, (etag, ()))
+            if old_etag != etag:
+                for old_key in list(keys):
+                    self._remove(old_key)
+            elif key in self._entries:
+                self._remove(key)
+            self._by_uri.setdefault(uri, (etag, set()))[1].add(key)
+            self._entries[key] = entry
+            if entry[2] is None:
+                self.size += size
+            else:
+                self.spilled_size += size
+            while self.size > self.max_size \
+            or self.spilled_size > self.spill_size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """I remove all the entries of this cache."""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _remove(self, key):
+        """Remove an entry; the lock must be acquired."""
+        _, _, path, size = self._entries.pop(key)
+        if path is None:
+            self.size -= size
+        else:
+            self.spilled_size -= size
+            os.remove(path)
+        keys = self._by_uri[key[0]][1]
+        keys.discard(key)
+        if not keys:
+            del self._by_uri[key[0]]
+
 class _TooManyTriples(Exception):
     """This exception class is used to abort edit context during PUT.
     """
@@ -507,6 +872,8 @@ class _TooManyTriples(Exception):
 # WSGI Middleware registry
 #
 
+_FORCING_REFRESH = frozenset(["yes", "force", "recursive"])
+
 _MIDDLEWARE_REGISTRY = []
 _MIDDLEWARE_STACK_VERSION = 0
 
@@ -314,6 +314,9 @@ def wrap_generator_exceptions(extype):
             try:
                 for i in func(*args, **kw):
                     yield i
+            except GeneratorExit:
+                # the generator is being closed; this is not an error
+                raise
             except BaseException as ex:
                 raise extype(ex)
         return wrapped
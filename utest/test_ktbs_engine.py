@@ -24,6 +24,7 @@ from threading import Thread
 from wsgiref.simple_server import make_server
 
 from rdflib import BNode, Graph, Literal, RDF, RDFS, URIRef
+from webob import Request
 
 from datetime import datetime, timedelta
 from rdfrest.exceptions import CanNotProceedError, InvalidDataError, \
@@ -39,6 +40,7 @@ from ktbs.engine.service import KtbsService
 from ktbs.methods.filter import LOG as FILTER_LOG
 from ktbs.namespace import KTBS
 from ktbs.time import lit2datetime
+from ktbs.utils import SKOS
 from ktbs.config import get_ktbs_configuration
 from ktbs.engine.service import make_ktbs
 from .utils import StdoutHandler
@@ -99,6 +101,7 @@ class HttpKtbsTestCaseMixin(object):
     def teardown_method(self):
         if self.httpd:
             self.httpd.shutdown()
+            self.httpd.server_close()
             self.httpd = None
         super(HttpKtbsTestCaseMixin, self).teardown_method()
 
@@ -381,6 +384,95 @@ class TestKtbs(KtbsTestCase):
         assert obs2.list_relating_obsels(rtype0) == [obs1]
         assert obs3.list_relating_obsels(rtype0) == [obs2]
 
+    def test_post_multiple_obsels_atomic(self):
+        base = self.my_ktbs.create_base()
+        model = base.create_model()
+        otype0 = model.create_obsel_type("#MyObsel0")
+        trace = base.create_stored_trace(None, model, "1970-01-01T00:00:00Z",
+                                         "alice")
+        graph = Graph()
+        for i in range(5):
+            obs = BNode()
+            graph.add((obs, KTBS.hasTrace, trace.uri))
+            graph.add((obs, RDF.type, otype0.uri))
+            graph.add((obs, KTBS.hasBegin, Literal(i)))
+        graph.add((obs, KTBS.hasEnd, Literal("not a timestamp")))
+        old_etag = trace.obsel_collection.etag
+
+        with assert_raises(InvalidDataError):
+            trace.post_graph(graph)
+        assert trace.obsel_collection.etag == old_etag
+        assert len(trace.list_obsels()) == 0
+
+    def test_post_many_obsels(self):
+        base = self.my_ktbs.create_base()
+        model = base.create_model()
+        otype0 = model.create_obsel_type("#MyObsel0")
+        rtype0 = model.create_relation_type("#MyRel0")
+        trace = base.create_stored_trace(None, model, "1970-01-01T00:00:00Z",
+                                         "alice")
+        trace.create_obsel("o", otype0, 0)
+        graph = Graph()
+        previous = None
+        for i in range(1, 201):
+            obs = BNode()
+            graph.add((obs, KTBS.hasTrace, trace.uri))
+            graph.add((obs, RDF.type, otype0.uri))
+            graph.add((obs, KTBS.hasBegin, Literal(i)))
+            if previous is not None:
+                graph.add((previous, rtype0.uri, obs))
+            previous = obs
+        collection = trace.obsel_collection
+        old_etag = collection.etag
+        old_tag = collection.str_mon_tag
+
+        created = trace.post_graph(graph)
+        assert len(created) == len(set(created)) == 200
+        assert collection.etag != old_etag
+        # new obsels are all after the existing ones
+        assert collection.str_mon_tag == old_tag
+        obsels = trace.list_obsels()
+        assert [ obs.uri for obs in obsels[1:] ] == created
+        assert obsels[1].list_related_obsels(rtype0) == [obsels[2]]
+        assert collection.metadata.value(collection.uri, METADATA.last_obsel) \
+            == created[-1]
+
+    def test_mint_obsel_uris(self):
+        base = self.my_ktbs.create_base()
+        model = base.create_model()
+        otype0 = model.create_obsel_type("#MyObsel0")
+        trace = base.create_stored_trace(None, model, "1970-01-01T00:00:00Z",
+                                         "alice")
+        # an obsel with an explicit URI, colliding with the counter
+        trace.create_obsel("o-0000000001", otype0, 0)
+
+        graph = Graph()
+        for i in range(3):
+            obs = BNode()
+            graph.add((obs, KTBS.hasTrace, trace.uri))
+            graph.add((obs, RDF.type, otype0.uri))
+            graph.add((obs, KTBS.hasBegin, Literal(i+1)))
+        graph.add((obs, SKOS.prefLabel, Literal("My Label")))
+        created = trace.post_graph(graph)
+        assert created == [
+            URIRef(trace.uri + "o-0000000000"),
+            URIRef(trace.uri + "o-0000000002"),
+            URIRef(trace.uri + "my-label-0000000003"),
+        ]
+        obs = trace.create_obsel(None, otype0, 4)
+        assert obs.uri == URIRef(trace.uri + "o-0000000004")
+
+        # the lexicographic order of URIs is the order of creation
+        graph = Graph()
+        for i in range(10):
+            obs = BNode()
+            graph.add((obs, KTBS.hasTrace, trace.uri))
+            graph.add((obs, RDF.type, otype0.uri))
+            graph.add((obs, KTBS.hasBegin, Literal(i+5)))
+        created = trace.post_graph(graph)
+        assert sorted(created) == created
+        assert created[-1] == URIRef(trace.uri + "o-0000000014")
+
     def test_post_no_obsels(self):
         base = self.my_ktbs.create_base()
         model = base.create_model()
@@ -505,6 +597,49 @@ class TestKtbs(KtbsTestCase):
         assert len(created) == 1
         assert trace1.get_obsel(created[0]).subject == bob
 
+    def test_base_prop(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        otype = model.create_obsel_type("#OT")
+        trace = base.create_stored_trace("t/", model, "1970-01-01T00:00:00Z",
+                                         label="the trace")
+        params = lambda: {'prop': 'label,hasModel,obselCount'}
+
+        state = base.get_state(params())
+        assert state.value(trace.uri, SKOS.prefLabel) == Literal("the trace")
+        assert state.value(trace.uri, KTBS.hasModel) == model.uri
+        assert state.value(trace.uri, KTBS.hasObselCount).value == 0
+        assert state.value(model.uri, KTBS.hasObselCount) is None
+
+        trace.create_obsel("o1", otype, 1)
+        trace.create_obsel("o2", otype, 2)
+        trace.label = "renamed"
+        state = base.get_state(params())
+        assert state.value(trace.uri, SKOS.prefLabel) == Literal("renamed")
+        assert state.value(trace.uri, KTBS.hasObselCount).value == 2
+
+        trace.get_obsel("o1").delete()
+        state = base.get_state(params())
+        assert state.value(trace.uri, KTBS.hasObselCount).value == 1
+
+        trace_uri = trace.uri
+        trace.delete()
+        state = base.get_state(params())
+        assert state.value(trace_uri, SKOS.prefLabel) is None
+        assert state.value(trace_uri, KTBS.hasObselCount) is None
+
+    def test_base_prop_not_stored(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        base.create_stored_trace("t/", model, "1970-01-01T00:00:00Z",
+                                 label="the trace")
+        store = self.service.store
+        before = len(store)
+        base.get_state({'prop': 'label,hasModel'})
+        assert len(store) == before
+        assert not list(base.metadata.objects(None, SKOS.prefLabel))
+        assert not list(base.metadata.objects(None, KTBS.hasModel))
+
 
 
 class TestObsels(KtbsTestCase):
@@ -563,6 +698,23 @@ class TestObsels(KtbsTestCase):
         assert obs.begin == 1000
         assert obs.end == 2000
 
+    def test_create_dt_timestamps_after_changes(self):
+        g = Graph()
+        obs = BNode()
+        g.add((obs, RDF.type, self.ot.uri))
+        g.add((obs, KTBS.hasTrace, self.trace.uri))
+        g.add((obs, KTBS.hasBeginDT, Literal(self.epoch.replace(minute=1))))
+        self.trace.post_graph(g)
+
+        # changes in the model and the trace must be taken into account
+        self.model.unit = KTBS.second
+        assert self.trace.unit == KTBS.second
+        self.trace.origin = "1970-01-01T00:00:30Z"
+        uris = self.trace.post_graph(g)
+        obs = self.trace.get_obsel(uris[0])
+        assert obs.begin == 30
+        assert obs.end == 30
+
     def test_delete_obsel_collection(self):
         t = self.trace
         ot = self.ot
@@ -626,6 +778,96 @@ class TestObsels(KtbsTestCase):
         o2.delete()
         assert log_mon_tag != t.obsel_collection.log_mon_tag
 
+    def test_http_not_modified_slice(self, monkeypatch):
+        t = self.trace
+        t.create_obsel("o1", self.ot, 10)
+        t.create_obsel("o2", self.ot, 20)
+        app = HttpFrontend(self.service, get_ktbs_configuration())
+        url = t.obsel_collection.uri + "?maxe=15"
+        resp = Request.blank(url, accept="text/turtle").get_response(app)
+        assert resp.status_int == 200
+        t.create_obsel("o3", self.ot, 30) # strictly monotonic change
+
+        def get_state(*args):
+            raise AssertionError("get_state should not be called")
+        monkeypatch.setattr(type(t.obsel_collection), "get_state", get_state)
+        resp2 = Request.blank(url, accept="text/turtle", headers={
+            "if-none-match": resp.headers["etag"],
+        }).get_response(app)
+        assert resp2.status_int == 304
+        assert resp2.headers["etag"] == resp.headers["etag"]
+
+    def test_http_head_slice(self):
+        t = self.trace
+        t.create_obsel("o1", self.ot, 10)
+        t.create_obsel("o2", self.ot, 20)
+        app = HttpFrontend(self.service, get_ktbs_configuration())
+        url = t.obsel_collection.uri + "?limit=1"
+        resp = Request.blank(url, accept="text/turtle").get_response(app)
+        req = Request.blank(url, accept="text/turtle", method="HEAD")
+        resp2 = req.get_response(app)
+        assert resp2.status_int == 200
+        assert resp2.body == b""
+        for header in ["etag", "x-etags", "link"]:
+            assert resp2.headers[header] == resp.headers[header]
+
+    def test_http_cache_prop(self):
+        t = self.trace
+        t.create_obsel("o1", self.ot, 10)
+        config = get_ktbs_configuration()
+        config.set("server", "representation-cache-size", "100000")
+        app = HttpFrontend(self.service, config)
+        url = self.base.uri + "?prop=obselCount"
+        resp = Request.blank(url, accept="text/turtle").get_response(app)
+        assert b"hasObselCount 1" in resp.body
+        t.create_obsel("o2", self.ot, 20)
+        resp = Request.blank(url, accept="text/turtle").get_response(app)
+        assert b"hasObselCount 2" in resp.body
+        assert len(app.representation_cache) == 0
+
+    def test_http_cache_trace_dependency(self):
+        t = self.trace
+        t.create_obsel("o1", self.ot, 10)
+        config = get_ktbs_configuration()
+        config.set("server", "representation-cache-size", "100000")
+        app = HttpFrontend(self.service, config)
+        url = t.obsel_collection.uri
+        req = Request.blank(url, accept="application/ld+json")
+        resp = req.get_response(app)
+        assert resp.status_int == 200
+        resp = req.get_response(app)
+        assert app.representation_cache.hits == 1
+        model2 = self.base.create_model("m2")
+        t.model = model2
+        resp = Request.blank(url, accept="application/ld+json") \
+            .get_response(app)
+        assert app.representation_cache.hits == 1
+        assert model2.uri.encode() in resp.body
+
+    def test_http_force_refresh_once(self, monkeypatch):
+        self.trace.create_obsel("o1", self.ot, 10)
+        ctr = self.base.create_computed_trace("ctr/", KTBS.filter, {},
+                                              [self.trace])
+        ctr.obsel_collection.force_state_refresh()
+        impl = ctr._method_impl
+        calls = []
+        compute_obsels = impl.compute_obsels
+        def counting_compute_obsels(*args, **kw):
+            calls.append(args)
+            return compute_obsels(*args, **kw)
+        monkeypatch.setattr(impl, "compute_obsels", counting_compute_obsels)
+        url = ctr.obsel_collection.uri + "?refresh=force"
+        config = get_ktbs_configuration()
+        config.set("server", "representation-cache-size", "100000")
+        for app in (HttpFrontend(self.service, get_ktbs_configuration()),
+                    HttpFrontend(self.service, config)):
+            for kw in ({}, {"method": "HEAD"}, {"if_none_match": '"foo"'}):
+                del calls[:]
+                resp = Request.blank(url, accept="text/turtle", **kw) \
+                    .get_response(app)
+                assert resp.status_int == 200
+                assert len(calls) == 1, (app.representation_cache, kw)
+
 
 class TestKtbsSynthetic(KtbsTestCase):
 
@@ -0,0 +1,136 @@
+from rdflib import Graph, Literal, RDF, URIRef
+
+from ktbs.engine.temporal_index import TemporalIndex, TimestampTrackingGraph
+from ktbs.namespace import KTBS
+
+
+def make_index(*obsels):
+    """Make an index from a list of (name, begin, end) tuples."""
+    graph = Graph()
+    for name, begin, end in obsels:
+        uri = URIRef("http://example.org/t/%s" % name)
+        graph.add((uri, KTBS.hasBegin, Literal(begin)))
+        graph.add((uri, KTBS.hasEnd, Literal(end)))
+    return TemporalIndex.from_graph(graph, "etag")
+
+def names(keys):
+    return [ key[2].rsplit("/", 1)[1] for key in keys ]
+
+
+class TestTemporalIndex(object):
+
+    def setup_method(self):
+        self.index = make_index(
+            ("d", 30, 40),
+            ("a", 0, 10),
+            ("c", 15, 20),
+            ("b", 10, 20),
+            ("e", 40, 40),
+        )
+
+    def test_from_graph(self):
+        index = self.index
+        assert index.etag == "etag"
+        assert len(index) == 5
+        assert names(index.slice()) == ["a", "b", "c", "d", "e"]
+        assert "http://example.org/t/a" in index
+        assert index.get("http://example.org/t/c") \
+            == (20, 15, "http://example.org/t/c")
+        assert names([index.first(), index.last()]) == ["a", "e"]
+
+    def test_from_graph_ignores_incomplete(self):
+        graph = Graph()
+        graph.add((URIRef("http://example.org/t/x"), KTBS.hasEnd, Literal(1)))
+        assert len(TemporalIndex.from_graph(graph)) == 0
+
+    def test_add_discard(self):
+        index = self.index
+        index.add("http://example.org/t/f", 50, 60)
+        index.add("http://example.org/t/g", 0, 5)
+        assert names(index.slice()) == ["g", "a", "b", "c", "d", "e", "f"]
+        index.add("http://example.org/t/g", 70, 70) # moving an obsel
+        assert names(index.slice()) == ["a", "b", "c", "d", "e", "f", "g"]
+        index.discard("http://example.org/t/c")
+        index.discard("http://example.org/t/unknown")
+        assert names(index.slice()) == ["a", "b", "d", "e", "f", "g"]
+        index.clear()
+        assert len(index) == 0
+        assert index.last() is None
+
+    def test_slice_time_bounds(self):
+        index = self.index
+        assert names(index.slice(mine=20)) == ["b", "c", "d", "e"]
+        assert names(index.slice(maxe=20)) == ["a", "b", "c"]
+        assert names(index.slice(minb=10, maxe=20)) == ["b", "c"]
+        assert names(index.slice(maxb=30)) == ["a", "b", "c", "d"]
+        assert names(index.slice(mine=50)) == []
+
+    def test_slice_after_before(self):
+        index = self.index
+        b = "http://example.org/t/b"
+        e = "http://example.org/t/e"
+        assert names(index.slice(after=b)) == ["c", "d", "e"]
+        assert names(index.slice(before=e)) == ["a", "b", "c", "d"]
+        assert names(index.slice(after=b, before=e)) == ["c", "d"]
+        assert names(index.slice(after="http://example.org/t/x")) == []
+
+    def test_slice_reverse_limit_offset(self):
+        index = self.index
+        assert names(index.slice(reverse=True)) == ["e", "d", "c", "b", "a"]
+        assert names(index.slice(limit=2)) == ["a", "b"]
+        assert names(index.slice(limit=2, offset=2)) == ["c", "d"]
+        assert names(index.slice(reverse=True, limit=2, offset=1)) \
+            == ["d", "c"]
+        assert names(index.slice(offset=4)) == ["e"]
+        assert names(index.slice(minb=10, limit=2, offset=1)) == ["c", "d"]
+
+
+class TestTimestampTrackingGraph(object):
+
+    def setup_method(self):
+        self.graph = TimestampTrackingGraph(Graph().store,
+                                            URIRef("http://example.org/t/"))
+        self.a = URIRef("http://example.org/t/a")
+        self.b = URIRef("http://example.org/t/b")
+
+    def test_add(self):
+        graph, a, b = self.graph, self.a, self.b
+        graph.add((a, RDF.type, KTBS.Obsel))
+        assert graph.touched == set()
+        graph.add((a, KTBS.hasBegin, Literal(1)))
+        graph.addN([(b, KTBS.hasEnd, Literal(2), graph),
+                    (b, RDF.type, KTBS.Obsel, graph)])
+        assert graph.touched == {a, b}
+        assert len(graph) == 4
+
+    def test_remove(self):
+        graph, a, b = self.graph, self.a, self.b
+        graph.add((a, RDF.type, KTBS.Obsel))
+        graph.add((b, KTBS.hasEnd, Literal(2)))
+        graph.reset_touched()
+        graph.remove((a, RDF.type, None))
+        assert graph.touched == set()
+        graph.remove((b, None, None))
+        assert graph.touched == {b}
+        graph.remove((None, None, None))
+        assert graph.touched is None
+        graph.add((a, KTBS.hasEnd, Literal(2)))
+        assert graph.touched is None
+        graph.reset_touched()
+        assert graph.touched == set()
+
+    def test_begin_delta(self):
+        graph, a, b = self.graph, self.a, self.b
+        graph.add((a, KTBS.hasBegin, Literal(1)))
+        graph.addN([(b, KTBS.hasBegin, Literal(2), graph),
+                    (b, KTBS.hasEnd, Literal(2), graph)])
+        assert graph.begin_delta == 2
+        graph.reset_touched()
+        graph.add((a, KTBS.hasBegin, Literal(1)))
+        graph.addN([(b, KTBS.hasBegin, Literal(2), graph)])
+        assert graph.begin_delta == 0
+        graph.remove((a, KTBS.hasEnd, None))
+        graph.remove((b, KTBS.hasBegin, Literal(3)))
+        assert graph.begin_delta == 0
+        graph.remove((a, None, None))
+        assert graph.begin_delta == -1
@@ -1,9 +1,17 @@
-from .test_ktbs_engine import KtbsTestCase
+from .test_ktbs_engine import HttpKtbsTestCaseMixin, KtbsTestCase
 from unittest import skipUnless
 from pytest import raises as assert_raises
+from rdflib import BNode, Literal, URIRef
+
+from ktbs.engine.resource import METADATA
+from ktbs.engine.temporal_index import get_temporal_indexes
+from ktbs.engine.trace_obsels import iter_dirty_obsel_collections
+from ktbs.namespace import KTBS
+from rdfrest.cores.http_client import HttpClientCore
 
 from ktbs.engine.lock import WithLockMixin
-from ktbs.engine.lock import get_semaphore_name
+from ktbs.engine.lock import get_dirty_semaphore, get_semaphore_name, \
+    wait_dirty
 from ktbs.engine.service import make_ktbs
 
 
@@ -24,6 +32,25 @@ class TestKtbsTraceObsels(KtbsTestCase):
                 t.create_obsel('o%s' % i, ot, 1000 * i)
             )
 
+    def test_obsel_count_without_index(self):
+        t = self.trace
+        oc = t.obsel_collection
+        assert oc.get_obsel_count() == 5
+        get_temporal_indexes(self.service).pop(oc.uri, None)
+        o0 = self.obsels[0].uri
+        with oc.edit({"add_obsels_only": 1}, _trust=True) as editable:
+            # re-adding the timestamps of an existing obsel
+            editable.add((o0, KTBS.hasBegin, Literal(0)))
+            editable.add((o0, KTBS.hasEnd, Literal(0)))
+        assert oc.metadata.value(oc.uri, METADATA.obsel_count) is not None
+        assert oc.get_obsel_count() == 5
+        get_temporal_indexes(self.service).pop(oc.uri, None)
+        t.create_obsel("o5", self.ot, 5000)
+        assert oc.get_obsel_count() == 6
+        with oc.edit() as editable:
+            editable.remove((o0, None, None))
+        assert oc.get_obsel_count() == 5
+
     def test_etags(self):
         t = self.trace
         oc = t.obsel_collection
@@ -55,3 +82,250 @@ class TestKtbsTraceObsels(KtbsTestCase):
         assert get_etags(before=self.obsels[3]) == [etag, mstag,]
         assert get_etags(before=self.obsels[4]) == [etag, mstag,]
         assert get_etags(after=self.obsels[-1]) == [etag,]
+
+    def test_slice_with_index(self):
+        t = self.trace
+        oc = t.obsel_collection
+        uris = [ o.uri for o in self.obsels ]
+
+        def get_uris(**params):
+            graph = oc.get_state(params)
+            return sorted(
+                uri for uri in uris
+                if (uri, None, None) in graph
+            )
+
+        assert get_uris(minb=1000, maxe=3000) == uris[1:4]
+        assert get_uris(after=self.obsels[2]) == uris[3:]
+        assert get_uris(before=self.obsels[2]) == uris[:2]
+        assert get_uris(reverse="yes", limit=2) == uris[3:]
+        assert get_uris(limit=2, offset=1) == uris[1:3]
+
+    def test_obsel_records(self):
+        t = self.trace
+        t.create_obsel('o5', self.ot, 5000, 6000, subject="alice")
+
+        def as_tuples(obsels):
+            return [ (o.uri, o.obsel_type.uri, o.begin, o.end, o.subject)
+                     for o in obsels ]
+
+        def rec_tuples(records):
+            return [ (r.uri, r.type, r.begin, r.end, r.subject)
+                     for r in records ]
+
+        assert rec_tuples(t.iter_obsel_records()) \
+            == as_tuples(t.iter_obsels())
+        assert rec_tuples(t.iter_obsel_records(begin=1000, end=3000)) \
+            == as_tuples(t.iter_obsels(begin=1000, end=3000))
+        assert rec_tuples(t.iter_obsel_records(reverse=True, limit=2)) \
+            == as_tuples(t.iter_obsels(reverse=True, limit=2))
+        bgp = "?obs ktbs:hasBegin ?b. FILTER(?b > 2000)"
+        assert rec_tuples(t.iter_obsel_records(bgp=bgp)) \
+            == as_tuples(t.iter_obsels(bgp=bgp))
+
+        record = t.list_obsel_records()[-1]
+        assert record.subject == Literal("alice")
+        with assert_raises(AttributeError):
+            record.foo = 42
+
+    def test_next_link_reverse(self):
+        oc = self.trace.obsel_collection
+        graph = oc.get_state({"reverse": "yes", "limit": 2})
+        assert graph.link.endswith("?reverse&limit=2&before=o3")
+
+    def test_last_obsel_after_delete(self):
+        t = self.trace
+        oc = t.obsel_collection
+        assert t.get_obsel("o4") is not None
+        t.get_obsel("o4").delete()
+        assert [ o.uri for o in t.iter_obsels() ] \
+            == [ o.uri for o in self.obsels[:4] ]
+        assert list(oc.iter_etags({"before": self.obsels[3].uri}))[1:] \
+            == [oc.str_mon_tag]
+
+    def test_slice_description(self):
+        t = self.trace
+        oc = t.obsel_collection
+        rt = self.model.create_relation_type("#RT")
+        at = self.model.create_attribute_type("#AT")
+        t2 = self.base.create_stored_trace("t2/", self.model,
+                                           origin="1970-01-01T00:00:00Z")
+        x = t2.create_obsel("x", self.ot, 0)
+        o1, o2, o3 = [ obs.uri for obs in self.obsels[1:4] ]
+        b1, b2, b3 = BNode(), BNode(), BNode()
+        with oc.edit(_trust=True) as editable:
+            editable.add((o1, rt.uri, o2))
+            editable.add((o2, rt.uri, o3))
+            editable.add((o2, rt.uri, x.uri))
+            editable.add((x.uri, KTBS.hasTrace, t2.uri))
+            editable.add((o2, at.uri, b1))
+            editable.add((b1, at.uri, b2))
+            editable.add((b2, at.uri, b3))
+            editable.add((b3, at.uri, Literal(42)))
+
+        graph = oc.get_state({"minb": 2000, "maxe": 2000})
+        # outgoing and incoming arcs
+        assert (o2, KTBS.hasBegin, Literal(2000)) in graph
+        assert (o1, rt.uri, o2) in graph
+        assert (o2, rt.uri, o3) in graph
+        # hasTrace of neighbouring obsels, including from other traces
+        assert (o1, KTBS.hasTrace, t.uri) in graph
+        assert (o3, KTBS.hasTrace, t.uri) in graph
+        assert (x.uri, KTBS.hasTrace, t2.uri) in graph
+        assert (o3, KTBS.hasBegin, None) not in graph
+        # blank nodes, up to two levels deep
+        assert (b1, at.uri, b2) in graph
+        assert (b2, at.uri, b3) in graph
+        assert (b3, at.uri, None) not in graph
+
+    def test_last_obsel_incremental(self):
+        t = self.trace
+        oc = t.obsel_collection
+
+        def get_last():
+            return tuple(
+                oc.metadata.value(oc.uri, prop)
+                for prop in (METADATA.last_obsel, METADATA.last_begin,
+                             METADATA.last_end)
+            )
+
+        o1, o4 = self.obsels[1], self.obsels[4]
+        assert get_last() == (o4.uri, Literal(4000), Literal(4000))
+        index = oc.get_temporal_index()
+
+        # amend an obsel so that it becomes the last one
+        with oc.edit(_trust=True) as editable:
+            editable.set((o1.uri, KTBS.hasEnd, Literal(5000)))
+        assert get_last() == (o1.uri, Literal(1000), Literal(5000))
+        # the index has been patched rather than rebuilt
+        assert get_temporal_indexes(oc.service)[oc.uri] is index
+        assert oc.get_temporal_index() is index
+        assert index.last() == (5000, 1000, str(o1.uri))
+
+        # delete the last obsel
+        with oc.edit(_trust=True) as editable:
+            editable.remove((o1.uri, None, None))
+        assert get_last() == (o4.uri, Literal(4000), Literal(4000))
+        assert oc.get_temporal_index() is index
+        assert len(index) == 4
+
+        # empty the trace
+        oc.delete()
+        assert get_last() == (None, None, None)
+        assert len(oc.get_temporal_index()) == 0
+
+
+class TestIterObselsByChunks(KtbsTestCase):
+    """Test that iter_obsels gives the same results whatever the chunk size."""
+
+    def setup_method(self):
+        super(TestIterObselsByChunks, self).setup_method()
+        b = self.my_ktbs.create_base("b/")
+        m = b.create_model("m")
+        ot = m.create_obsel_type("#OT1")
+        t = b.create_stored_trace("t/", m, origin="1970-01-01T00:00:00Z")
+        for i in range(7):
+            t.create_obsel('o%s' % i, ot, 1000 * i, subject="s%s" % (i%2))
+        self.trace = self.my_ktbs.factory(t.uri)
+        self.uris = [ URIRef(t.uri + 'o%s' % i) for i in range(7) ]
+
+    def test_chunks(self):
+        t = self.trace
+        uris = self.uris
+        bgp = '?obs ktbs:hasSubject "s0".'
+        for chunk_size in (1, 2, 3, 1000):
+            t.OBSELS_CHUNK_SIZE = chunk_size
+            def get_uris(**kw):
+                return [ o.uri for o in t.iter_obsels(**kw) ]
+            assert get_uris() == uris
+            assert get_uris(reverse=True) == uris[::-1]
+            assert get_uris(limit=5, offset=1) == uris[1:6]
+            assert get_uris(reverse=True, limit=4) == uris[:2:-1]
+            assert get_uris(begin=1000, end=5000) == uris[1:6]
+            assert get_uris(after=uris[1], before=uris[6]) == uris[2:6]
+            assert get_uris(bgp=bgp) == uris[::2]
+            assert get_uris(bgp=bgp, reverse=True) == uris[::-2]
+
+
+class TestDirtyObselCollections(KtbsTestCase):
+    """Test the notification of computed traces requiring recomputation."""
+
+    def setup_method(self):
+        super(TestDirtyObselCollections, self).setup_method()
+        self.service.config.add_section('bgcompute')
+        self.service.config.set('bgcompute', 'notify', 'true')
+        get_dirty_semaphore(self.service.root_uri).unlink()
+        b = self.my_ktbs.create_base("b/")
+        m = b.create_model("m")
+        self.ot = m.create_obsel_type("#OT1")
+        self.trace = b.create_stored_trace("t/", m, origin="now")
+        self.ctr1 = b.create_computed_trace("c1/", KTBS.filter, {},
+                                            [self.trace])
+        self.ctr2 = b.create_computed_trace("c2/", KTBS.filter, {},
+                                            [self.ctr1])
+
+    def teardown_method(self):
+        get_dirty_semaphore(self.service.root_uri).unlink()
+        super(TestDirtyObselCollections, self).teardown_method()
+
+    def get_dirty(self):
+        return set( oc.uri for oc in iter_dirty_obsel_collections(self.service) )
+
+    def test_dirty(self):
+        assert self.get_dirty() == {
+            self.ctr1.obsel_collection.uri,
+            self.ctr2.obsel_collection.uri,
+        }
+        self.ctr2.obsel_collection.force_state_refresh()
+        assert self.get_dirty() == set()
+        wait_dirty(self.service.root_uri, 0) # consume pending notifications
+
+        self.trace.create_obsel("o1", self.ot, 1000)
+        assert self.get_dirty() == { self.ctr1.obsel_collection.uri }
+        assert wait_dirty(self.service.root_uri, 0)
+        assert not wait_dirty(self.service.root_uri, 0)
+
+        self.ctr1.obsel_collection.force_state_refresh()
+        assert self.get_dirty() == { self.ctr2.obsel_collection.uri }
+        assert wait_dirty(self.service.root_uri, 0)
+
+    def test_notify_after_commit(self):
+        self.ctr2.obsel_collection.force_state_refresh()
+        wait_dirty(self.service.root_uri, 0) # consume pending notifications
+        with self.service:
+            self.trace.create_obsel("o1", self.ot, 1000)
+            assert not wait_dirty(self.service.root_uri, 0)
+        assert wait_dirty(self.service.root_uri, 0)
+
+    def test_dirty_traces_ignored(self, monkeypatch):
+        self.ctr1._mark_dirty(obsels=False) # dirty bit on the trace itself
+        assert self.ctr1.metadata.value(self.ctr1.uri, METADATA.dirty)
+        service_get = self.service.get
+        got = []
+        def get(uri, *args, **kw):
+            got.append(uri)
+            return service_get(uri, *args, **kw)
+        monkeypatch.setattr(self.service, "get", get)
+        self.get_dirty()
+        assert set(got) == {
+            self.ctr1.obsel_collection.uri,
+            self.ctr2.obsel_collection.uri,
+        }
+
+    def test_no_notify(self):
+        self.service.config.set('bgcompute', 'notify', 'false')
+        self.ctr2.obsel_collection.force_state_refresh()
+        wait_dirty(self.service.root_uri, 0) # consume pending notifications
+        self.trace.create_obsel("o1", self.ot, 1000)
+        assert self.get_dirty() == { self.ctr1.obsel_collection.uri }
+        assert not wait_dirty(self.service.root_uri, 0)
+
+
+class TestHttpIterObselsByChunks(HttpKtbsTestCaseMixin,
+                                 TestIterObselsByChunks):
+
+    def setup_method(self):
+        super(TestHttpIterObselsByChunks, self).setup_method()
+        self.trace = HttpClientCore.factory(self.trace.uri,
+                                            [KTBS.StoredTrace])
+        assert isinstance(self.trace, HttpClientCore)
@@ -3,7 +3,10 @@ from unittest import skipUnless
 from pytest import raises as assert_raises
 
 from ktbs.namespace import KTBS
+from ktbs.engine import trace_stats
+from ktbs.engine.resource import METADATA
 from ktbs.engine.trace_stats import NS
+from ktbs.plugins import stats_per_type, stats_subjects
 
 
 class TestKtbsTraceObsels(KtbsTestCase):
@@ -43,6 +46,68 @@ class TestKtbsTraceObsels(KtbsTestCase):
         assert_stat(self.trace, NS.minTime, 0)
         assert_stat(self.trace, NS.maxTime, 4)
 
+    def test_stats_incremental_update_on_new_obsel(self):
+        stats = self.trace.trace_statistics
+        stats.get_state()
+
+        self.trace.create_obsel("o02", self.ot2, 4)
+
+        # statistics were updated in place, without waiting for a refresh
+        assert_stat(self.trace, NS.obselCount, 2, refresh="no")
+        assert_stat(self.trace, NS.maxTime, 4, refresh="no")
+        assert_stat(self.trace, NS.duration, 4, refresh="no")
+        assert (str(stats.metadata.value(stats.uri, METADATA.obselsEtag))
+                == self.trace.obsel_collection.get_etag())
+
+    def test_stats_incremental_update_with_plugins(self):
+        trace_stats.add_plugin(stats_per_type.populate_stats,
+                               stats_per_type.update_stats)
+        trace_stats.add_plugin(stats_subjects.populate_stats,
+                               stats_subjects.update_stats)
+        try:
+            stats = self.trace.trace_statistics
+            stats.get_state(parameters={"refresh": "force"})
+            self.trace.create_obsel("o02", self.ot2, 4, subject="alice")
+            self.trace.create_obsel("o03", self.ot1, 5, subject="bob")
+            self.trace.create_obsel("o04", self.ot1, 6, subject="alice")
+
+            incremental = stats.get_state(parameters={"refresh": "no"})
+            assert (str(stats.metadata.value(stats.uri, METADATA.obselsEtag))
+                    == self.trace.obsel_collection.get_etag())
+            full = stats.get_state(parameters={"refresh": "force"})
+            assert per_type(incremental, self.trace) \
+                == per_type(full, self.trace) \
+                == { self.ot1.uri: 3, self.ot2.uri: 1 }
+            assert incremental.value(self.trace.uri, NS.distinctSubjects) \
+                == full.value(self.trace.uri, NS.distinctSubjects)
+            assert full.value(self.trace.uri, NS.distinctSubjects).value == 2
+        finally:
+            trace_stats.remove_plugin(stats_subjects.populate_stats)
+            trace_stats.remove_plugin(stats_per_type.populate_stats)
+
+    def test_stats_recomputed_without_incremental_hook(self):
+        trace_stats.add_plugin(stats_per_type.populate_stats)
+        try:
+            stats = self.trace.trace_statistics
+            stats.get_state(parameters={"refresh": "force"})
+            self.trace.create_obsel("o02", self.ot2, 4)
+
+            assert (str(stats.metadata.value(stats.uri, METADATA.obselsEtag))
+                    != self.trace.obsel_collection.get_etag())
+            assert per_type(stats.get_state(), self.trace) \
+                == { self.ot1.uri: 1, self.ot2.uri: 1 }
+        finally:
+            trace_stats.remove_plugin(stats_per_type.populate_stats)
+
+    def test_stats_update_on_obsel_deletion(self):
+        o02 = self.trace.create_obsel("o02", self.ot2, 4)
+        assert_stat(self.trace, NS.obselCount, 2)
+
+        o02.delete()
+
+        assert_stat(self.trace, NS.obselCount, 1)
+        assert_stat(self.trace, NS.maxTime, 0)
+
     def test_stats_update_when_parameters_change(self):
 
         assert_stat(self.filtered, NS.obselCount, 1)
@@ -121,7 +186,15 @@ class TestKtbsTraceObsels(KtbsTestCase):
         self.filtered2.force_state_refresh()
         assert str(self.filtered2.origin) == "2000-01-01T00:00:00Z"
 
-def assert_stat(trace, prop, nbobs):
-    g = trace.trace_statistics.get_state()
+def assert_stat(trace, prop, nbobs, refresh=None):
+    parameters = None if refresh is None else {"refresh": refresh}
+    g = trace.trace_statistics.get_state(parameters)
     got = g.value(trace.uri, prop).value
     assert got == nbobs
+
+def per_type(graph, trace):
+    return {
+        graph.value(ot_infos, NS.hasObselType):
+            graph.value(ot_infos, NS.nb).value
+        for ot_infos in graph.objects(trace.uri, NS.obselCountPerType)
+    }
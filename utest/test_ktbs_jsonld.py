@@ -1271,6 +1271,49 @@ class TestJsonObsels(KtbsTestCase):
         })
         assert_roundtrip(json_content, self.t1.obsel_collection)
 
+    def test_streamed_obsels_equivalent(self):
+        self.populate()
+        bnode = BNode()
+        self.t1.create_obsel("o4", self.ot1, 5000, 6000, "foo",
+                             {self.at2: bnode, self.at1: 1},
+                             [(self.rt1, self.o1)])
+        for graph in [ self.t1.obsel_collection.state,
+                       self.t1.obsel_collection.get_state({"minb": "2000"}),
+                     ]:
+            expected = trace_obsels_to_json(graph, self.t1.obsel_collection)
+            chunks = list(iter_trace_obsels_json(
+                graph, self.t1.obsel_collection, chunk_size=1))
+            assert len(chunks) > 2
+            streamed = "".join(chunks)
+            # the order of multiple values depends on the store in both cases
+            assert_jsonld_equiv(loads(streamed), loads(dumps(expected)))
+            # but the layout is the same
+            streamed_dict = loads(streamed, object_pairs_hook=OrderedDict)
+            assert streamed == dumps(streamed_dict, ensure_ascii=False,
+                                     indent=4)
+            # except that @reverse always comes last
+            for obs in streamed_dict['obsels']:
+                if '@reverse' in obs:
+                    assert list(obs)[-1] == '@reverse'
+
+    def test_streamed_obsels_from_index(self, monkeypatch):
+        self.populate()
+        tobsels = self.t1.obsel_collection
+        index = tobsels.get_temporal_index()
+        slices = []
+        index_slice = index.slice
+        def slice(*args, **kw):
+            slices.append(kw)
+            return index_slice(*args, **kw)
+        monkeypatch.setattr(index, "slice", slice)
+        chunks = iter_trace_obsels_json(tobsels.state, tobsels, chunk_size=1)
+        next(chunks) # header
+        assert '"@id": "o1"' in next(chunks)
+        # only the first obsel has been read from the index
+        assert slices == [{'after': None, 'limit': 1}]
+        assert '"@id": "o2"' in next(chunks)
+        assert '"@id": "o3"' in next(chunks)
+
     def test_o1(self):
         self.populate()
         json_content = b"".join(serialize_json_obsel(self.o1.state, self.o1))
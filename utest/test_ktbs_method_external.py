@@ -18,13 +18,24 @@
 #    You should have received a copy of the GNU Lesser General Public License
 #    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
 
+from json import loads as json_loads
+from pytest import raises as assert_raises
+from rdflib import URIRef
+
+from ktbs.engine.resource import METADATA
 from ktbs.namespace import KTBS
+from ktbs.plugins import meth_external
+from rdfrest.exceptions import CanNotProceedError
 
 from .test_ktbs_engine import KtbsTestCase
 
 
 class TestExternal(KtbsTestCase):
 
+    def teardown_method(self):
+        meth_external.WORKERS.close()
+        super(TestExternal, self).teardown_method()
+
     def test_external_no_source(self):
         base = self.my_ktbs.create_base("b/")
         model = base.create_model("m")
@@ -87,3 +98,114 @@ class TestExternal(KtbsTestCase):
         with src1.obsel_collection.edit() as editable:
             editable.remove((o21.uri, None, None))
         assert len(ctr.obsels) == 4
+
+    def test_external_persistent(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        otype = model.create_obsel_type("#ot")
+        origin = "orig-abc"
+        src1 = base.create_stored_trace("s1/", model, origin=origin,
+                                        default_subject="alice")
+        cmdline = """sed -u 's|%(__sources__)s|%(__destination__)s|g'"""
+        ctr = base.create_computed_trace("ctr/", KTBS.external, {
+                                             "command-line": cmdline,
+                                             "persistent": "true",
+                                         }, [src1],)
+        assert ctr.diagnosis is None
+        assert len(ctr.obsels) == 0
+        worker = meth_external.WORKERS._workers[ctr.uri]
+        pid = worker.process.pid
+
+        o10 = src1.create_obsel("o10", otype, 0)
+        assert len(ctr.obsels) == 1
+        tag = ctr.obsel_collection.str_mon_tag
+        o21 = src1.create_obsel("o21", otype, 10)
+        assert len(ctr.obsels) == 2
+        o12 = src1.create_obsel("o12", otype, 20)
+        assert len(ctr.obsels) == 3
+        # only new obsels were sent to the same worker, and added
+        assert worker.process.pid == pid
+        assert worker.last_seen_u == str(o12.uri)
+        assert ctr.obsel_collection.str_mon_tag == tag
+        assert [ obs.uri for obs in ctr.obsels ] == [
+            URIRef(ctr.uri + "o10"),
+            URIRef(ctr.uri + "o21"),
+            URIRef(ctr.uri + "o12"),
+        ]
+
+        # the computation state is stored with the computed trace
+        cstate = json_loads(ctr.metadata.value(ctr.uri,
+                                               METADATA.computation_state))
+        assert cstate["last_seen_u"] == str(o12.uri)
+        assert cstate["str_mon_tag"] == src1.obsel_collection.str_mon_tag
+
+        # non-monotonic changes restart the worker
+        with src1.obsel_collection.edit() as editable:
+            editable.remove((o10.uri, None, None))
+        assert len(ctr.obsels) == 2
+        assert worker.process.pid != pid
+
+    def test_external_persistent_disagreement(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        otype = model.create_obsel_type("#ot")
+        src1 = base.create_stored_trace("s1/", model, origin="orig-abc",
+                                        default_subject="alice")
+        cmdline = """sed -u 's|%(__sources__)s|%(__destination__)s|g'"""
+        ctr = base.create_computed_trace("ctr/", KTBS.external, {
+                                             "command-line": cmdline,
+                                             "persistent": "true",
+                                         }, [src1],)
+        src1.create_obsel("o10", otype, 0)
+        assert len(ctr.obsels) == 1
+
+        # a worker that has not seen the source (e.g. after a restart of
+        # the kTBS) is sent all the obsels
+        meth_external.WORKERS.close()
+        src1.create_obsel("o21", otype, 10)
+        assert len(ctr.obsels) == 2
+        worker = meth_external.WORKERS._workers[ctr.uri]
+        pid = worker.process.pid
+
+        # a worker disagreeing with the computation state is restarted
+        worker.last_seen_u = str(src1.uri + "o10")
+        src1.create_obsel("o12", otype, 20)
+        assert len(ctr.obsels) == 3
+        assert worker.process.pid != pid
+
+    def test_external_persistent_timeout(self, monkeypatch):
+        monkeypatch.setattr(meth_external, "TIMEOUT", 0.2)
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        src1 = base.create_stored_trace("s1/", model, origin="orig-abc")
+        ctr = base.create_computed_trace("ctr/", KTBS.external, {
+                                             "command-line": "cat >/dev/null",
+                                             "persistent": "true",
+                                         }, [src1],)
+        assert ctr.diagnosis is None
+        with assert_raises(CanNotProceedError):
+            ctr.obsel_collection.get_state()
+        assert meth_external.WORKERS._workers[ctr.uri].process is None
+
+    def test_worker_evicted_before_locked(self):
+        pool = meth_external._WorkerPool(1)
+        get_worker = pool._get_worker
+        evicted = []
+        def racing_get_worker(key, command_line, env):
+            worker = get_worker(key, command_line, env)
+            if not evicted:
+                # another thread evicts the worker before it is locked
+                evicted.append(worker)
+                get_worker("other", command_line, env)
+            return worker
+        pool._get_worker = racing_get_worker
+        try:
+            with pool.locked_worker("key", "cat", None) as worker:
+                assert worker is not evicted[0]
+                assert pool._workers["key"] is worker
+                worker.restart()
+            assert evicted[0].process is None
+            assert list(pool._workers.values()) == [worker]
+        finally:
+            pool.close()
+        assert worker.process is None
@@ -20,7 +20,10 @@
 
 from json import loads
 
+from rdflib import URIRef
+
 from ktbs.engine.resource import METADATA
+from ktbs.methods import utils
 from ktbs.methods.filter import LOG as FILTER_LOG
 from ktbs.namespace import KTBS
 
@@ -299,6 +302,35 @@ class TestFilter(KtbsTestCase):
         assert len(ctr.obsels) == 6
         assert count_relations() == 2
 
+    def test_filter_relations_by_chunks(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        otype = model.create_obsel_type("#ot")
+        rtype = model.create_relation_type("#rt")
+        src = base.create_stored_trace("s/", model, default_subject="alice")
+        prev = None
+        for i in range(7):
+            relations = [(rtype, prev)] if prev is not None else None
+            prev = src.create_obsel("o%s" % i, otype, i, relations=relations)
+        old_chunk_size = utils.COPY_CHUNK_SIZE
+        try:
+            for chunk_size in (1, 2, 3, 1000):
+                utils.COPY_CHUNK_SIZE = chunk_size
+                ctr = base.create_computed_trace("ctr%s/" % chunk_size,
+                                                 KTBS.filter, {"after": "1"},
+                                                 [src],)
+                state = ctr.obsel_collection.state
+                assert len(ctr.obsels) == 6
+                assert set(state.subject_objects(rtype.uri)) == {
+                    (URIRef(ctr.uri + "o%s" % (i+1)),
+                     URIRef(ctr.uri + "o%s" % i))
+                    for i in range(1, 6)
+                }
+                assert len(list(
+                    state.subject_objects(KTBS.hasSourceObsel))) == 6
+        finally:
+            utils.COPY_CHUNK_SIZE = old_chunk_size
+
 
     def test_filter_otypes_inheritance(self):
         base = self.my_ktbs.create_base("b/")
@@ -22,10 +22,10 @@ from unittest import skip
 import pytest
 from fsa4streams.fsa import FSA
 from json import dumps, loads
-from rdflib import Literal, XSD
+from rdflib import Literal, URIRef, XSD
 
 from ktbs.engine.resource import METADATA
-from ktbs.methods.fsa import LOG as FSA_LOG
+from ktbs.methods.fsa import KtbsFSA, LOG as FSA_LOG
 from ktbs.namespace import KTBS, KTBS_NS_URI
 from rdfrest.exceptions import CanNotProceedError
 
@@ -366,6 +366,28 @@ class TestFSAAsk(KtbsTestCase):
         assert_obsel_type(ctr.obsels[0], self.otypeX)
         assert_source_obsels(ctr.obsels[0], [oD2, oD3, oD4, oA1])
 
+    def test_compiled_conditions(self):
+        self.src.create_obsel("oC1", self.otypeC, 0,
+                              attributes={self.atypeV: Literal(42)})
+        oC2 = self.src.create_obsel("oC2", self.otypeC, 1,
+                                    attributes={self.atypeV: Literal(42)})
+        fsa = KtbsFSA(self.base_structure, self.src, None)
+        for condition, pred, expected in [
+            ('?obs m:atV 42', None, True),
+            ('?obs m:atW ?any', None, False),
+            ('?obs m:atV ?val. ?pred m:atV ?val', None, False),
+            ('?obs m:atV ?val. ?pred m:atV ?val', "oC1", True),
+            ('?obs m:atV ?v . FILTER(?v > 42)', None, False),
+            ('?obs m:atV []', None, True),
+            ('?obs m:atV _:v. ?pred m:atV _:v', "oC1", True),
+            ('?obs m:atW []', None, False),
+        ]:
+            ask = fsa.get_ask_function(condition)
+            assert fsa.get_ask_function(condition) is ask # compiled once
+            if pred is not None:
+                pred = URIRef(self.src.uri + pred)
+            assert ask(oC2.uri, pred, pred) == expected, condition
+
 class TestFSAMaxDuration(KtbsTestCase):
 
     def setup_method(self):
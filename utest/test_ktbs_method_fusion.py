@@ -61,3 +61,35 @@ class TestFusion(KtbsTestCase):
         with src2.obsel_collection.edit() as editable:
             editable.remove((o21.uri, None, None))
         assert len(ctr.obsels) == 4
+
+    def test_fusion_monotonic(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        otype = model.create_obsel_type("#ot")
+        origin = "orig-abc"
+        src1 = base.create_stored_trace("s1/", model, origin=origin,
+                                        default_subject="alice")
+        src2 = base.create_stored_trace("s2/", model, origin=origin,
+                                        default_subject="bob")
+        ctr = base.create_computed_trace("ctr/", KTBS.fusion, {},
+                                         [src1, src2],)
+        src1.create_obsel("o10", otype, 0)
+        src2.create_obsel("o21", otype, 10)
+        src1.create_obsel("o12", otype, 10)
+        assert len(ctr.obsels) == 3
+        str_mon_tag = ctr.obsel_collection.str_mon_tag
+
+        # obsels with the same timestamps as already fused ones
+        src2.create_obsel("o22", otype, 10)
+        src1.create_obsel("o13", otype, 20)
+        assert [ obs.begin for obs in ctr.obsels ] == [0, 10, 10, 10, 20]
+        assert ctr.obsel_collection.str_mon_tag == str_mon_tag
+
+        # an obsel inserted in the past of its source
+        src2.create_obsel("o20", otype, 5)
+        assert [ obs.begin for obs in ctr.obsels ] == [0, 5, 10, 10, 10, 20]
+        assert ctr.obsel_collection.str_mon_tag != str_mon_tag
+        str_mon_tag = ctr.obsel_collection.str_mon_tag
+        src2.create_obsel("o24", otype, 30)
+        assert len(ctr.obsels) == 7
+        assert ctr.obsel_collection.str_mon_tag == str_mon_tag
@@ -547,3 +547,63 @@ class TestHRules(KtbsTestCase):
         assert len(ctr.obsels) == 3 # new obsel
         assert_obsel_type(ctr.obsels[-1], self.otypeZ)
         assert_source_obsels(ctr.obsels[-1], [oD,])
+
+    def test_multiple_values(self):
+        base_rules = [
+            {
+                'id': self.otypeX.uri,
+                'rules': [
+                    {
+                        'attributes': [
+                            {
+                                'uri': self.atypeV.uri,
+                                'operator': '>',
+                                'value': '10',
+                            },
+                        ],
+                    },
+                ]
+            },
+        ]
+        ctr = self.base.create_computed_trace("ctr/", KTBS.hrules,
+                                         {"rules": dumps(base_rules),
+                                          "model": self.model_dst.uri,},
+                                         [self.src],)
+        o1 = self.src.create_obsel("o1", self.otypeA, 1,
+                                   attributes={self.atypeV: Literal(5)})
+        with self.src.obsel_collection.edit(_trust=True) as editable:
+            editable.add((o1.uri, self.atypeV.uri, Literal(15)))
+        assert len(ctr.obsels) == 1 # one of the values matches
+        assert_source_obsels(ctr.obsels[-1], [o1,])
+
+    def test_legacy_state(self):
+        base_rules = [
+            {
+                'id': self.otypeX.uri,
+                'rules': [
+                    {
+                        'type': self.otypeA.uri,
+                    },
+                ]
+            },
+        ]
+        ctr = self.base.create_computed_trace("ctr/", KTBS.hrules,
+                                         {"rules": dumps(base_rules),
+                                          "model": self.model_dst.uri,},
+                                         [self.src],)
+        oA1 = self.src.create_obsel("oA1", self.otypeA, 1)
+        assert len(ctr.obsels) == 1
+
+        # simulate a state computed by a previous version of the method
+        cstate = loads(ctr.metadata.value(ctr.uri, METADATA.computation_state))
+        cstate["custom"] = {"bgps": [], "last_seen_u": None,
+                            "last_seen_b": None}
+        ctr.metadata.set((ctr.uri, METADATA.computation_state,
+                          Literal(dumps(cstate))))
+
+        oA2 = self.src.create_obsel("oA2", self.otypeA, 2)
+        assert len(ctr.obsels) == 2
+        assert_source_obsels(ctr.obsels[-1], [oA2,])
+        cstate = loads(ctr.metadata.value(ctr.uri, METADATA.computation_state))
+        assert "bgps" not in cstate["custom"]
+        assert len(cstate["custom"]["rules"]) == 1
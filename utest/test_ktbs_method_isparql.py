@@ -193,3 +193,28 @@ class TestISparql(KtbsTestCase):
         assert_source_obsels(new_obs, [orig_obs])
         assert new_obs.begin == orig_obs.begin
         assert new_obs.end == orig_obs.begin
+
+    def test_duplicate_rows(self):
+        sparql = """
+        PREFIX ms: <%(base)s/ms#>
+        PREFIX md: <%(base)s/md#>
+
+        SELECT ?sourceObsel ?type (?sourceBegin as ?begin) ?fubar
+        {
+            %%(__subselect__)s
+            ?sourceObsel ms:foo ?fubar.
+            BIND(md:X as ?type)
+        }
+        """ % { 'base': self.base.uri[:-1], }
+        ctr = self.base.create_computed_trace("ctr/", KTBS.isparql,
+                                         {"sparql": sparql,
+                                          "model": self.model_dst.uri,},
+                                         [self.src],)
+        oA0 = self.src.create_obsel("oA0", self.A, 0, attributes={self.foo: 42})
+        with self.src.obsel_collection.edit() as editable:
+            editable.add((oA0.uri, self.foo.uri, Literal(43)))
+        # the query yields two rows for oA0, only the first one is kept
+        assert len(ctr.obsels) == 1
+        values = list(ctr.obsels[0].state.objects(ctr.obsels[0].uri,
+                                                  self.fubar.uri))
+        assert len(values) == 1
@@ -17,9 +17,12 @@
 #
 #    You should have received a copy of the GNU Lesser General Public License
 #    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+from concurrent.futures import Future
+
 import pytest
 from rdflib import RDF, XSD
 
+from ktbs.methods import parallel
 from ktbs.methods.parallel import LOG as PARALLEL_LOG
 from ktbs.namespace import KTBS, KTBS_NS_URI
 from rdfrest.exceptions import CanNotProceedError
@@ -214,3 +217,67 @@ class TestParallel(KtbsTestCase):
         assert self.base.get('_0_ctr/') is not None
         assert self.base.get('_1_ctr/') is None
         assert self.base.get('_2_ctr/') is None
+
+    def make_concurrent_parallel(self):
+        self.service.config.add_section('parallel')
+        self.service.config.set('parallel', 'workers', '2')
+        return self.base.create_computed_trace("ctr/", KTBS.parallel,
+                                         {
+                                             "methods": ' '.join(
+                                                [self.m1.uri, self.m2.uri]),
+                                             "model": self.model_dst3.uri,
+                                         },
+                                         [self.src],)
+
+    def test_concurrent_parallel_in_memory(self):
+        ctr = self.make_concurrent_parallel()
+        self.src.create_obsel(None, self.otypeA, 10)
+        self.src.create_obsel(None, self.otypeB, 11)
+        assert len(ctr.obsels) == 4
+        # a volatile repository can not be shared with worker processes
+        assert self.service not in parallel._POOLS
+
+    def test_concurrent_parallel(self, monkeypatch):
+        ctr = self.make_concurrent_parallel()
+        # worker processes would share the repository with this service;
+        # here, they are emulated by running them in this process
+        class InlinePool(object):
+            def submit(self, func, *args):
+                future = Future()
+                future.set_result(func(*args))
+                return future
+        monkeypatch.setattr(parallel, "get_workers", lambda config: 2)
+        monkeypatch.setattr(parallel, "_get_pool",
+                            lambda service, workers: InlinePool())
+        monkeypatch.setattr(parallel, "_WORKER_SERVICE", self.service)
+        refreshed = []
+        refresh_in_worker = parallel._refresh_in_worker
+        def spy_refresh_in_worker(int_trace_uri, refresh):
+            # the shared source is refreshed before the workers are started
+            assert self.src.obsel_collection.etag == source_etag
+            refreshed.append(int_trace_uri)
+            return refresh_in_worker(int_trace_uri, refresh)
+        monkeypatch.setattr(parallel, "_refresh_in_worker",
+                            spy_refresh_in_worker)
+
+        self.src.create_obsel(None, self.otypeA, 10)
+        self.src.create_obsel(None, self.otypeB, 11)
+        source_etag = self.src.obsel_collection.etag
+        assert len(ctr.obsels) == 4
+        assert_obsel_types(ctr.obsels,
+                           [self.otypeU, self.otypeX, self.otypeV, self.otypeY])
+        assert refreshed == [ str(self.base.uri + "_0_ctr/"),
+                              str(self.base.uri + "_1_ctr/") ]
+        # up-to-date intermediate traces are not sent to the workers
+        del refreshed[:]
+        assert len(ctr.obsels) == 4
+        assert refreshed == []
+
+        # errors in workers are reported
+        def failing_refresh_in_worker(int_trace_uri, refresh):
+            raise CanNotProceedError("worker failed")
+        monkeypatch.setattr(parallel, "_refresh_in_worker",
+                            failing_refresh_in_worker)
+        self.src.create_obsel(None, self.otypeA, 12)
+        with pytest.raises(CanNotProceedError):
+            ctr.obsel_collection.force_state_refresh()
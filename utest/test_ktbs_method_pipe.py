@@ -20,7 +20,8 @@
 from unittest import skip
 
 import pytest
-from rdflib import XSD
+from json import dumps
+from rdflib import Literal, XSD
 
 from ktbs.methods.pipe import LOG as PIPE_LOG
 from ktbs.namespace import KTBS, KTBS_NS_URI
@@ -189,3 +190,64 @@ class TestPipe(KtbsTestCase):
         assert self.base.get('_0_ctr/') is not None
         assert self.base.get('_1_ctr/') is None
         assert self.base.get('_2_ctr/') is None
+
+    def test_streaming_pipe(self):
+        mf = self.base.create_method("mf", KTBS.filter, {"after": "1"})
+        mh = self.base.create_method("mh", KTBS.hrules, {
+            "model": str(self.model_dst.uri),
+            "rules": dumps([
+                {"id": self.otypeX.uri,
+                 "rules": [{"type": self.otypeA.uri}]},
+                {"id": self.otypeY.uri,
+                 "rules": [{"type": self.otypeB.uri}]},
+            ]),
+        })
+        methods = ' '.join([mf.uri, mh.uri])
+        ctr = self.base.create_computed_trace("ctr/", KTBS.pipe,
+                                              {"methods": methods,
+                                               "streaming": "true"},
+                                              [self.src],)
+        ref = self.base.create_computed_trace("ref/", KTBS.pipe,
+                                              {"methods": methods},
+                                              [self.src],)
+        assert ctr.model == self.model_dst
+
+        o0 = self.src.create_obsel(None, self.otypeA, 0)
+        o1 = self.src.create_obsel(None, self.otypeA, 1)
+        o2 = self.src.create_obsel(None, self.otypeB, 2,
+                                   attributes={self.atypeU: Literal(42)})
+        def describe(trace):
+            return [ (o.begin, o.obsel_type.uri, o.get_attribute_value(
+                          self.atypeU)) for o in trace.obsels ]
+        assert describe(ctr) == [(1, self.otypeX.uri, None),
+                                 (2, self.otypeY.uri, 42)]
+        assert describe(ctr) == describe(ref)
+        assert_rec_source_obsels(ctr.obsels[-1], [o2])
+
+        # incremental update
+        str_mon_tag = ctr.obsel_collection.str_mon_tag
+        self.src.create_obsel(None, self.otypeA, 3)
+        assert describe(ctr)[-1] == (3, self.otypeX.uri, None)
+        assert ctr.obsel_collection.str_mon_tag == str_mon_tag
+        # non-monotonic update
+        self.src.create_obsel(None, self.otypeB, 1)
+        assert describe(ctr) == describe(ref)
+
+        # intermediate traces are not computed unless required
+        int_trace = self.base.get('_0_ctr/')
+        raw = int_trace.obsel_collection.get_state({"refresh": "no"})
+        assert (None, KTBS.hasTrace, int_trace.uri) not in raw
+        assert len(int_trace.obsels) == 4
+
+    def test_streaming_unsupported(self):
+        ctr = self.base.create_computed_trace("ctr/", KTBS.pipe,
+                                         {"methods": ' '.join(
+                                             [self.m1.uri, self.m2.uri]),
+                                          "streaming": "true",
+                                         },
+                                         [self.src],)
+        # falls back to intermediate traces
+        obs = self.src.create_obsel(None, self.otypeA, 0)
+        assert len(ctr.obsels) == 1
+        assert_obsel_type(ctr.obsels[-1], self.otypeX)
+        assert len(self.base.get('_0_ctr/').obsels) == 1
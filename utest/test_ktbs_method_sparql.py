@@ -171,6 +171,84 @@ class TestSparql(KtbsTestCase):
         assert ctr.obsels[0].subject == o1.subject
         assert ctr.obsels[0].get_attribute_value(self.atype) == "overridden"
 
+    def test_sparql_incremental(self):
+        sparql = """
+          PREFIX : <%s#>
+          PREFIX k: <http://liris.cnrs.fr/silex/2009/ktbs#>
+
+          CONSTRUCT {
+              [ k:hasTrace <%%(__destination__)s> ;
+                a :ot2 ;
+                k:hasBegin ?sourceBegin ;
+                k:hasEnd ?sourceEnd ;
+                k:hasSubject "alice" ;
+                k:hasSourceObsel ?sourceObsel, ?prev ;
+              ] .
+          }
+          WHERE {
+              %%(__subselect__)s
+              ?sourceObsel a :ot1 .
+              ?prev a :ot1 ; k:hasEnd ?pe .
+              FILTER(?pe < ?sourceBegin && ?pe >= ?sourceBegin - 10)
+          }
+        """ % self.model.uri
+        ctr = self.base.create_computed_trace("ctr/", KTBS.sparql, {
+                                                  "sparql": sparql,
+                                                  "incremental": "true",
+                                              }, [self.src1],)
+        assert not ctr.diagnosis
+        assert len(ctr.obsels) == 0
+
+        o1 = self.src1.create_obsel("o1", self.otype1, 0)
+        o2 = self.src1.create_obsel("o2", self.otype1, 5)
+        assert len(ctr.obsels) == 1
+        tag = ctr.obsel_collection.str_mon_tag
+        first = ctr.obsels[0].uri
+
+        o3 = self.src1.create_obsel("o3", self.otype2, 8)
+        o4 = self.src1.create_obsel("o4", self.otype1, 12)
+        o5 = self.src1.create_obsel("o5", self.otype1, 30)
+        assert len(ctr.obsels) == 2
+        # obsels were only added, so strict monotonicity is preserved
+        assert ctr.obsel_collection.str_mon_tag == tag
+        assert ctr.obsels[0].uri == first
+        assert set(ctr.obsels[1].iter_source_obsels()) == { o2, o4 }
+
+        # non-monotonic changes in the source fall back to full recomputation
+        with self.src1.obsel_collection.edit() as editable:
+            editable.remove((o2.uri, None, None))
+        assert len(ctr.obsels) == 0
+        assert ctr.obsel_collection.str_mon_tag != tag
+        o6 = self.src1.create_obsel("o6", self.otype1, 35)
+        assert len(ctr.obsels) == 1
+        assert set(ctr.obsels[0].iter_source_obsels()) == { o5, o6 }
+
+    def test_sparql_incremental_not_eligible(self):
+        sparql = """
+          PREFIX : <%s#>
+          PREFIX k: <http://liris.cnrs.fr/silex/2009/ktbs#>
+
+          CONSTRUCT {
+              [ k:hasSourceObsel ?sobs ] .
+          }
+          WHERE {
+              ?sobs a :ot1 .
+          }
+        """ % self.model.uri
+        ctr = self.base.create_computed_trace("ctr/", KTBS.sparql, {
+                                                  "sparql": sparql,
+                                                  "inherit": "yes",
+                                                  "incremental": "true",
+                                              }, [self.src1],)
+        assert not ctr.diagnosis
+        self.src1.create_obsel("o1", self.otype1, 0)
+        assert len(ctr.obsels) == 1
+        tag = ctr.obsel_collection.str_mon_tag
+        self.src1.create_obsel("o2", self.otype1, 5)
+        assert len(ctr.obsels) == 2
+        # obsels were recomputed from scratch
+        assert ctr.obsel_collection.str_mon_tag != tag
+
     def test_sparql_bad_scope(self):
         sparql = """
         PREFIX : <http://example.org/model#>
@@ -0,0 +1,119 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+from time import sleep
+
+from pytest import raises as assert_raises
+
+from ktbs.engine.resource import METADATA
+from ktbs.engine.trace import add_post_hook, remove_post_hook
+from ktbs.namespace import KTBS
+from ktbs.plugins.eager import EagerScheduler
+
+from .test_ktbs_engine import KtbsTestCase
+
+
+def is_dirty(ctr):
+    obsels = ctr.obsel_collection
+    return obsels.metadata.value(obsels.uri, METADATA.dirty) is not None
+
+def has_obsels(ctr):
+    raw = ctr.obsel_collection.get_state({"refresh": "no"})
+    return (None, KTBS.hasTrace, ctr.uri) in raw
+
+def wait_for(condition, timeout=5):
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return True
+        sleep(0.05)
+    return False
+
+
+class TestEager(KtbsTestCase):
+
+    def setup_method(self):
+        super(TestEager, self).setup_method()
+        self.base = self.my_ktbs.create_base("b/")
+        self.model = self.base.create_model("m")
+        self.otype = self.model.create_obsel_type("#ot")
+        self.src = self.base.create_stored_trace("s/", self.model, "now")
+        self.scheduler = None
+
+    def teardown_method(self):
+        if self.scheduler is not None:
+            remove_post_hook(self.scheduler.enqueue)
+            self.scheduler.stop()
+        super(TestEager, self).teardown_method()
+
+    def start(self, **kw):
+        self.scheduler = EagerScheduler(**kw)
+        add_post_hook(self.scheduler.enqueue)
+
+    def test_eager_traces(self):
+        ctr1 = self.base.create_computed_trace("c1/", KTBS.filter, {},
+                                               [self.src])
+        ctr2 = self.base.create_computed_trace("c2/", KTBS.filter, {},
+                                               [ctr1])
+        lazy = self.base.create_computed_trace("lazy/", KTBS.filter, {},
+                                               [self.src])
+        self.start(traces=[ctr2.uri], delay=0.05)
+        ctr2.obsel_collection.force_state_refresh()
+        lazy.obsel_collection.force_state_refresh()
+
+        self.src.create_obsel("o1", self.otype, 0)
+        assert is_dirty(ctr1)
+        assert not has_obsels(ctr2)
+        assert wait_for(lambda: has_obsels(ctr2))
+        # ctr1 is recomputed as the source of ctr2
+        assert has_obsels(ctr1)
+        assert is_dirty(lazy)
+        assert not has_obsels(lazy)
+
+    def test_eager_base_and_streaming_pipe(self):
+        mf = self.base.create_method("mf", KTBS.filter, {"after": "1"})
+        pipe = self.base.create_computed_trace("p/", KTBS.pipe, {
+                                                   "methods": mf.uri,
+                                                   "streaming": "true",
+                                               }, [self.src])
+        self.start(bases=[self.base.uri], delay=0.05)
+        pipe.obsel_collection.force_state_refresh()
+        int_trace = self.base.get("_0_p/")
+        assert is_dirty(int_trace)
+
+        self.src.create_obsel("o1", self.otype, 0)
+        self.src.create_obsel("o2", self.otype, 2)
+        assert wait_for(lambda: has_obsels(pipe))
+        # intermediate traces of streaming pipes stay lazy
+        assert is_dirty(int_trace)
+        assert len(pipe.obsels) == 1
+
+    def test_enqueue_after_commit(self):
+        self.start(delay=10)
+        pending = self.scheduler._pending
+        with self.service:
+            self.src.create_obsel("o1", self.otype, 0)
+            assert not pending
+        assert self.src.uri in pending
+
+    def test_no_enqueue_after_rollback(self):
+        self.start(delay=10)
+        pending = self.scheduler._pending
+        with assert_raises(ValueError):
+            with self.service:
+                self.src.create_obsel("o1", self.otype, 0)
+                raise ValueError()
+        assert not pending
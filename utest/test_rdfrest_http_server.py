@@ -31,7 +31,7 @@ from .example2 import Group2Implementation, Item2Implementation, \
     make_example2_service
 from rdfrest.exceptions import SerializeError
 from rdfrest.cores.factory import unregister_service
-from rdfrest.http_server import HttpFrontend
+from rdfrest.http_server import HttpFrontend, RepresentationCache
 from rdfrest.serializers import register_serializer
 from rdfrest.util import urisplit
 from rdfrest.util.config import get_service_configuration
@@ -149,6 +149,54 @@ class TestHttpFront(object):
         assert resp.status_int == 303
         assert resp.location == URL+"foo"
 
+    def test_get_not_modified(self, app, monkeypatch):
+        resp_get, _ = request(app, URL)
+        assert resp_get.etag is not None
+        def get_state(*args):
+            raise AssertionError("get_state should not be called")
+        monkeypatch.setattr(Group2Implementation, "get_state", get_state)
+        reqhead = { "if-none-match": resp_get.headers["etag"] }
+        resp, content = request(app, URL, headers=reqhead)
+        assert resp.status_int == 304
+        assert resp.headers["etag"] == resp_get.headers["etag"]
+        assert content == b""
+
+    def test_get_modified(self, app):
+        resp_get, _ = request(app, URL)
+        root = app._service.get(URIRef(URL), [EXAMPLE.Group2])
+        with root.edit(_trust=True) as editable:
+            editable.add((root.uri, RDFS.label, Literal("modified")))
+        reqhead = { "if-none-match": resp_get.headers["etag"] }
+        resp, content = request(app, URL, headers=reqhead)
+        assert resp.status_int == 200
+        assert resp.headers["etag"] != resp_get.headers["etag"]
+
+    def test_head(self, app, monkeypatch):
+        resp_get, _ = request(app, URL)
+        def get_state(*args):
+            raise AssertionError("get_state should not be called")
+        monkeypatch.setattr(Group2Implementation, "get_state", get_state)
+        resp, content = request(app, URL, "HEAD")
+        assert resp.status_int == 200
+        assert content == b""
+        for header in ["content-type", "etag", "x-etags", "last-modified"]:
+            assert resp.headers[header] == resp_get.headers[header]
+
+    def test_head_params(self, app):
+        resp_get, _ = request(app, URL+"?valid=a")
+        # the text/errer serializer would fail if it was called
+        reqhead = {"accept": "text/errer"}
+        resp, content = request(app, URL+"?valid=a", "HEAD", headers=reqhead)
+        assert resp.status_int == 200
+        assert content == b""
+        assert resp.headers["x-etags"].split("/")[-1] \
+            == resp_get.headers["x-etags"].split("/")[-1]
+
+    def test_head_redirect(self, app):
+        resp, content = request(app, URL+"?redirect=foo", "HEAD")
+        assert resp.status_int == 303
+        assert resp.location == URL+"foo"
+
 
 
     def test_put_not_found(self, app):
@@ -363,6 +411,25 @@ class TestHttpFront(object):
         resp, content = request(app, URL + "foo")
         assert resp.status_int == 403
 
+    def test_max_bytes_get_stops_serializer(self, app):
+        app.max_bytes = 1000
+        CHUNKS_SERIALIZED[:] = []
+        resp, content = request(app, URL, headers={"accept": "text/chunks"})
+        assert resp.status_int == 403
+        assert len(CHUNKS_SERIALIZED) == 11 # not the whole 100 chunks
+
+    def test_max_bytes_get_streamed(self, app):
+        app.max_bytes = 10000
+        resp, content = request(app, URL, headers={"accept": "text/chunks"})
+        assert resp.status_int == 200
+        assert content == 100 * (100 * b"x")
+
+    def test_max_bytes_get_triples_bound(self, app):
+        app.max_bytes = 1
+        # the text/errer serializer would fail if it was called
+        resp, content = request(app, URL, headers={"accept": "text/errer"})
+        assert resp.status_int == 403
+
     def test_max_bytes_put_ok(self, app):
         app.max_bytes = 1000
         self.test_put_idem(app)
@@ -480,6 +547,101 @@ class TestConfigNoCache:
         resp, _ = request(app, URL)
         assert 'cache-control' not in resp.headers
 
+class TestRepresentationCache:
+
+    CONFIG = {
+        'server': {
+            'representation-cache-size': "100000",
+        }
+    }
+
+    def test_hit(self, app, monkeypatch):
+        resp1, content1 = request(app, URL)
+        assert app.representation_cache.misses == 1
+        def get_state(*args):
+            raise AssertionError("get_state should not be called")
+        monkeypatch.setattr(Group2Implementation, "get_state", get_state)
+        resp2, content2 = request(app, URL)
+        assert app.representation_cache.hits == 1
+        assert resp2.status_int == 200
+        assert content2 == content1
+        assert resp2.headers["etag"] == resp1.headers["etag"]
+        assert resp2.content_type == resp1.content_type
+
+    def test_keys(self, app):
+        request(app, URL)
+        request(app, URL, headers={"accept": "application/rdf+xml"})
+        request(app, URL+"?valid=a")
+        assert app.representation_cache.misses == 3
+        assert len(app.representation_cache) == 3
+
+    def test_invalidated(self, app):
+        _, content1 = request(app, URL)
+        request(app, URL+"?valid=a")
+        root = app._service.get(URIRef(URL), [EXAMPLE.Group2])
+        with root.edit(_trust=True) as editable:
+            editable.add((root.uri, RDFS.label, Literal("modified")))
+        _, content2 = request(app, URL)
+        assert app.representation_cache.hits == 0
+        assert content2 != content1
+        assert len(app.representation_cache) == 1
+
+    def test_evicted(self, app):
+        _, content = request(app, URL)
+        app.representation_cache.max_size = len(content)
+        request(app, URL+"?valid=a")
+        assert len(app.representation_cache) == 1
+        request(app, URL)
+        assert app.representation_cache.hits == 0
+
+    def test_spill(self, app, tmpdir):
+        cache = RepresentationCache(100000, str(tmpdir), spill_threshold=10)
+        app.representation_cache = cache
+        _, content1 = request(app, URL)
+        assert cache.size == 0
+        assert cache.spilled_size == len(content1)
+        assert len(tmpdir.listdir()[0].listdir()) == 1
+        _, content2 = request(app, URL)
+        assert cache.hits == 1
+        assert content2 == content1
+        cache.clear()
+        assert cache.spilled_size == 0
+        assert len(tmpdir.listdir()[0].listdir()) == 0
+
+    def test_not_cacheable(self, app, monkeypatch):
+        monkeypatch.setattr(Group2Implementation,
+                            "get_representation_dependencies",
+                            lambda self, params: None, raising=False)
+        _, content1 = request(app, URL)
+        _, content2 = request(app, URL)
+        assert content2 == content1
+        assert len(app.representation_cache) == 0
+        assert app.representation_cache.hits == 0
+
+    def test_dependencies(self, app, service, monkeypatch):
+        foo = service.get(URIRef(URL+"foo"))
+        monkeypatch.setattr(Group2Implementation,
+                            "get_representation_dependencies",
+                            lambda self, params: [foo], raising=False)
+        request(app, URL)
+        request(app, URL)
+        assert app.representation_cache.hits == 1
+        with foo.edit(_trust=True) as editable:
+            editable.add((foo.uri, RDFS.label, Literal("modified")))
+        request(app, URL)
+        assert app.representation_cache.hits == 1
+        assert len(app.representation_cache) == 1
+
+    def test_not_buffered(self, app):
+        app.representation_cache.max_size = 1000
+        CHUNKS_SERIALIZED[:] = []
+        req = Request.blank(URL, accept="text/chunks")
+        status, _, app_iter = req.call_application(app)
+        assert status.startswith("200")
+        assert len(CHUNKS_SERIALIZED) == 11 # not the whole 100 chunks
+        assert b"".join(app_iter) == 100 * (100 * b"x")
+        assert len(app.representation_cache) == 0
+
 @register_serializer("text/errer", None, 0o1)
 def serialize_error(graph, uri, _bindings=None):
     """I always raise an exception.
@@ -487,3 +649,16 @@ def serialize_error(graph, uri, _bindings=None):
     I am used to test what happens on serialize errors.
     """
     raise SerializeError("just for testing")
+
+CHUNKS_SERIALIZED = []
+
+@register_serializer("text/chunks", None, 0o1)
+def serialize_chunks(graph, uri, _bindings=None):
+    """I yield 100 chunks of 100 bytes, and record them.
+
+    I am used to test how much of a serialization is consumed.
+    """
+    for _ in range(100):
+        chunk = 100 * b"x"
+        CHUNKS_SERIALIZED.append(chunk)
+        yield chunk
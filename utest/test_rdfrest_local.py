@@ -75,6 +75,22 @@ class TestExample1:
                 with self.root.edit():
                     pass
 
+    def test_after_commit(self):
+        calls = []
+        self.service.after_commit(calls.append, 1)
+        assert calls == [1] # no active context
+        with self.service:
+            with self.service:
+                self.service.after_commit(calls.append, 2)
+                self.service.after_commit(calls.append, 2)
+            assert calls == [1]
+        assert calls == [1, 2]
+        with assert_raises(ValueError):
+            with self.service:
+                self.service.after_commit(calls.append, 3)
+                raise ValueError()
+        assert calls == [1, 2]
+
     def test_example1(self):
         """I use the comprehensive test sequence defined in example1.py"""
         example1.do_tests(self.root)
@@ -269,3 +269,13 @@ def test_wrap_generator_exceptions():
     except Exception as ex:
         assert isinstance(ex, MyException), \
             "a MyException was expected, got %s" % ex
+
+def test_wrap_generator_exceptions_close():
+    @wrap_generator_exceptions(MyException)
+    def g():
+        yield 1
+        yield 2
+
+    gen = g()
+    assert next(gen) == 1
+    gen.close() # must not raise MyException